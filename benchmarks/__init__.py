@@ -0,0 +1,9 @@
+"""
+Замеры производительности на больших синтетических данных.
+
+``seed_benchmark`` заполняет пустую базу через ``bulk_create`` (по умолчанию
+1 000 альбомов, 200 000 фотографий, 50 000 слотов, 500 000 броней и
+100 000 отзывов; ``--scale`` уменьшает все объемы пропорционально), а
+``run_benchmarks`` повторяемо замеряет основные страницы и списки админки и
+пишет результат в JSON, чтобы сравнивать коммиты между собой.
+"""
@@ -0,0 +1,46 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from benchmarks import runner
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет главную, галерею, альбом, календарь, запись, поиск брони и списки "
+        "админки на засеянной базе (seed_benchmark) и пишет результат в JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help="Замеров на сценарий")
+        parser.add_argument('--warmup', type=int, default=3, help="Прогонов без учета перед замером")
+        parser.add_argument('--scenario', action='append', dest='only', help="Только этот сценарий (можно несколько раз)")
+        parser.add_argument('--output', help="Файл результата, по умолчанию benchmark-<коммит>.json")
+        parser.add_argument('--compare', help="JSON предыдущего замера для сравнения")
+        parser.add_argument('--page-cache', action='store_true', help="Не отключать кэш (по умолчанию замеряются view)")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare'], encoding='utf-8') as file:
+                    baseline = json.load(file)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Не удалось прочитать {options['compare']}: {exc}")
+
+        # Уведомления о новых бронях при замере не отправляются
+        overrides = {'TELEGRAM_BOT_API_KEY': None}
+        if not options['page_cache']:
+            overrides['CACHES'] = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        with override_settings(**overrides):
+            result = runner.run(options['repeat'], options['warmup'], options['only'], log=self.stdout.write)
+        result['options']['page_cache'] = options['page_cache']
+
+        output = options['output'] or f"benchmark-{(result['commit'] or 'local')[:12]}.json"
+        with open(output, 'w', encoding='utf-8') as file:
+            json.dump(result, file, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Результат записан в {output}"))
+        if baseline:
+            for line in runner.compare(baseline, result):
+                self.stdout.write(line)
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks import seed
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполняет пустую базу синтетическими данными для замеров (bulk_create): "
+        "альбомы, фотографии с изображениями-заглушками, слоты, брони и отзывы"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0, help="Множитель объемов (0.01 — в сто раз меньше)")
+        parser.add_argument('--seed', type=int, default=0, help="Зерно генератора: одинаковое зерно — одинаковые данные")
+        for name, count in seed.SIZES.items():
+            parser.add_argument(f'--{name}', type=int, help=f"Количество, по умолчанию {count} × scale")
+
+    def handle(self, *args, **options):
+        if not seed.is_empty():
+            raise CommandError(
+                "В базе уже есть данные. Для замеров нужна отдельная база: DATABASE_PATH=bench.sqlite3 "
+                "manage.py migrate, затем seed_benchmark с той же переменной"
+            )
+        sizes = seed.scaled(options['scale'])
+        sizes.update({name: options[name] for name in sizes if options[name] is not None})
+        started = time.perf_counter()
+        seed.seed(sizes, options['seed'], log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(f"База заполнена за {time.perf_counter() - started:.1f} с"))
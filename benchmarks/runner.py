@@ -0,0 +1,182 @@
+"""
+Повторяемые замеры страниц на засеянной базе (см. benchmarks.seed).
+
+Каждый сценарий — один HTTP-запрос через тестовый клиент Django (весь стек
+middleware, без сети). Сценарий выполняется ``warmup`` раз без учета, затем
+``repeat`` раз с замером; в результат идут min/медиана/p95 времени ответа и
+число SQL-запросов (core.sqlprofile). Запросы, которые пишут в базу
+(создание брони), выполняются в транзакции с откатом, так что база между
+повторами и между запусками не меняется.
+"""
+import datetime
+import platform
+import statistics
+import subprocess
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from bookings.models import Booking, TimeSlot
+from bookings.views import available_slots_on
+from core.sqlprofile import profiling
+from portfolio.models import Album, Photo
+from reviews.models import Review
+from .seed import SEEDED_MODELS
+
+ADMIN_USERNAME = 'benchmark'
+
+
+@dataclass
+class Scenario:
+    name: str
+    path: str
+    method: str = 'get'
+    data: dict = field(default_factory=dict)
+    admin: bool = False
+    # Запрос пишет в базу — выполняется в транзакции с откатом
+    rollback: bool = False
+
+
+def scenarios():
+    """Сценарии по засеянной базе: самый большой альбом, самый занятой день и т. п."""
+    album = Album.objects.filter(is_published=True).order_by('-photo_count', 'pk').first()
+    busiest = TimeSlot.objects.filter(
+        date_type='specific', specific_date__gte=timezone.localdate()
+    ).annotate(bookings_count=Count('bookings')).order_by('-bookings_count', 'pk').first()
+    day = busiest.specific_date if busiest else timezone.localdate() + datetime.timedelta(days=1)
+    slot = available_slots_on(day).order_by('pk').first()
+    code = Booking.objects.order_by('pk').values_list('confirmation_code', flat=True).first()
+
+    items = [
+        Scenario('home', reverse('core:home')),
+        Scenario('gallery', reverse('portfolio:gallery')),
+        Scenario('gallery_last_page', reverse('portfolio:gallery') + '?page=last'),
+        Scenario('calendar', reverse('bookings:calendar') + f'?date={day:%Y-%m-%d}'),
+        Scenario('status_page', reverse('bookings:booking_status')),
+    ]
+    if album:
+        items.append(Scenario('album_detail', album.get_absolute_url()))
+    if slot:
+        url = reverse('bookings:booking_create', kwargs={'slot_id': slot.pk})
+        items += [
+            Scenario('booking_form', url),
+            Scenario('booking_create', url, 'post', {
+                'client_name': "Замер", 'client_email': 'benchmark@example.com',
+                'client_phone': '+7 900 000-00-00', 'shooting_type': 'portrait', 'message': '',
+            }, rollback=True),
+        ]
+    if code:
+        items.append(Scenario('status_lookup', reverse('bookings:booking_status'), 'post', {'confirmation_code': code}))
+    for model in (Booking, TimeSlot, Album, Photo, Review):
+        opts = model._meta
+        items.append(Scenario(
+            f'admin_{opts.model_name}_changelist', reverse(f'admin:{opts.app_label}_{opts.model_name}_changelist'),
+            admin=True,
+        ))
+    items.append(Scenario(
+        'admin_booking_search', reverse('admin:bookings_booking_changelist') + '?q=client4', admin=True,
+    ))
+    return items
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def measure(client, scenario, repeat, warmup):
+    timings, queries, status = [], 0, None
+    for run in range(warmup + repeat):
+        with (transaction.atomic() if scenario.rollback else nullcontext()), profiling() as profile:
+            started = time.perf_counter()
+            response = getattr(client, scenario.method)(scenario.path, scenario.data)
+            elapsed = time.perf_counter() - started
+            if scenario.rollback:
+                transaction.set_rollback(True)
+        if run >= warmup:
+            timings.append(elapsed)
+        queries, status = len(profile.queries), response.status_code
+    return {
+        'path': scenario.path,
+        'method': scenario.method.upper(),
+        'status': status,
+        'queries': queries,
+        'min_ms': round(min(timings) * 1000, 3),
+        'median_ms': round(statistics.median(timings) * 1000, 3),
+        'mean_ms': round(statistics.fmean(timings) * 1000, 3),
+        'p95_ms': round(percentile(timings, 0.95) * 1000, 3),
+        'max_ms': round(max(timings) * 1000, 3),
+    }
+
+
+def git_revision():
+    """(коммит, есть ли незакоммиченные изменения); (None, None) вне git"""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        changes = subprocess.run(
+            ['git', 'status', '--porcelain', '--untracked-files=no'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(changes)
+
+
+def run(repeat=20, warmup=3, only=None, log=print):
+    """Выполняет сценарии (все или с именами из only) и возвращает результат для JSON"""
+    user, _ = get_user_model().objects.get_or_create(
+        username=ADMIN_USERNAME, defaults={'is_staff': True, 'is_superuser': True},
+    )
+    host = next((host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')), 'localhost')
+    clients = {False: Client(HTTP_HOST=host), True: Client(HTTP_HOST=host)}
+    clients[True].force_login(user)
+
+    results = {}
+    for scenario in scenarios():
+        if only and scenario.name not in only:
+            continue
+        results[scenario.name] = result = measure(clients[scenario.admin], scenario, repeat, warmup)
+        log(
+            f"{scenario.name}: медиана {result['median_ms']:.1f} мс, p95 {result['p95_ms']:.1f} мс, "
+            f"SQL {result['queries']}, HTTP {result['status']}"
+        )
+
+    commit, dirty = git_revision()
+    return {
+        'commit': commit,
+        'dirty': dirty,
+        'created_at': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'options': {'repeat': repeat, 'warmup': warmup},
+        'dataset': {model._meta.label: model.objects.count() for model in SEEDED_MODELS},
+        'results': results,
+    }
+
+
+def compare(baseline, current):
+    """Строки сравнения медиан двух результатов run() (например, двух коммитов)"""
+    lines = []
+    for name, result in current['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            lines.append(f"{name}: {result['median_ms']:.1f} мс (нет в базовом замере)")
+            continue
+        change = (result['median_ms'] - before['median_ms']) / before['median_ms'] * 100 if before['median_ms'] else 0
+        lines.append(
+            f"{name}: {before['median_ms']:.1f} → {result['median_ms']:.1f} мс ({change:+.0f}%), "
+            f"SQL {before['queries']} → {result['queries']}"
+        )
+    return lines
@@ -0,0 +1,198 @@
+"""
+Синтетические данные для замеров.
+
+Строки вставляются пачками через ``bulk_create``, без загрузки всех объектов
+в память. Так как ``bulk_create`` не вызывает сигналы, все, что они обычно
+поддерживают (счетчики фотографий и обложки альбомов, ссылки на блобы,
+поисковый индекс, рекомендации, поколения кэша), заполняется сразу или
+пересчитывается в конце. Данные детерминированы: одинаковые ``sizes`` и
+``seed`` дают одинаковую базу, поэтому замеры разных коммитов сравнимы.
+"""
+import datetime
+import io
+import random
+from collections import Counter
+from itertools import islice
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from bookings.models import Booking, TimeSlot
+from core import reference, storage
+from core.models import SiteSettings
+from portfolio import fragments, ordering, recommendations, search
+from portfolio.models import Album, Photo, ShootingType
+from reviews.models import Review
+
+SIZES = {
+    'albums': 1000,
+    'photos': 200_000,
+    'slots': 50_000,
+    'bookings': 500_000,
+    'reviews': 100_000,
+}
+BATCH_SIZE = 2000
+PLACEHOLDERS = 12
+SLOTS_PER_DAY = 10
+
+SHOOTING_TYPES = [
+    ("Портрет", 'portrait'), ("Свадьба", 'wedding'), ("Love Story", 'lovestory'),
+    ("Семейная", 'family'), ("Детская", 'kids'), ("Репортаж", 'reportage'),
+    ("Предметная", 'product'), ("Пейзаж", 'landscape'),
+]
+WORDS = [
+    "весна", "лето", "осень", "зима", "море", "город", "парк", "студия", "закат",
+    "рассвет", "свадьба", "прогулка", "портрет", "семья", "лес", "горы",
+]
+REVIEW_TEXTS = [
+    "Спасибо за чудесную съемку!", "Фотографии получились живыми и теплыми.",
+    "Все прошло легко, рекомендую.", "Быстро прислали готовые снимки.",
+    "Хорошо, но хотелось бы больше кадров.",
+]
+SEEDED_MODELS = (ShootingType, Album, Photo, TimeSlot, Booking, Review)
+
+
+def scaled(scale):
+    """Объемы SIZES, умноженные на scale (не меньше одной строки)"""
+    return {name: max(1, round(count * scale)) for name, count in SIZES.items()}
+
+
+def is_empty():
+    return not any(model.objects.exists() for model in SEEDED_MODELS)
+
+
+def batched(rows, size=BATCH_SIZE):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def insert(model, rows):
+    """bulk_create генератора пачками; возвращает число строк"""
+    total = 0
+    with transaction.atomic():
+        for batch in batched(rows):
+            model.objects.bulk_create(batch)
+            total += len(batch)
+    return total
+
+
+def placeholder_images(count=PLACEHOLDERS):
+    """Несколько маленьких JPEG разных цветов в контентном хранилище; имена блобов"""
+    content_storage = storage.select_content_storage()
+    names = []
+    for number in range(count):
+        hue = number * 360 // count
+        image = Image.new('RGB', (480, 320), f'hsl({hue}, 60%, 50%)')
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=70)
+        names.append(content_storage.save(f'placeholder-{number}.jpg', ContentFile(buffer.getvalue())))
+    return names
+
+
+def seed(sizes=SIZES, seed=0, log=print):
+    """Заполняет базу; log получает строку о каждом шаге"""
+    rng = random.Random(seed)
+    SiteSettings.load()
+    images = placeholder_images()
+
+    types = ShootingType.objects.bulk_create(
+        ShootingType(name=name, slug=slug, order=number * ordering.GAP)
+        for number, (name, slug) in enumerate(SHOOTING_TYPES)
+    )
+
+    # Размеры альбомов неравные, как в жизни: несколько больших и много маленьких
+    weights = [rng.paretovariate(1.2) for _ in range(sizes['albums'])]
+    photo_counts = Counter(rng.choices(range(sizes['albums']), weights, k=sizes['photos']))
+    titles = [f"{rng.choice(WORDS).capitalize()} {number}" for number in range(sizes['albums'])]
+    albums = Album.objects.bulk_create(
+        (
+            Album(
+                title=titles[number],
+                slug=f'album-{number:05d}',
+                description=' '.join(rng.choices(WORDS, k=12)),
+                is_published=rng.random() < 0.95,
+                is_featured=rng.random() < 0.05,
+                order=number * ordering.GAP,
+                photo_count=photo_counts[number],
+                effective_cover=images[number % len(images)] if photo_counts[number] else '',
+                related_stale=True,
+            )
+            for number in range(sizes['albums'])
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    Through = Album.shooting_types.through
+    insert(Through, (
+        Through(album_id=album.pk, shootingtype_id=shooting_type.pk)
+        for album in albums
+        for shooting_type in rng.sample(types, rng.randint(1, 3))
+    ))
+    log(f"Альбомов: {len(albums)}, типов съемки: {len(types)}")
+
+    # Обложка альбома — его первое фото, поэтому изображения идут по кругу с того же места
+    photos = insert(Photo, (
+        Photo(
+            album_id=album.pk,
+            image=images[(number + position) % len(images)],
+            title=f"{titles[number]} — кадр {position + 1}",
+            order=(position + 1) * ordering.GAP,
+        )
+        for number, album in enumerate(albums)
+        for position in range(photo_counts[number])
+    ))
+    log(f"Фотографий: {photos}")
+
+    start = timezone.localdate() + datetime.timedelta(days=1)
+    slots = insert(TimeSlot, (
+        TimeSlot(
+            date_type='specific',
+            specific_date=start + datetime.timedelta(days=number // SLOTS_PER_DAY),
+            start_time=datetime.time(9 + number % SLOTS_PER_DAY),
+            end_time=datetime.time(9 + number % SLOTS_PER_DAY, 50),
+            is_available=rng.random() < 0.95,
+            max_bookings=rng.randint(5, 15),
+        )
+        for number in range(sizes['slots'])
+    ))
+    log(f"Слотов: {slots}")
+
+    slot_ids = list(TimeSlot.objects.order_by('pk').values_list('pk', flat=True))
+    shooting_types = [key for key, _ in Booking.SHOOTING_TYPES]
+    bookings = insert(Booking, (
+        Booking(
+            time_slot_id=rng.choice(slot_ids),
+            client_name=f"Клиент {number}",
+            client_email=f'client{number}@example.com',
+            client_phone=f'+7 900 {number:07d}',
+            shooting_type=rng.choice(shooting_types),
+            is_confirmed=rng.random() < 0.8,
+            confirmation_code=f'{number:08X}',
+        )
+        for number in range(sizes['bookings'])
+    ))
+    log(f"Броней: {bookings}")
+
+    statuses = rng.choices(['approved', 'pending', 'rejected'], [7, 2, 1], k=sizes['reviews'])
+    reviews = insert(Review, (
+        Review(
+            author=f"Автор {number}",
+            email=f'author{number}@example.com',
+            rating=rng.choices(range(1, 6), [1, 1, 2, 5, 11])[0],
+            text=rng.choice(REVIEW_TEXTS),
+            status=status,
+            is_public=status == 'approved',
+        )
+        for number, status in enumerate(statuses)
+    ))
+    log(f"Отзывов: {reviews}")
+
+    # То, что обычно поддерживают сигналы
+    storage.recount(images)
+    if search.is_available():
+        log(f"Проиндексировано документов: {search.rebuild_index()}")
+    log(f"Пересчитаны рекомендации альбомов: {recommendations.refresh()}")
+    fragments.bump(fragments.PORTFOLIO, *(fragments.shooting_type_scope(item.pk) for item in types))
+    reference.invalidate()
@@ -0,0 +1,40 @@
+import json
+import shutil
+import tempfile
+
+from django.test import TestCase, override_settings
+
+from portfolio.models import Album, Photo
+from . import runner, seed
+
+SIZES = {'albums': 4, 'photos': 30, 'slots': 20, 'bookings': 60, 'reviews': 10}
+
+
+class BenchmarkTests(TestCase):
+    """Засев синтетических данных и прогон сценариев (benchmarks)"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        seed.seed(SIZES, log=lambda line: None)
+
+    def test_seed_fills_denormalized_fields(self):
+        self.assertFalse(seed.is_empty())
+        self.assertEqual(Photo.objects.count(), SIZES['photos'])
+        for album in Album.objects.filter(photo_count__gt=0):
+            self.assertEqual(album.photos.count(), album.photo_count)
+            self.assertEqual(album.effective_cover.name, album.pick_cover())
+
+    def test_run_covers_all_scenarios(self):
+        result = runner.run(repeat=1, warmup=0, log=lambda line: None)
+
+        self.assertEqual(set(result['results']), {scenario.name for scenario in runner.scenarios()})
+        for name, stats in result['results'].items():
+            with self.subTest(name):
+                self.assertLess(stats['status'], 400)
+        self.assertEqual(result['dataset']['bookings.Booking'], SIZES['bookings'])
+        json.dumps(result)
+        self.assertIn('(+0%)', runner.compare(result, result)[0])
@@ -50,7 +50,10 @@ class TimeSlot(models.Model):
     
     def get_available_slots(self):
         """Получить количество оставшихся мест"""
-        booked_count = self.bookings.filter(is_confirmed=True).count()
+        # Списки слотов считают подтвержденные брони заранее (annotate confirmed_bookings)
+        booked_count = getattr(self, 'confirmed_bookings', None)
+        if booked_count is None:
+            booked_count = self.bookings.filter(is_confirmed=True).count()
         return self.max_bookings - booked_count
     
     def is_fully_booked(self):
@@ -1,3 +1,41 @@
+import datetime
+
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+
+from core.models import SiteSettings
+from core.sqlprofile import QueryBudgetMixin
+from .models import Booking, TimeSlot
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Бюджет SQL-запросов страниц записи (кэши пусты — худший случай)"""
+
+    def setUp(self):
+        SiteSettings.objects.create(title="Студия", phone='+7 900 000-00-00', email='studio@example.com', about_text="О нас")
+        self.slots = [
+            TimeSlot.objects.create(date_type='weekend', start_time=f'{hour}:00', end_time=f'{hour}:50', max_bookings=2)
+            for hour in range(10, 15)
+        ]
+        self.booking = Booking.objects.create(
+            time_slot=self.slots[0], client_name="Анна", client_email='anna@example.com', client_phone='1', is_confirmed=True,
+        )
 
-# Create your tests here.
+    def test_pages(self):
+        code = self.booking.confirmation_code
+        saturday = datetime.date(2030, 1, 5)
+        budgets = {
+            reverse('bookings:calendar'): 1,
+            # Занятость всех слотов — в одном запросе, а не COUNT на каждый
+            reverse('bookings:calendar') + f'?date={saturday:%Y-%m-%d}': 2,
+            reverse('bookings:booking_create', kwargs={'slot_id': self.slots[1].pk}): 4,
+            reverse('bookings:booking_done', kwargs={'code': code}): 3,
+            reverse('bookings:booking_detail', kwargs={'code': code}): 3,
+            reverse('bookings:booking_status'): 1,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                cache.clear()
+                with self.assertQueryBudget(budget):
+                    self.assertEqual(self.client.get(url).status_code, 200)
@@ -1,10 +1,11 @@
 from django.urls import path
+from core.asyncviews import as_view
 from . import views
 
 app_name = 'bookings'
 
 urlpatterns = [
-    path('', views.TimeSlotSelectionView.as_view(), name='calendar'),
+    path('', as_view(views.TimeSlotSelectionView, views.AsyncTimeSlotSelectionView), name='calendar'),
     path('slot/<int:slot_id>/', views.BookingCreateView.as_view(), name='booking_create'),
     path('done/<str:code>/', views.BookingDoneView.as_view(), name='booking_done'),
     path('booking/<str:code>/', views.BookingDetailView.as_view(), name='booking_detail'),
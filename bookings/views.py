@@ -4,16 +4,19 @@ from django.urls import reverse_lazy
 from django.utils import timezone
 from django.contrib import messages
 from django.utils.translation import gettext_lazy as _
-from django.db.models import Q
+from django.db.models import Count, F, Q
 from django.core.exceptions import ValidationError
 from django.conf import settings
 import logging
 import json
+from datetime import datetime
 from urllib.request import urlopen, Request
 from urllib.parse import urlencode
 from urllib.error import URLError, HTTPError
 from django import forms
 
+from core import metrics
+from core.asyncviews import AsyncViewMixin, alist
 from .models import Booking, TimeSlot
 from .forms import BookingForm, TimeSlotSelectionForm
 
@@ -46,7 +49,7 @@ def send_telegram_alert(message):
         request.add_header('Content-Type', 'application/x-www-form-urlencoded')
         
         # Отправляем запрос
-        with urlopen(request, timeout=10) as response:
+        with metrics.notification('telegram'), urlopen(request, timeout=10) as response:
             response_data = response.read().decode('utf-8')
             result = json.loads(response_data)
             
@@ -66,6 +69,16 @@ def send_telegram_alert(message):
         logger.error(f"Неожиданная ошибка: {e}")
         return False
 
+def available_slots_on(date):
+    """Свободные слоты на дату одним запросом: подходящие по типу даты и с местами"""
+    day_type = 'weekend' if date.weekday() >= 5 else 'weekday'
+    return TimeSlot.objects.filter(
+        Q(date_type='specific', specific_date=date) | Q(date_type=day_type),
+        is_available=True,
+    ).annotate(
+        confirmed_bookings=Count('bookings', filter=Q(bookings__is_confirmed=True))
+    ).filter(confirmed_bookings__lt=F('max_bookings'))
+
 class TimeSlotSelectionView(TemplateView):
     """Выбор даты и доступных слотов времени"""
     template_name = 'bookings/calendar.html'
@@ -77,38 +90,31 @@ class TimeSlotSelectionView(TemplateView):
         selected_date = self.request.GET.get('date')
         if selected_date:
             try:
-                from datetime import datetime
                 selected_date = datetime.strptime(selected_date, '%Y-%m-%d').date()
                 context['selected_date'] = selected_date
-                
-                # Получаем ВСЕ доступные слоты
-                all_slots = TimeSlot.objects.filter(is_available=True)
-                available_slots = []
-                
-                for slot in all_slots:
-                    if slot.date_type == 'specific':
-                        # Для конкретных дат - проверяем совпадение даты
-                        if slot.specific_date == selected_date:
-                            available_slots.append(slot)
-                    elif slot.date_type == 'weekday':
-                        # Для будних дней - проверяем что день Пн-Пт (1-5)
-                        if selected_date.weekday() < 5:  # 0-4 = Пн-Пт
-                            available_slots.append(slot)
-                    elif slot.date_type == 'weekend':
-                        # Для выходных дней - проверяем что день Сб-Вс (5-6)
-                        if selected_date.weekday() >= 5:  # 5-6 = Сб-Вс
-                            available_slots.append(slot)
-                
-                # Фильтруем полностью занятые слоты
-                available_slots = [slot for slot in available_slots if not slot.is_fully_booked()]
-                
-                context['available_slots'] = available_slots
-                
+                # Слоты по типу даты и занятость — одним запросом, без COUNT на каждый слот
+                context['available_slots'] = list(available_slots_on(selected_date))
             except ValueError:
                 messages.error(self.request, _("Неверный формат даты"))
         
         return context
 
+class AsyncTimeSlotSelectionView(AsyncViewMixin, TimeSlotSelectionView):
+    """TimeSlotSelectionView под ASGI"""
+
+    async def get(self, request, *args, **kwargs):
+        context = {'form': TimeSlotSelectionForm()}
+        selected_date = request.GET.get('date')
+        if selected_date:
+            try:
+                selected_date = datetime.strptime(selected_date, '%Y-%m-%d').date()
+            except ValueError:
+                messages.error(request, _("Неверный формат даты"))
+            else:
+                context['selected_date'] = selected_date
+                context['available_slots'] = await alist(available_slots_on(selected_date))
+        return self.render_to_response(self.get_context_data(**kwargs, **context))
+
 class BookingCreateView(CreateView):
     """Создание бронирования"""
     model = Booking
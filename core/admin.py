@@ -1,7 +1,8 @@
 from django.contrib import admin
 from django.utils.translation import gettext_lazy as _
+from django.utils import timezone
 from django.utils.safestring import mark_safe
-from core.models import SiteSettings, Service
+from core.models import OutgoingEmail, SiteSettings, Service
 from core.forms import ServiceForm
 
 @admin.register(SiteSettings)
@@ -80,4 +81,17 @@ class ServiceAdmin(admin.ModelAdmin):
             'fields': ('description',),
             'classes': ('wide',),
         }),
-    )
\ No newline at end of file
+    )
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('subject', 'to')
+    readonly_fields = ('attempts', 'last_error', 'created_at', 'sent_at')
+    actions = ['retry_now']
+
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(status='sent').update(status='pending', next_attempt_at=timezone.now())
+        self.message_user(request, f"{updated} писем возвращено в очередь")
+    retry_now.short_description = _('Отправить повторно')
@@ -0,0 +1,262 @@
+"""
+JSON API только для чтения (мобильное приложение, статический фронтенд).
+
+Каждый ресурс описывает проекцию — соответствие полей ответа полям модели —
+и сериализуется прямо из ``.values()``, без создания объектов моделей.
+Клиент может запросить только нужные поля (``?fields=title,cover``), тогда
+в SELECT попадут только они и ключи сортировки.
+
+Пагинация курсорная: курсор — значения ключей сортировки последней строки
+страницы, следующая страница выбирается условием «после этих значений» по
+индексу, без OFFSET, и не сдвигается при добавлении новых объектов.
+
+ETag ответа строится из счетчиков поколений (см. portfolio.fragments),
+которые сигналы увеличивают при любом изменении данных ресурса, поэтому
+повторный опрос с If-None-Match получает 304 без единого запроса к базе.
+"""
+import base64
+import binascii
+import hashlib
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import FileField, Q
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views.decorators.http import require_safe
+
+from portfolio import fragments
+from .db import replica_reads
+from .models import Service
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# Ключи сортировки — 64-битные целые; больше в курсоре не бывает
+CURSOR_INT_RANGE = range(-2 ** 63, 2 ** 63)
+
+# Области поколений для данных вне портфолио (увеличиваются в сигналах)
+SERVICES = 'api:services'
+
+
+class BadRequest(ValueError):
+    pass
+
+
+class NotFound(Exception):
+    pass
+
+
+class Resource:
+    """
+    Ресурс API.
+
+    Подкласс задает ``get_queryset()`` и проекцию:
+
+    * ``fields`` — ``{поле ответа: lookup}``, lookup может идти через связи;
+    * ``many_fields`` — ``{поле ответа: lookup}`` для связей «многие ко многим»,
+      значения страницы собираются одним дополнительным запросом в список;
+    * ``ordering`` — ключи сортировки и курсора, последний ключ уникален;
+    * ``filters`` — ``{параметр запроса: lookup}``;
+    * ``generation_scopes`` — области поколений, от которых зависят данные.
+    """
+    fields = {}
+    many_fields = {}
+    ordering = ('pk',)
+    filters = {}
+    generation_scopes = ()
+
+    def get_queryset(self):
+        raise NotImplementedError
+
+    def selected_fields(self, request):
+        available = [*self.fields, *self.many_fields]
+        requested = request.GET.get('fields')
+        if not requested:
+            return available
+        names = [name.strip() for name in requested.split(',') if name.strip()]
+        unknown = [name for name in names if name not in available]
+        if unknown:
+            raise BadRequest(f"Неизвестные поля: {', '.join(unknown)}. Доступны: {', '.join(available)}")
+        return names
+
+    def filtered_queryset(self, request):
+        queryset = self.get_queryset()
+        for param, lookup in self.filters.items():
+            if param in request.GET:
+                queryset = queryset.filter(**{lookup: request.GET[param]})
+        return queryset
+
+    def serialize(self, queryset, names, request, limit=None):
+        """Строки из ``.values()`` и элементы ответа; файлы превращаются в абсолютные URL"""
+        plain = [name for name in names if name in self.fields]
+        keys = [key.lstrip('-') for key in self.ordering]
+        rows = list(queryset.values(*{self.fields[name] for name in plain} | set(keys))[:limit])
+
+        files = {name: _file_field(queryset.model, self.fields[name]) for name in plain}
+        results = []
+        for row in rows:
+            item = {}
+            for name in plain:
+                value = row[self.fields[name]]
+                if files[name] is not None:
+                    value = request.build_absolute_uri(files[name].storage.url(value)) if value else None
+                item[name] = value
+            results.append(item)
+
+        many = [name for name in names if name in self.many_fields]
+        if many and rows:
+            ids = [row['pk'] for row in rows]
+            for name in many:
+                values = {pk: [] for pk in ids}
+                pairs = queryset.model.objects.filter(pk__in=ids, **{f'{self.many_fields[name]}__isnull': False})
+                for pk, value in pairs.values_list('pk', self.many_fields[name]).order_by(self.many_fields[name]):
+                    values[pk].append(value)
+                for row, item in zip(rows, results):
+                    item[name] = values[row['pk']]
+        return rows, results
+
+    def etag(self, request):
+        parts = [request.scheme, request.get_host(), request.get_full_path(), fragments.generations(self.generation_scopes)]
+        return '"%s"' % hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+
+
+def _file_field(model, lookup):
+    """Файловое поле модели, на которое указывает lookup, или None"""
+    field = None
+    for part in lookup.split('__'):
+        if part == 'pk':
+            return None
+        try:
+            field = model._meta.get_field(part)
+        except FieldDoesNotExist:
+            return None
+        model = field.related_model
+    return field if isinstance(field, FileField) else None
+
+
+def encode_cursor(values):
+    # DjangoJSONEncoder обрезает микросекунды, а курсор должен совпадать с базой точно
+    data = json.dumps(values, default=lambda value: value.isoformat() if hasattr(value, 'isoformat') else str(value))
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise BadRequest("Некорректный курсор")
+    if not isinstance(values, list) or len(values) != size or not all(map(_is_cursor_value, values)):
+        raise BadRequest("Некорректный курсор")
+    return values
+
+
+def _is_cursor_value(value):
+    """Ключ сортировки в курсоре — скаляр JSON (даты приходят строками ISO)"""
+    if value is None or isinstance(value, (bool, str, float)):
+        return True
+    return isinstance(value, int) and value in CURSOR_INT_RANGE
+
+
+def seek(ordering, values):
+    """Условие «строго после values» для сортировки ordering (keyset-пагинация)"""
+    condition = Q()
+    for position, key in enumerate(ordering):
+        name = key.lstrip('-')
+        lookup = 'lt' if key.startswith('-') else 'gt'
+        equal = {ordering[index].lstrip('-'): values[index] for index in range(position)}
+        condition |= Q(**equal, **{f'{name}__{lookup}': values[position]})
+    return condition
+
+
+def _page_size(request):
+    try:
+        size = int(request.GET.get('limit', PAGE_SIZE))
+    except ValueError:
+        raise BadRequest("limit должен быть числом")
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def _error(message, status=400):
+    return JsonResponse({'error': message}, status=status, json_dumps_params={'ensure_ascii': False})
+
+
+def _conditional(request, resource, build):
+    """Отвечает 304 по ETag до обращения к базе, иначе строит JSON функцией build"""
+    etag = resource.etag(request)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        try:
+            response = JsonResponse(build(), json_dumps_params={'ensure_ascii': False})
+        except NotFound as exc:
+            return _error(str(exc), status=404)
+        except (ValidationError, ValueError) as exc:
+            messages = getattr(exc, 'messages', None) or [str(exc)]
+            return _error('; '.join(messages))
+    response['ETag'] = etag
+    # Клиент может хранить ответ, но каждый раз перепроверяет его по ETag
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def _unknown_resource(resources):
+    return _error(f"Неизвестный ресурс. Доступны: {', '.join(resources)}", status=404)
+
+
+@require_safe
+@replica_reads
+def resource_list(request, resources, resource):
+    """Страница ресурса: ``{"results": [...], "next": URL следующей страницы или null}``"""
+    if resource not in resources:
+        return _unknown_resource(resources)
+    resource = resources[resource]()
+
+    def build():
+        names = resource.selected_fields(request)
+        size = _page_size(request)
+        queryset = resource.filtered_queryset(request).order_by(*resource.ordering)
+        keys = [key.lstrip('-') for key in resource.ordering]
+        if request.GET.get('cursor'):
+            queryset = queryset.filter(seek(resource.ordering, decode_cursor(request.GET['cursor'], len(keys))))
+
+        # Одна лишняя строка показывает, есть ли следующая страница
+        rows, results = resource.serialize(queryset, names, request, limit=size + 1)
+        next_url = None
+        if len(rows) > size:
+            rows, results = rows[:size], results[:size]
+            params = request.GET.copy()
+            params['cursor'] = encode_cursor([rows[-1][key] for key in keys])
+            next_url = request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+        return {'results': results, 'next': next_url}
+
+    return _conditional(request, resource, build)
+
+
+@require_safe
+@replica_reads
+def resource_detail(request, resources, resource, pk):
+    if resource not in resources:
+        return _unknown_resource(resources)
+    resource = resources[resource]()
+
+    def build():
+        names = resource.selected_fields(request)
+        _, results = resource.serialize(resource.get_queryset().filter(pk=pk), names, request)
+        if not results:
+            raise NotFound("Объект не найден")
+        return results[0]
+
+    return _conditional(request, resource, build)
+
+
+class ServiceResource(Resource):
+    fields = {
+        'id': 'pk',
+        'name': 'name',
+        'price': 'price',
+        'description': 'description',
+    }
+    ordering = ('price', 'pk')
+    generation_scopes = (SERVICES,)
+
+    def get_queryset(self):
+        return Service.objects.filter(is_active=True)
@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from .db import configure_sqlite
+        from . import checks, metrics, sqlprofile  # noqa: F401
+        from .signals import connect_storage_signals
+        connect_storage_signals()
+        connection_created.connect(configure_sqlite, dispatch_uid='core-sqlite-pragmas')
+        connection_created.connect(metrics.instrument_connection, dispatch_uid='core-metrics-queries')
+        connection_created.connect(sqlprofile.instrument_connection, dispatch_uid='core-sql-profile')
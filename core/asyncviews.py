@@ -0,0 +1,108 @@
+"""
+Асинхронные варианты view для работы под ASGI.
+
+Под ASGI синхронный view выполняется в потоке через ``sync_to_async``, и
+каждый запрос держит поток все время, пока ждет базу. У самых посещаемых
+страниц (главная, галерея, альбом, календарь, отзывы) есть async-варианты:
+данные читаются асинхронным ORM (``aget``, ``async for``), независимые
+запросы запускаются вместе через ``asyncio.gather``, а шаблон рендерится
+обработчиком уже по готовому контексту.
+
+Вариант выбирается при загрузке URLconf настройкой ``ASYNC_VIEWS`` —
+``framed/asgi.py`` включает ее, под WSGI остаются синхронные view без
+лишнего цикла событий на каждый запрос.
+"""
+import asyncio
+
+from django.conf import settings
+from django.core.paginator import InvalidPage
+from django.http import Http404
+from django.utils.translation import gettext as _
+from django.views.generic.base import ContextMixin
+
+
+def as_view(sync_view, async_view, **initkwargs):
+    """as_view() варианта, который подходит серверу (настройка ASYNC_VIEWS)"""
+    view_class = async_view if getattr(settings, 'ASYNC_VIEWS', False) else sync_view
+    return view_class.as_view(**initkwargs)
+
+
+async def alist(queryset):
+    """Выполняет queryset асинхронно и возвращает список"""
+    return [item async for item in queryset]
+
+
+async def gather(**awaitables):
+    """asyncio.gather с именованными результатами"""
+    values = await asyncio.gather(*awaitables.values())
+    return dict(zip(awaitables, values))
+
+
+class AsyncViewMixin:
+    """
+    Основа async-варианта синхронного view.
+
+    Ставится первой в списке родителей: ``get`` варианта собирает данные сам
+    и передает их в ``get_context_data`` готовыми, синхронная сборка
+    контекста родителя (с запросами к базе) не вызывается.
+    """
+
+    def get_context_data(self, **kwargs):
+        return ContextMixin.get_context_data(self, **kwargs)
+
+    async def aget_list_context(self, queryset):
+        """Контекст ListView (страница, paginator, объекты) по queryset — асинхронно"""
+        page_size = self.get_paginate_by(queryset)
+        if page_size:
+            paginator, page, object_list, is_paginated = await self.apaginate_queryset(queryset, page_size)
+        else:
+            paginator, page, object_list, is_paginated = None, None, await alist(queryset), False
+        context = {
+            'paginator': paginator,
+            'page_obj': page,
+            'is_paginated': is_paginated,
+            'object_list': object_list,
+        }
+        context_object_name = self.get_context_object_name(queryset)
+        if context_object_name is not None:
+            context[context_object_name] = object_list
+        return context
+
+    async def apaginate_queryset(self, queryset, page_size):
+        """
+        То же, что MultipleObjectMixin.paginate_queryset, но число объектов и
+        строки страницы читаются асинхронно и одновременно (строки — с запасом
+        на orphans, лишние отбрасываются, когда известно число объектов).
+        """
+        paginator = self.get_paginator(
+            queryset, page_size, orphans=self.get_paginate_orphans(),
+            allow_empty_first_page=self.get_allow_empty(),
+        )
+        page_kwarg = self.page_kwarg
+        page = self.kwargs.get(page_kwarg) or self.request.GET.get(page_kwarg) or 1
+        rows = None
+        # count у Paginator — cached_property: значение из acount() займет его место
+        if page == 'last':
+            paginator.count = await queryset.acount()
+            page_number = paginator.num_pages
+        else:
+            try:
+                page_number = int(page)
+            except ValueError:
+                raise Http404(_("Page is not “last”, nor can it be converted to an int."))
+            bottom = max(page_number - 1, 0) * paginator.per_page
+            paginator.count, rows = await asyncio.gather(
+                queryset.acount(), alist(queryset[bottom:bottom + paginator.per_page + paginator.orphans]),
+            )
+        try:
+            page = paginator.page(page_number)
+        except InvalidPage as e:
+            raise Http404(_("Invalid page (%(page_number)s): %(message)s") % {
+                'page_number': page_number, 'message': str(e),
+            })
+        if rows is None:
+            page.object_list = await alist(page.object_list)
+        else:
+            # len(page) выполнил бы срез queryset синхронно
+            page.object_list = rows[:page.end_index() - page.start_index() + 1]
+        return paginator, page, page.object_list, page.has_other_pages()
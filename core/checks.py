@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+# Кэши, которые видит только один процесс
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """Счетчики поколений (core.reference, portfolio.fragments, core.pagecache) требуют общего кэша"""
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if settings.DEBUG or backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Warning(
+        "Кэш по умолчанию локален для процесса: другие процессы сервера не узнают об изменении "
+        "справочников, альбомов и страниц и будут отдавать устаревшие данные",
+        hint="Настройте общий кэш: Redis (REDIS_URL) или файловый/Database кэш",
+        id='core.W001',
+    )]
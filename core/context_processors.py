@@ -1,6 +1,6 @@
-from core.models import SiteSettings
+from core import reference
 
 def site_settings(request):
     return {
-        'site_settings': SiteSettings.load() # type: ignore
+        'site_settings': reference.get('site_settings')
     }
\ No newline at end of file
@@ -0,0 +1,118 @@
+"""
+Настройка соединений с базой и маршрутизация чтения на реплику.
+
+При открытии каждого соединения SQLite (сигнал ``connection_created``)
+выполняются PRAGMA из ``SQLITE_PRAGMAS``: журнал WAL (читатели не ждут
+писателя, писатель не ждет читателей), ``busy_timeout`` вместо мгновенной
+ошибки «database is locked», ``synchronous=NORMAL`` (в режиме WAL
+безопасно) и ``mmap_size`` для чтения страниц без копирования. Алиас может
+добавить свои PRAGMA ключом ``PRAGMAS`` в DATABASES — так реплика
+открывается с ``query_only``.
+
+``PrimaryReplicaRouter`` направляет чтение на алиас ``replica`` только в
+публичных view только для чтения (их помечает ``ReplicaReadsMiddleware``) и
+вне транзакций на основной базе; все записи и все остальные чтения идут в
+``default``. Для SQLite реплика — тот же файл через отдельное соединение
+(с WAL чтение не блокируется записью), при настоящей репликации
+(LiteFS, Litestream, PostgreSQL) — другой адрес в настройках.
+"""
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .pagecache import view_tags
+
+REPLICA_DB_ALIAS = 'replica'
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'busy_timeout': 5000,
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+def pragma_statements(pragmas):
+    return [f'PRAGMA {name} = {value}' for name, value in pragmas.items()]
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """Обработчик connection_created"""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = {**SQLITE_PRAGMAS, **connection.settings_dict.get('PRAGMAS', {})}
+    with connection.cursor() as cursor:
+        for statement in pragma_statements(pragmas):
+            cursor.execute(statement)
+
+
+def replica_reads(view_func):
+    """Помечает view как публичный и только читающий: его запросы можно отдать реплике"""
+    view_func.replica_reads = True
+    return view_func
+
+
+def allows_replica_reads(view_func):
+    # Страницы из кэша для анонимов (core.pagecache) — по определению публичные и только читающие
+    return (
+        getattr(view_func, 'replica_reads', False)
+        or getattr(getattr(view_func, 'view_class', None), 'replica_reads', False)
+        or view_tags(view_func) is not None
+    )
+
+
+class ReplicaReadsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _replica_reads.set(False)
+        try:
+            return self.get_response(request)
+        finally:
+            _replica_reads.reset(token)
+
+    async def __acall__(self, request):
+        # sync_to_async переносит флаг из process_view и обратно в запросы ORM
+        token = _replica_reads.set(False)
+        try:
+            return await self.get_response(request)
+        finally:
+            _replica_reads.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method in ('GET', 'HEAD') and allows_replica_reads(view_func):
+            _replica_reads.set(True)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (
+            _replica_reads.get()
+            and REPLICA_DB_ALIAS in settings.DATABASES
+            # Внутри транзакции чтение должно видеть ее же записи
+            and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return REPLICA_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -1,7 +1,7 @@
 from django import forms
-from django.core.mail import send_mail
 from django.conf import settings
 import logging
+from core import mailqueue
 from core.models import Service
 from utils.notifications import send_telegram_alert
 
@@ -41,18 +41,14 @@ class ContactForm(forms.Form):
             f"Текст сообщения:\n{message_text}"
         )
         
-        # 1. Отправка email через Яндекс SMTP
-        try:
-            send_mail(
-                subject=f"Новое сообщение от {name}",
-                message=full_message,
-                from_email=settings.DEFAULT_FROM_EMAIL,  # Обязательно ваш Яндекс-адрес
-                recipient_list=[settings.DEFAULT_FROM_EMAIL],
-                fail_silently=False,
-            )
-        except Exception as e:
-            logger.error(f"Ошибка отправки email: {e}")
-            raise
+        # 1. Email через Яндекс SMTP: письмо ставится в очередь, отправляет воркер send_queued_email
+        mailqueue.enqueue(
+            subject=f"Новое сообщение от {name}",
+            body=full_message,
+            to=[settings.DEFAULT_FROM_EMAIL],
+            from_email=settings.DEFAULT_FROM_EMAIL,  # Обязательно ваш Яндекс-адрес
+            reply_to=[user_email],
+        )
 
         # 2. Отправка в Telegram
         telegram_msg = (
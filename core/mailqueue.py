@@ -0,0 +1,137 @@
+"""
+Очередь исходящих писем.
+
+Запрос только записывает письмо в таблицу ``OutgoingEmail`` — один INSERT
+вместо TLS-сессии с SMTP-сервером внутри запроса. Воркер (команда
+``send_queued_email``) забирает накопившиеся письма пачками и отправляет
+всю пачку через одно соединение ``get_connection()``: рукопожатие и
+авторизация выполняются один раз на пачку, а не на письмо.
+
+Временные ошибки повторяются с экспоненциальной задержкой, после
+``MAX_ATTEMPTS`` попыток или постоянной ошибки сервера (5xx) письмо
+помечается как неотправленное. Взятые письма «арендуются» на ``LEASE``,
+поэтому несколько воркеров не отправят одно письмо дважды, а письма
+упавшего воркера вернутся в очередь сами.
+"""
+import logging
+import smtplib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from . import metrics
+from .models import OutgoingEmail
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 6
+RETRY_BASE = timedelta(minutes=1)
+RETRY_MAX = timedelta(hours=6)
+LEASE = timedelta(minutes=10)
+
+# После этих ошибок соединение открывается заново для следующего письма
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, OSError)
+
+
+def enqueue(subject, body, to, from_email=None, reply_to=None):
+    """Ставит письмо в очередь; отправит его воркер"""
+    return OutgoingEmail.objects.create(
+        subject=subject,
+        body=body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(to),
+        reply_to=list(reply_to or []),
+    )
+
+
+def retry_delay(attempts):
+    return min(RETRY_BASE * 2 ** (attempts - 1), RETRY_MAX)
+
+
+def is_permanent(exc):
+    """Постоянная ошибка сервера (5xx): повтор ничего не изменит"""
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return all(500 <= code < 600 for code, _ in exc.recipients.values())
+    return isinstance(exc, smtplib.SMTPResponseException) and 500 <= exc.smtp_code < 600
+
+
+def claim(batch_size=BATCH_SIZE):
+    """Забирает готовые к отправке письма и арендует их на LEASE"""
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(
+            OutgoingEmail.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'pk')[:batch_size]
+        )
+        OutgoingEmail.objects.filter(pk__in=[email.pk for email in emails]).update(next_attempt_at=now + LEASE)
+    return emails
+
+
+def deliver(emails, connection=None):
+    """
+    Отправляет письма через одно соединение и записывает результат.
+
+    Возвращает пару (отправлено, не отправлено).
+    """
+    if not emails:
+        return 0, 0
+    connection = connection or get_connection(fail_silently=False)
+    sent, failed = [], []
+    pending = list(emails)
+    try:
+        while pending:
+            # Открытое заранее соединение send_messages не закрывает — оно живет до конца пачки
+            try:
+                connection.open()
+            except (smtplib.SMTPException, OSError) as exc:
+                logger.warning("Не удалось подключиться к SMTP-серверу: %s", exc)
+                failed.extend((email, exc) for email in pending)
+                break
+            while pending:
+                email = pending.pop(0)
+                message = EmailMessage(
+                    email.subject, email.body, email.from_email, email.to,
+                    reply_to=email.reply_to, connection=connection,
+                )
+                try:
+                    with metrics.notification('email'):
+                        connection.send_messages([message])
+                except (smtplib.SMTPException, OSError) as exc:
+                    logger.warning("Ошибка отправки письма #%s: %s", email.pk, exc)
+                    failed.append((email, exc))
+                    if isinstance(exc, CONNECTION_ERRORS):
+                        # Сервер оборвал соединение — остальные письма пойдут через новое
+                        connection.close()
+                        break
+                else:
+                    sent.append(email)
+    finally:
+        connection.close()
+
+    now = timezone.now()
+    for email in sent:
+        email.status, email.sent_at, email.last_error = 'sent', now, ''
+        email.attempts += 1
+    for email, exc in failed:
+        email.attempts += 1
+        email.last_error = f"{type(exc).__name__}: {exc}"
+        if is_permanent(exc) or email.attempts >= MAX_ATTEMPTS:
+            email.status = 'failed'
+            logger.error("Письмо #%s не отправлено: %s", email.pk, email.last_error)
+        else:
+            email.next_attempt_at = now + retry_delay(email.attempts)
+    OutgoingEmail.objects.bulk_update(
+        [*sent, *(email for email, _ in failed)],
+        ['status', 'attempts', 'sent_at', 'last_error', 'next_attempt_at'],
+    )
+    return len(sent), len(failed)
+
+
+def process(batch_size=BATCH_SIZE, connection=None):
+    """Одна пачка: забрать и отправить"""
+    return deliver(claim(batch_size), connection=connection)
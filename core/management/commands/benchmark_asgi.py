@@ -0,0 +1,158 @@
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+
+PAGES = ['/', '/portfolio/', '/portfolio/?page=2', '/reviews/', '/bookings/?date=2030-01-05']
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный замер посещаемых страниц: синхронные view под WSGI против "
+        "async-вариантов под ASGI (в процессе, без сети). Каждый режим — в "
+        "отдельном процессе, потому что вариант view выбирается при загрузке URLconf"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=20, help="Одновременных запросов (потоков WSGI)")
+        parser.add_argument('--url', action='append', dest='urls', help="Страница (можно несколько раз)")
+        parser.add_argument(
+            '--db-latency', type=float, default=0.0,
+            help="Добавить задержку к каждому SQL-запросу, мс (имитация сетевой базы)",
+        )
+        parser.add_argument('--page-cache', action='store_true', help="Не отключать кэш (по умолчанию замеряются view)")
+        parser.add_argument('--server', choices=['wsgi', 'asgi'], help="Замерить только один режим в этом процессе")
+
+    def handle(self, *args, **options):
+        if options['server']:
+            return self.run(options)
+        for server in ('wsgi', 'asgi'):
+            command = [sys.executable, '-m', 'django', 'benchmark_asgi', '--server', server]
+            for name in ('requests', 'concurrency', 'db_latency'):
+                command += [f"--{name.replace('_', '-')}", str(options[name])]
+            for url in options['urls'] or []:
+                command += ['--url', url]
+            if options['page_cache']:
+                command.append('--page-cache')
+            env = {
+                **os.environ,
+                'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE,
+                'DJANGO_ASYNC_VIEWS': '1' if server == 'asgi' else '0',
+            }
+            result = subprocess.run(command, env=env, cwd=settings.BASE_DIR, capture_output=True, text=True)
+            if result.returncode:
+                self.stderr.write(result.stderr)
+            self.stdout.write(result.stdout, ending='')
+
+    def run(self, options):
+        if options['db_latency']:
+            delay = options['db_latency'] / 1000
+
+            def slow_query(execute, sql, params, many, context):
+                time.sleep(delay)
+                return execute(sql, params, many, context)
+
+            def add_latency(sender, connection, **kwargs):
+                connection.execute_wrappers.append(slow_query)
+
+            connection_created.connect(add_latency, weak=False)
+
+        overrides = {}
+        if not options['page_cache']:
+            overrides['CACHES'] = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        urls = options['urls'] or PAGES
+        paths = [urls[number % len(urls)] for number in range(options['requests'])]
+        host = next((host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')), 'localhost')
+
+        with override_settings(**overrides):
+            if options['server'] == 'asgi':
+                latencies, statuses, elapsed = asyncio.run(self.load_asgi(paths, host, options['concurrency']))
+            else:
+                latencies, statuses, elapsed = self.load_wsgi(paths, host, options['concurrency'])
+
+        latencies.sort()
+        errors = sum(1 for status in statuses if status != 200)
+        self.stdout.write(
+            f"{options['server'].upper()}: {len(paths) / elapsed:.0f} запросов/с, "
+            f"p50 {statistics.median(latencies) * 1000:.1f} мс, "
+            f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} мс, "
+            f"ответов не 200: {errors}"
+        )
+
+    def load_wsgi(self, paths, host, concurrency):
+        handler = WSGIHandler()
+
+        def request(url):
+            parts = urlsplit(url)
+            environ = {'PATH_INFO': parts.path, 'QUERY_STRING': parts.query, 'HTTP_HOST': host}
+            setup_testing_defaults(environ)
+            status = []
+            started = time.perf_counter()
+            response = handler(environ, lambda line, headers, exc_info=None: status.append(line))
+            try:
+                for _ in response:
+                    pass
+            finally:
+                response.close()
+            return time.perf_counter() - started, int(status[0].split()[0])
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            results = list(executor.map(request, paths))
+        elapsed = time.perf_counter() - started
+        return [latency for latency, _ in results], [status for _, status in results], elapsed
+
+    async def load_asgi(self, paths, host, concurrency):
+        handler = ASGIHandler()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def request(url):
+            parts = urlsplit(url)
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+                'method': 'GET', 'scheme': 'http', 'path': parts.path,
+                'raw_path': parts.path.encode(), 'query_string': parts.query.encode(),
+                'headers': [(b'host', host.encode())],
+                'client': ('127.0.0.1', 0), 'server': (host, 80),
+            }
+            done = asyncio.Event()
+            status = []
+            body_sent = False
+
+            async def receive():
+                nonlocal body_sent
+                if not body_sent:
+                    body_sent = True
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                # Обработчик ждет разрыва соединения, пока отдает ответ
+                await done.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+                elif message['type'] == 'http.response.body' and not message.get('more_body'):
+                    done.set()
+
+            async with semaphore:
+                started = time.perf_counter()
+                await handler(scope, receive, send)
+                return time.perf_counter() - started, status[0]
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(request(url) for url in paths))
+        elapsed = time.perf_counter() - started
+        return [latency for latency, _ in results], [status for _, status in results], elapsed
@@ -0,0 +1,112 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.db import SQLITE_PRAGMAS, pragma_statements
+
+MODES = {
+    'rollback-journal': {'journal_mode': 'DELETE'},
+    'wal+pragmas': SQLITE_PRAGMAS,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет пропускную способность чтения SQLite при параллельной записи: "
+        "журнал по умолчанию против WAL с PRAGMA из core.db (на временном файле)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=5.0)
+        parser.add_argument('--rows', type=int, default=20000, help="Строк в таблице перед замером")
+
+    def handle(self, *args, **options):
+        results = {}
+        for mode, pragmas in MODES.items():
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'bench.sqlite3')
+                self.prepare(path, pragmas, options['rows'])
+                results[mode] = self.run(path, pragmas, options)
+            reads, writes, errors = results[mode]
+            seconds = options['seconds']
+            self.stdout.write(
+                f"{mode}: чтений {reads / seconds:.0f}/с, записей {writes / seconds:.0f}/с, "
+                f"ошибок «database is locked»: {errors}"
+            )
+        baseline = results['rollback-journal'][0] or 1
+        self.stdout.write(self.style.SUCCESS(
+            f"Прирост пропускной способности чтения: x{results['wal+pragmas'][0] / baseline:.1f}"
+        ))
+
+    def connect(self, path, pragmas):
+        # Как у Django: таймаут ожидания блокировки sqlite3 по умолчанию — 5 с
+        connection = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        for statement in pragma_statements(pragmas):
+            connection.execute(statement)
+        return connection
+
+    def prepare(self, path, pragmas, rows):
+        connection = self.connect(path, pragmas)
+        connection.execute("CREATE TABLE booking (id INTEGER PRIMARY KEY, album INTEGER, note TEXT)")
+        connection.execute("CREATE INDEX booking_album ON booking (album)")
+        connection.execute("BEGIN")
+        connection.executemany(
+            "INSERT INTO booking (album, note) VALUES (?, ?)",
+            ((number % 100, 'x' * 100) for number in range(rows)),
+        )
+        connection.execute("COMMIT")
+        connection.close()
+
+    def run(self, path, pragmas, options):
+        stop = threading.Event()
+        counters = {'reads': 0, 'writes': 0, 'errors': 0}
+        lock = threading.Lock()
+
+        def count(name):
+            with lock:
+                counters[name] += 1
+
+        def reader(number):
+            connection = self.connect(path, pragmas)
+            while not stop.is_set():
+                try:
+                    connection.execute(
+                        "SELECT album, COUNT(*) FROM booking WHERE album BETWEEN ? AND ? GROUP BY album",
+                        (number, number + 10),
+                    ).fetchall()
+                    count('reads')
+                except sqlite3.OperationalError:
+                    count('errors')
+            connection.close()
+
+        def writer(number):
+            connection = self.connect(path, pragmas)
+            while not stop.is_set():
+                try:
+                    connection.execute("BEGIN IMMEDIATE")
+                    connection.executemany(
+                        "INSERT INTO booking (album, note) VALUES (?, ?)", ((number, 'y' * 100) for _ in range(20))
+                    )
+                    connection.execute("COMMIT")
+                    count('writes')
+                except sqlite3.OperationalError:
+                    if connection.in_transaction:
+                        connection.execute("ROLLBACK")
+                    count('errors')
+            connection.close()
+
+        threads = [threading.Thread(target=reader, args=(number,)) for number in range(options['readers'])]
+        threads += [threading.Thread(target=writer, args=(number,)) for number in range(options['writers'])]
+        for thread in threads:
+            thread.start()
+        time.sleep(options['seconds'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return counters['reads'], counters['writes'], counters['errors']
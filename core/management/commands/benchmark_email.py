@@ -0,0 +1,56 @@
+import time
+
+from django.core.mail import send_mail
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from core import mailqueue
+from utils.smtpstub import SMTPStub
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает отправку писем из запроса (новое SMTP-соединение на письмо) "
+        "и через очередь (пачка через одно соединение) на локальной SMTP-заглушке"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=50)
+        parser.add_argument('--connect-delay', type=float, default=0.3, help="Имитация TLS-рукопожатия и авторизации, с")
+        parser.add_argument('--reply-delay', type=float, default=0.01, help="Задержка ответа сервера на письмо, с")
+        parser.add_argument('--batch-size', type=int, default=mailqueue.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        count = options['messages']
+        with SMTPStub(options['connect_delay'], options['reply_delay']) as stub, override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1', EMAIL_PORT=stub.port,
+            EMAIL_USE_TLS=False, EMAIL_USE_SSL=False, EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='',
+        ):
+            started = time.perf_counter()
+            for number in range(count):
+                send_mail(f"Письмо {number}", "Текст", 'site@example.com', ['owner@example.com'])
+            direct = time.perf_counter() - started
+            self.report("Отправка из запроса", count, direct, direct, stub.connections)
+
+            connections_before = stub.connections
+            # Письма очереди не должны остаться в базе
+            with transaction.atomic():
+                started = time.perf_counter()
+                for number in range(count):
+                    mailqueue.enqueue(f"Письмо {number}", "Текст", ['owner@example.com'], 'site@example.com')
+                enqueued = time.perf_counter() - started
+
+                started = time.perf_counter()
+                while sum(mailqueue.process(options['batch_size'])):
+                    pass
+                delivered = time.perf_counter() - started
+                transaction.set_rollback(True)
+            self.report("Очередь", count, enqueued, delivered, stub.connections - connections_before)
+
+    def report(self, title, count, request_time, delivery_time, connections):
+        self.stdout.write(
+            f"{title}: задержка запроса {request_time / count * 1000:.1f} мс/письмо, "
+            f"пропускная способность {count / delivery_time:.1f} писем/с, SMTP-соединений: {connections}"
+        )
@@ -0,0 +1,96 @@
+import os
+import random
+import time
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+
+from core.media import serve_media
+
+
+class Command(BaseCommand):
+    help = (
+        "Проверяет корректность Range-ответов медиа-view и измеряет скорость отдачи. "
+        "По умолчанию запросы выполняются в процессе, с --base-url — к запущенному серверу"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help="Путь к файлу относительно MEDIA_ROOT (по умолчанию создается временный)")
+        parser.add_argument('--size', type=int, default=64, help="Размер временного файла, МБ")
+        parser.add_argument('--requests', type=int, default=50, help="Количество случайных Range-запросов")
+        parser.add_argument('--base-url', help="Адрес запущенного сервера, например http://127.0.0.1:8000")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        temporary = path is None
+        if temporary:
+            path = '_range_check/sample.bin'
+            full_path = os.path.join(settings.MEDIA_ROOT, path)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            with open(full_path, 'wb') as fh:
+                for _ in range(options['size']):
+                    fh.write(os.urandom(1024 * 1024))
+        else:
+            full_path = os.path.join(settings.MEDIA_ROOT, path)
+            if not os.path.isfile(full_path):
+                raise CommandError(f"Файл {full_path} не найден")
+
+        try:
+            self._run(path, full_path, options)
+        finally:
+            if temporary:
+                os.remove(full_path)
+                os.rmdir(os.path.dirname(full_path))
+
+    def _fetch(self, path, headers, base_url):
+        if base_url:
+            url = base_url.rstrip('/') + settings.MEDIA_URL + path
+            with urlopen(Request(url, headers=headers)) as response:
+                return response.status, dict(response.headers), response.read()
+        request = RequestFactory().get(settings.MEDIA_URL + path, headers=headers)
+        response = serve_media(request, path)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        return response.status_code, dict(response.headers), body
+
+    def _run(self, path, full_path, options):
+        size = os.path.getsize(full_path)
+        rng = random.Random(options['seed'])
+        base_url = options['base_url']
+
+        with open(full_path, 'rb') as fh:
+            cases = [(0, 0), (size - 1, size - 1), (0, size - 1)]
+            for _ in range(options['requests']):
+                start = rng.randrange(size)
+                cases.append((start, rng.randrange(start, min(size, start + 8 * 1024 * 1024))))
+
+            failures = 0
+            transferred = 0
+            started = time.perf_counter()
+            for start, end in cases:
+                status, headers, body = self._fetch(path, {'Range': f'bytes={start}-{end}'}, base_url)
+                fh.seek(start)
+                expected = fh.read(end - start + 1)
+                transferred += len(body)
+                if status != 206 or body != expected or headers.get('Content-Range') != f'bytes {start}-{end}/{size}':
+                    failures += 1
+                    self.stderr.write(self.style.ERROR(f"Неверный ответ для bytes={start}-{end}: статус {status}"))
+            ranged_elapsed = time.perf_counter() - started
+
+        started = time.perf_counter()
+        status, headers, body = self._fetch(path, {}, base_url)
+        full_elapsed = time.perf_counter() - started
+        if status != 200 or len(body) != size:
+            failures += 1
+            self.stderr.write(self.style.ERROR(f"Полная отдача: статус {status}, получено {len(body)} из {size} байт"))
+
+        mb = 1024 * 1024
+        self.stdout.write(f"Range-запросов: {len(cases)}, {transferred / mb:.1f} МБ за {ranged_elapsed:.2f} с "
+                          f"({transferred / mb / ranged_elapsed:.1f} МБ/с)")
+        self.stdout.write(f"Полный файл: {size / mb:.1f} МБ за {full_elapsed:.2f} с ({size / mb / full_elapsed:.1f} МБ/с)")
+        if failures:
+            raise CommandError(f"Ошибок: {failures}")
+        self.stdout.write(self.style.SUCCESS("Все ответы корректны"))
@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from core import storage
+
+
+class Command(BaseCommand):
+    help = "Удаляет из контентно-адресуемого хранилища файлы, на которые больше нет ссылок"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--grace-hours', type=int, default=24, help="Не удалять файлы, записанные позже, чем N часов назад")
+        parser.add_argument('--recount', action='store_true', help="Сначала пересчитать все счетчики ссылок по базе")
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['recount']:
+            fixed = storage.recount()
+            self.stdout.write(f"Исправлено счетчиков ссылок: {fixed}")
+        deleted = storage.collect_garbage(
+            batch_size=options['batch_size'],
+            grace_period=timedelta(hours=options['grace_hours']),
+            dry_run=options['dry_run'],
+        )
+        verb = "Будет удалено" if options['dry_run'] else "Удалено"
+        self.stdout.write(self.style.SUCCESS(f"{verb} файлов: {deleted}"))
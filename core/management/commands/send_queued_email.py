@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import mailqueue
+
+
+class Command(BaseCommand):
+    help = "Отправляет письма из очереди пачками через одно SMTP-соединение"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=mailqueue.BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true', help="Работать постоянно, опрашивая очередь (иначе — до опустошения очереди)")
+        parser.add_argument('--interval', type=float, default=5.0, help="Пауза между опросами пустой очереди, с")
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = mailqueue.process(options['batch_size'])
+            if sent or failed:
+                self.stdout.write(f"Отправлено: {sent}, ошибок: {failed}")
+            # Полная пачка — в очереди, вероятно, есть еще письма
+            if sent + failed < options['batch_size']:
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
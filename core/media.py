@@ -0,0 +1,173 @@
+"""
+Отдача медиафайлов (в первую очередь Video.video_file) с поддержкой Range.
+
+Без Range браузер не может перемотать видео: каждый seek заново качает файл
+с начала. View отвечает 206 Partial Content на одиночные диапазоны и
+учитывает If-Range. Сам файл отдается через FileResponse: WSGI-сервер с
+``wsgi.file_wrapper`` (gunicorn, uWSGI) передает его через ``os.sendfile``
+без копирования в пространство пользователя — для этого файл заранее
+позиционируется на начало диапазона, а длина задается Content-Length.
+
+Если перед Django стоит nginx или Apache, отдачу можно делегировать им
+(настройка MEDIA_SENDFILE_BACKEND): view только проверяет путь и ставит
+X-Accel-Redirect / X-Sendfile.
+
+Отдаются только зафиксированные блобы контентно-адресуемого хранилища и
+файлы из известных префиксов загрузок (MEDIA_SERVE_PREFIXES): временные
+файлы незавершенных загрузок и фото отзывов до модерации недоступны.
+"""
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+from core import storage
+from utils.ranges import RangeNotSatisfiable, content_range, if_range_matches, parse_range
+
+BLOCK_SIZE = 256 * 1024
+BLOB_NAME_RE = re.compile(r'%s/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?' % storage.BLOB_PREFIX)
+
+
+class RangedFile:
+    """
+    Файл, ограниченный диапазоном байт.
+
+    Курсор настоящего файла стоит на начале диапазона, поэтому sendfile в
+    WSGI-сервере начнет с нужного смещения, а чтение через read() не выйдет
+    за конец диапазона. Методов tell/seek нет намеренно: Content-Length
+    выставляется view, а не FileResponse.
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.file.seek(start)
+        self.remaining = length
+        self.name = file.name
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def _resolve(path):
+    name = posixpath.normpath(path).lstrip('/')
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, name)
+    except Exception:
+        raise Http404
+    if not _is_servable(name) or not os.path.isfile(full_path):
+        raise Http404
+    return name, full_path
+
+
+def _is_servable(name):
+    from core.models import Blob
+    if storage.is_blob(name):
+        if not BLOB_NAME_RE.fullmatch(name) or not Blob.objects.filter(name=name).exists():
+            return False
+    elif not name.startswith(tuple(settings.MEDIA_SERVE_PREFIXES)):
+        return False
+    return not _is_hidden_review_photo(name)
+
+
+def _is_hidden_review_photo(name):
+    """Файл используется только отзывами, которые еще не опубликованы"""
+    from reviews.models import Review
+    reviews = Review.objects.filter(photo=name)
+    if not reviews.exists() or reviews.filter(status='approved', is_public=True).exists():
+        return False
+    # Тот же блоб может принадлежать и опубликованному содержимому
+    return not any(
+        model._base_manager.filter(**{field.attname: name}).exists()
+        for model, field in storage.content_file_fields()
+        if model is not Review
+    )
+
+
+def _offload(name, full_path):
+    """Делегирует отдачу файла фронтовому серверу"""
+    backend = getattr(settings, 'MEDIA_SENDFILE_BACKEND', None)
+    if backend == 'nginx':
+        response = HttpResponse()
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX + quote(name)
+    elif backend == 'apache':
+        response = HttpResponse()
+        response['X-Sendfile'] = quote(full_path)
+    else:
+        return None
+    # Content-Type пусть определит сервер по файлу
+    del response['Content-Type']
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    """Отдает файл из MEDIA_ROOT с поддержкой Range/If-Range и условных запросов"""
+    if not settings.MEDIA_SERVE:
+        raise Http404
+    name, full_path = _resolve(path)
+
+    offloaded = _offload(name, full_path)
+    if offloaded is not None:
+        return offloaded
+
+    stat = os.stat(full_path)
+    size = stat.st_size
+    last_modified = int(stat.st_mtime)
+    etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    headers = {
+        'Accept-Ranges': 'bytes',
+        'ETag': etag,
+        'Last-Modified': http_date(last_modified),
+    }
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+
+    byte_range = None
+    if if_range_matches(request, etag, last_modified):
+        try:
+            byte_range = parse_range(request.headers.get('Range'), size)
+        except RangeNotSatisfiable:
+            return HttpResponse(status=416, headers={'Content-Range': f'bytes */{size}'})
+
+    start, end = byte_range or (0, size - 1)
+    length = max(end - start + 1, 0)
+    if byte_range:
+        headers['Content-Range'] = content_range(start, end, size)
+
+    if request.method == 'HEAD':
+        headers['Content-Length'] = str(length)
+        return HttpResponse(status=206 if byte_range else 200, content_type=content_type, headers=headers)
+
+    response = FileResponse(
+        RangedFile(open(full_path, 'rb'), start, length),
+        status=206 if byte_range else 200,
+        content_type=content_type,
+        headers=headers,
+    )
+    response.block_size = BLOCK_SIZE
+    response['Content-Length'] = str(length)
+    return response
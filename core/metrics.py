@@ -0,0 +1,463 @@
+"""
+Метрики в текстовом формате Prometheus.
+
+Что замеряется:
+
+* ``MetricsMiddleware`` — длительность ответа по имени URL (``view``),
+  число и суммарное время SQL-запросов за запрос (обертка
+  ``execute_wrappers`` на каждом соединении, см. ``instrument_connection``);
+* ``DjangoTemplates`` (бэкенд шаблонов) — время рендера по имени шаблона;
+* ``notification()`` — длительность и исход исходящих уведомлений
+  (письма из core.mailqueue, Telegram).
+
+Метки — только имена URL и шаблонов, а не пути, поэтому число рядов
+ограничено. Значения копятся в памяти процесса; если задан каталог
+``PROMETHEUS_MULTIPROC_DIR``, каждый процесс раз в ``FLUSH_INTERVAL``
+секунд (и при выходе) записывает свои значения в файл ``<pid>.json``, а
+``/metrics`` складывает файлы всех процессов — ответ одинаков, какой бы
+воркер gunicorn/uvicorn его ни отдал.
+
+Воркеры перезапускаются (max_requests, падения), и файлы завершившихся
+процессов копились бы в каталоге. Поэтому при сборке файлы процессов,
+которых уже нет (проверка по pid), сворачиваются в ``archive.json``:
+накопленные ими счетчики не пропадают и не уменьшаются, а файлов в
+каталоге остается столько, сколько живых процессов, плюс архив. Обнулить
+метрики целиком можно, очистив каталог перед стартом сервера, как для
+prometheus_client; сам сервер каталог не очищает.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+try:
+    import fcntl
+except ImportError:  # Windows: файлы завершившихся процессов не сворачиваются
+    fcntl = None
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.cache import never_cache
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+FLUSH_INTERVAL = 1.0
+# Границы корзин гистограмм по умолчанию (секунды), как у prometheus_client
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+UNRESOLVED_VIEW = '<unresolved>'
+ARCHIVE_FILE = 'archive.json'
+
+
+class Registry:
+    """Метрики процесса и их запись в каталог для сборки по нескольким процессам"""
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.flushed_at = 0.0
+        self.loaded = False
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    @staticmethod
+    def directory():
+        return getattr(settings, 'PROMETHEUS_MULTIPROC_DIR', None)
+
+    def snapshot(self):
+        """{имя метрики: [[значения меток, значения], ...]}"""
+        with self.lock:
+            return {
+                name: [[list(labels), list(values)] for labels, values in metric.values.items()]
+                for name, metric in self.metrics.items()
+            }
+
+    def load(self, data):
+        """Прибавляет значения из снимка (своего файла от прежнего процесса с тем же pid)"""
+        with self.lock:
+            for name, rows in data.items():
+                metric = self.metrics.get(name)
+                if metric is None:
+                    continue
+                for labels, values in rows:
+                    if len(values) == metric.width:
+                        metric.add(tuple(labels), values)
+
+    def flush(self):
+        directory = self.directory()
+        # Другой поток этого процесса уже пишет файл
+        if not directory or not self.flush_lock.acquire(blocking=False):
+            return
+        try:
+            self.write(directory)
+        except OSError as exc:
+            # Метрики не должны ронять запрос
+            logger.warning("Не удалось записать метрики в %s: %s", directory, exc)
+        finally:
+            self.flush_lock.release()
+
+    def write(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{os.getpid()}.json')
+        if not self.loaded:
+            self.loaded = True
+            # Тот же pid у нового процесса: счетчики продолжаются, а не обнуляются
+            try:
+                with open(path) as file:
+                    self.load(json.load(file))
+            except (OSError, ValueError):
+                pass
+        self.flushed_at = time.monotonic()
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(self.snapshot(), file)
+        os.replace(temporary, path)
+
+    def maybe_flush(self):
+        if self.directory() and time.monotonic() - self.flushed_at >= FLUSH_INTERVAL:
+            self.flush()
+
+    def collect(self):
+        """Значения всех процессов (или только этого, без каталога)"""
+        directory = self.directory()
+        if not directory:
+            return self.snapshot()
+        self.flush()
+        self.compact(directory)
+        merged = {}
+        for filename in sorted(os.listdir(directory)):
+            if filename.endswith('.json'):
+                merge_snapshot(merged, read_snapshot(os.path.join(directory, filename)) or {})
+        return snapshot_rows(merged)
+
+    def compact(self, directory):
+        """Сворачивает файлы завершившихся процессов в ARCHIVE_FILE"""
+        if fcntl is None:
+            return
+        try:
+            with open(os.path.join(directory, '.lock'), 'w') as lock:
+                # Сворачивать может только один процесс, иначе значения попадут в архив дважды
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                dead = [
+                    os.path.join(directory, filename)
+                    for filename in os.listdir(directory)
+                    if filename.endswith('.json') and filename[:-5].isdigit() and not pid_alive(int(filename[:-5]))
+                ]
+                if not dead:
+                    return
+                archive = os.path.join(directory, ARCHIVE_FILE)
+                archived = read_snapshot(archive) if os.path.exists(archive) else {}
+                if archived is None:
+                    return
+                merged = {}
+                merge_snapshot(merged, archived)
+                readable = []
+                for path in dead:
+                    data = read_snapshot(path)
+                    if data is not None:
+                        merge_snapshot(merged, data)
+                        readable.append(path)
+                temporary = f'{archive}.tmp'
+                with open(temporary, 'w') as file:
+                    json.dump(snapshot_rows(merged), file)
+                os.replace(temporary, archive)
+                for path in readable:
+                    os.remove(path)
+        except OSError as exc:
+            logger.warning("Не удалось свернуть метрики в %s: %s", directory, exc)
+
+    def exposition(self):
+        """Текст для Prometheus"""
+        data = self.collect()
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            for labels, values in sorted(data.get(name, []), key=lambda row: row[0]):
+                lines.extend(metric.samples(dict(zip(metric.labelnames, labels)), values))
+        return '\n'.join(lines) + '\n'
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # процесс есть, но принадлежит другому пользователю
+    return True
+
+
+def read_snapshot(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None  # файл пишется прямо сейчас другим процессом
+
+
+def merge_snapshot(merged, data):
+    """Прибавляет снимок к {имя метрики: {значения меток: значения}}"""
+    for name, rows in data.items():
+        target = merged.setdefault(name, {})
+        for labels, values in rows:
+            labels = tuple(labels)
+            current = target.get(labels)
+            target[labels] = values if current is None else [a + b for a, b in zip(current, values)]
+
+
+def snapshot_rows(merged):
+    return {name: [[list(labels), values] for labels, values in rows.items()] for name, rows in merged.items()}
+
+
+REGISTRY = Registry()
+atexit.register(REGISTRY.flush)
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"'))
+        for name, value in labels.items()
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric:
+    """Ряды метрики: {значения меток: список чисел}; при сборке процессов числа складываются"""
+    kind = None
+    width = 1
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.registry = registry
+        self.values = {}
+        registry.register(self)
+
+    def add(self, labels, values):
+        current = self.values.get(labels)
+        if current is None:
+            self.values[labels] = list(values)
+        else:
+            for index, value in enumerate(values):
+                current[index] += value
+
+    def update(self, labels, values):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self.registry.lock:
+            self.add(key, values)
+        self.registry.maybe_flush()
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        self.update(labels, [amount])
+
+    def samples(self, labels, values):
+        yield f'{self.name}{format_labels(labels)} {format_value(values[0])}'
+
+
+class Histogram(Metric):
+    """Значения: число наблюдений в каждой корзине (без накопления), затем сумма"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, **kwargs):
+        self.buckets = tuple(buckets)
+        self.width = len(self.buckets) + 2  # корзины, +Inf и сумма
+        super().__init__(name, documentation, labelnames, **kwargs)
+
+    def observe(self, value, **labels):
+        values = [0] * self.width
+        index = next((index for index, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        values[index] = 1
+        values[-1] = value
+        self.update(labels, values)
+
+    def samples(self, labels, values):
+        cumulative = 0
+        for bound, count in zip((*self.buckets, '+Inf'), values):
+            cumulative += count
+            le = bound if bound == '+Inf' else format_value(bound)
+            yield f'{self.name}_bucket{format_labels({**labels, "le": le})} {format_value(cumulative)}'
+        yield f'{self.name}_sum{format_labels(labels)} {format_value(values[-1])}'
+        yield f'{self.name}_count{format_labels(labels)} {format_value(cumulative)}'
+
+
+REQUEST_DURATION = Histogram(
+    'django_http_request_duration_seconds', "Длительность ответа по имени URL", ['view', 'method'],
+)
+REQUESTS = Counter(
+    'django_http_requests_total', "Ответы по имени URL и коду", ['view', 'method', 'status'],
+)
+DB_QUERIES = Histogram(
+    'django_db_queries_per_request', "SQL-запросов за запрос", ['view'], buckets=QUERY_COUNT_BUCKETS,
+)
+DB_DURATION = Histogram(
+    'django_db_query_duration_per_request_seconds', "Суммарное время SQL-запросов за запрос", ['view'],
+)
+TEMPLATE_DURATION = Histogram(
+    'django_template_render_duration_seconds', "Время рендера шаблона", ['template'],
+)
+NOTIFICATION_DURATION = Histogram(
+    'outbound_notification_duration_seconds', "Длительность отправки уведомления", ['channel'],
+)
+NOTIFICATIONS = Counter(
+    'outbound_notifications_total', "Отправленные уведомления по исходу", ['channel', 'outcome'],
+)
+
+
+@contextmanager
+def notification(channel):
+    """Замеряет отправку одного уведомления; исключение внутри — исход error"""
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        NOTIFICATION_DURATION.observe(time.perf_counter() - started, channel=channel)
+        NOTIFICATIONS.inc(channel=channel, outcome=outcome)
+
+
+class QueryStats:
+    """Число и время SQL-запросов одного запроса к сайту"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+
+_query_stats = ContextVar('query_stats', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """Обертка execute_wrapper на каждом соединении: пишет в QueryStats текущего запроса"""
+    stats = _query_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.count += 1
+        stats.duration += time.perf_counter() - started
+
+
+def instrument_connection(sender, connection, **kwargs):
+    """
+    Обработчик connection_created.
+
+    Соединения свои у каждого потока, а под ASGI запросы view выполняются в
+    потоке sync_to_async, поэтому обертка ставится на соединение один раз, а
+    статистика запроса передается через ContextVar — он доходит и до потоков.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None and match.view_name else UNRESOLVED_VIEW
+
+
+class MetricsMiddleware:
+    """Ставится первым, чтобы время ответа включало остальные middleware"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started, stats = time.perf_counter(), QueryStats()
+        token = _query_stats.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            _query_stats.reset(token)
+        self.record(request, response, started, stats)
+        return response
+
+    async def __acall__(self, request):
+        started, stats = time.perf_counter(), QueryStats()
+        token = _query_stats.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _query_stats.reset(token)
+        self.record(request, response, started, stats)
+        return response
+
+    @staticmethod
+    def record(request, response, started, stats):
+        view = view_name(request)
+        REQUEST_DURATION.observe(time.perf_counter() - started, view=view, method=request.method)
+        REQUESTS.inc(view=view, method=request.method, status=response.status_code)
+        DB_QUERIES.observe(stats.count, view=view)
+        DB_DURATION.observe(stats.duration, view=view)
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            TEMPLATE_DURATION.observe(time.perf_counter() - started, template=self.template.name or '<string>')
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """Стандартный бэкенд шаблонов, замеряющий время рендера"""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
+
+
+def metrics_allowed(request):
+    """
+    Доступ к /metrics: при заданном METRICS_TOKEN — только с заголовком
+    ``Authorization: Bearer <token>``, иначе — с адресов METRICS_ALLOWED_IPS
+    или при DEBUG. Без настроек метрики закрыты.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token:
+        return constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    return settings.DEBUG or request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', ())
+
+
+@never_cache
+def metrics_view(request):
+    if not metrics_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(REGISTRY.exposition(), content_type=CONTENT_TYPE)
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 class SiteSettings(models.Model):
@@ -68,4 +69,55 @@ class Service(models.Model):
         ordering = ['price']
 
     def __str__(self):
-        return f"{self.name} - {self.price}₽"
\ No newline at end of file
+        return f"{self.name} - {self.price}₽"
+
+class Blob(models.Model):
+    """Уникальный файл в контентно-адресуемом хранилище (см. core.storage)"""
+    digest = models.CharField(_("SHA-256"), max_length=64, db_index=True)
+    name = models.CharField(_("Имя в хранилище"), max_length=255, unique=True)
+    size = models.BigIntegerField(_("Размер"), default=0)
+    ref_count = models.PositiveIntegerField(_("Количество ссылок"), default=0, db_index=True)
+    created_at = models.DateTimeField(_("Дата создания"), auto_now_add=True)
+    # Время последней записи этого содержимого в хранилище; сборщик мусора
+    # не трогает недавно записанные блобы, даже если ссылок на них пока нет
+    touched_at = models.DateTimeField(_("Последняя запись"), default=timezone.now, db_index=True)
+
+    class Meta:
+        verbose_name = _("Файл хранилища")
+        verbose_name_plural = _("Файлы хранилища")
+
+    def __str__(self):
+        return self.name
+
+
+class OutgoingEmail(models.Model):
+    """Письмо в очереди отправки (см. core.mailqueue)"""
+    STATUS_CHOICES = [
+        ('pending', _("В очереди")),
+        ('sent', _("Отправлено")),
+        ('failed', _("Не отправлено")),
+    ]
+
+    subject = models.CharField(_("Тема"), max_length=255)
+    body = models.TextField(_("Текст"))
+    from_email = models.CharField(_("Отправитель"), max_length=255)
+    to = models.JSONField(_("Получатели"), default=list)
+    reply_to = models.JSONField(_("Ответить"), default=list, blank=True)
+    status = models.CharField(_("Статус"), max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(_("Попыток"), default=0)
+    # Для pending — когда письмо можно брать в работу (повтор с задержкой или аренда воркером)
+    next_attempt_at = models.DateTimeField(_("Следующая попытка"), default=timezone.now)
+    last_error = models.TextField(_("Последняя ошибка"), blank=True)
+    created_at = models.DateTimeField(_("Дата создания"), auto_now_add=True)
+    sent_at = models.DateTimeField(_("Дата отправки"), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("Исходящее письмо")
+        verbose_name_plural = _("Исходящие письма")
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outgoing_email_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} → {', '.join(self.to)}"
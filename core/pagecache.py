@@ -0,0 +1,169 @@
+"""
+Кэш целых публичных страниц для анонимных посетителей.
+
+Страница участвует в кэше, если view помечен тегами: у класса атрибут
+``page_cache_tags``, у функции — декоратор ``cache_public_page``. Теги —
+это области поколений (см. portfolio.fragments): ``PORTFOLIO``, области
+альбомов и типов съемки, отзывов, услуг, справочников. View может добавить
+теги во время работы (``add_tags``), например альбом, который он показывает,
+и сократить срок хранения страницы (``limit_timeout``).
+
+Вместе со страницей в кэше хранятся поколения ее тегов на момент рендера.
+Сигналы, которые уже увеличивают поколения при сохранении моделей, тем
+самым вытесняют ровно те страницы, где есть соответствующий тег: сохранение
+альбома сбрасывает его страницу и списки портфолио, но не «Обо мне» или
+отзывы. ``purge`` — то же самое вручную. Поэтому кэш (CACHES) должен быть
+общим для всех процессов сервера, см. portfolio.fragments.
+
+Ключ — хост, язык (префикс ``i18n_patterns``), путь и значимые параметры
+запроса. Кэш обходится для POST, авторизованных пользователей и сессий с
+flash-сообщениями; не сохраняются ответы с cookie (в том числе CSRF) и
+показанными сообщениями.
+"""
+import hashlib
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_max_age
+from django.utils.translation import get_language_from_path
+
+from portfolio import fragments
+from . import reference
+
+PAGE_CACHE_TIMEOUT = getattr(settings, 'PAGE_CACHE_TIMEOUT', 60 * 60 * 24)
+# Метки рекламных кампаний не меняют страницу
+IGNORED_PARAMS = ('fbclid', 'gclid', 'yclid', '_openstat')
+IGNORED_PREFIXES = ('utm_',)
+# Справочники (настройки сайта в шапке и подвале) есть на каждой странице
+SITE_TAGS = (reference.SCOPE,)
+
+
+def cache_public_page(*tags):
+    """Помечает функцию-view как кэшируемую страницу с тегами tags"""
+    def decorator(view_func):
+        view_func.page_cache_tags = tags
+        return view_func
+    return decorator
+
+
+def add_tags(request, *tags):
+    """Добавляет теги к странице, которая сейчас рендерится (вызывать до чтения данных)"""
+    fragments.track(request, *tags)
+
+
+def limit_timeout(request, seconds):
+    """Сокращает срок хранения страницы, которая сейчас рендерится (например, до полуночи)"""
+    request.page_cache_timeout = min(getattr(request, 'page_cache_timeout', PAGE_CACHE_TIMEOUT), max(int(seconds), 1))
+
+
+def purge(*tags):
+    """Вытесняет все страницы с любым из тегов"""
+    fragments.bump(*tags)
+
+
+def view_tags(view_func):
+    tags = getattr(view_func, 'page_cache_tags', None)
+    if tags is None:
+        tags = getattr(getattr(view_func, 'view_class', None), 'page_cache_tags', None)
+    return tags
+
+
+def is_anonymous_request(request):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if CookieStorage.cookie_name in request.COOKIES:
+        return False
+    if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+        return True
+    # Сессия есть: годится только анонимная и без отложенных сообщений
+    return not request.user.is_authenticated and '_messages' not in request.session
+
+
+def cache_key(request):
+    language = get_language_from_path(request.path_info) or settings.LANGUAGE_CODE
+    params = sorted(
+        (key, value)
+        for key, values in request.GET.lists()
+        if key not in IGNORED_PARAMS and not key.startswith(IGNORED_PREFIXES)
+        for value in values
+    )
+    digest = hashlib.md5(repr((request.get_host(), request.path, params)).encode('utf-8')).hexdigest()
+    return f'pagecache:{language}:{digest}'
+
+
+def is_cacheable_response(request, response):
+    if response.status_code != 200 or response.streaming or response.cookies:
+        return False
+    # Страница с CSRF-токеном или сообщениями принадлежит конкретному посетителю
+    if request.META.get('CSRF_COOKIE_NEEDS_UPDATE'):
+        return False
+    storage = getattr(request, '_messages', None)
+    if storage is not None and (storage.used or storage.added_new):
+        return False
+    cache_control = response.get('Cache-Control', '')
+    return 'private' not in cache_control and 'no-store' not in cache_control and get_max_age(response) != 0
+
+
+class PageCacheMiddleware:
+    """Ставится последним: ответы из кэша все равно проходят через остальные middleware"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        if self.should_store(request, response):
+            self.store(request._page_cache_key, request.generation_snapshot, response, self.timeout(request))
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if self.should_store(request, response):
+            await sync_to_async(self.store)(
+                request._page_cache_key, request.generation_snapshot, response, self.timeout(request)
+            )
+        return response
+
+    def should_store(self, request, response):
+        key = getattr(request, '_page_cache_key', None)
+        return key is not None and request.method == 'GET' and is_cacheable_response(request, response)
+
+    def timeout(self, request):
+        return getattr(request, 'page_cache_timeout', PAGE_CACHE_TIMEOUT)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        tags = view_tags(view_func)
+        if tags is None or not is_anonymous_request(request):
+            return None
+
+        key = cache_key(request)
+        entry = cache.get(key)
+        if entry is not None and fragments.generations(entry['tags']) == entry['generations']:
+            response = HttpResponse(entry['content'], status=entry['status'], headers=entry['headers'])
+            response['X-Page-Cache'] = 'hit'
+            return response
+
+        request._page_cache_key = key
+        request.generation_snapshot = {}
+        add_tags(request, *SITE_TAGS, *tags)
+        return None
+
+    def store(self, key, snapshot, response, timeout=PAGE_CACHE_TIMEOUT):
+        tags = sorted(snapshot)
+        cache.set(key, {
+            'content': response.content,
+            'status': response.status_code,
+            'headers': {name: value for name, value in response.items() if name.lower() != 'x-page-cache'},
+            'tags': tags,
+            'generations': [snapshot[tag] for tag in tags],
+        }, timeout)
+        response['X-Page-Cache'] = 'miss'
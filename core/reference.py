@@ -0,0 +1,101 @@
+"""
+Справочные данные в памяти процесса.
+
+Настройки сайта, активные типы съемки и услуги меняются редко, а нужны
+почти на каждой странице. Они загружаются один раз и хранятся в памяти
+процесса вместе с общей версией — счетчиком поколения в кэше (см.
+portfolio.fragments). Сохранение любой из этих моделей увеличивает версию
+(сигналы в core.signals и portfolio.signals), и каждый процесс, увидев новую
+версию, перечитывает данные. Версия читается из кэша один раз за запрос,
+поэтому в установившемся режиме справочники не стоят ни одного запроса к
+базе.
+
+Версия должна храниться в кэше, общем для всех процессов сервера (Redis или
+файловый кэш, см. CACHES и проверку core.W001): с LocMemCache остальные процессы
+не увидят новую версию и будут отдавать старые справочники.
+
+Объекты общие для всех запросов процесса — их нельзя изменять.
+"""
+import threading
+
+from asgiref.sync import sync_to_async
+from django.core.signals import request_started
+from django.db import transaction
+
+from portfolio import fragments
+from portfolio.models import ShootingType
+from .models import Service, SiteSettings
+
+SCOPE = 'reference'
+
+_loaders = {}
+# (версия, {имя: данные}) — заменяется целиком, чтобы потоки не видели половину
+_cache = (None, {})
+_request = threading.local()
+
+
+def register(name):
+    """Регистрирует функцию загрузки справочника"""
+    def decorator(loader):
+        _loaders[name] = loader
+        return loader
+    return decorator
+
+
+def _version():
+    version = getattr(_request, 'version', None)
+    if version is None:
+        version = _request.version = fragments.generations([SCOPE])[0]
+    return version
+
+
+def _forget_version(**kwargs):
+    _request.version = None
+
+
+request_started.connect(_forget_version, dispatch_uid='reference-version')
+
+
+def get(name):
+    global _cache
+    version = _version()
+    cached_version, values = _cache
+    if cached_version != version:
+        values = {}
+        _cache = (version, values)
+    if name not in values:
+        values[name] = _loaders[name]()
+    return values[name]
+
+
+async def aget(name):
+    """get для async view: загрузчики читают базу синхронным ORM"""
+    return await sync_to_async(get)(name)
+
+
+def invalidate():
+    """Перечитать справочники во всех процессах (после фиксации транзакции)"""
+    def bump():
+        fragments.bump(SCOPE)
+        _forget_version()
+    # Иначе другой процесс успеет перечитать еще не зафиксированные данные под новой версией
+    transaction.on_commit(bump)
+
+
+@register('site_settings')
+def site_settings():
+    return SiteSettings.load()
+
+
+@register('shooting_types')
+def shooting_types():
+    return tuple(ShootingType.objects.filter(is_active=True))
+
+
+@register('services')
+def services():
+    return tuple(Service.objects.filter(is_active=True))
+
+
+def shooting_type_by_slug(slug):
+    return next((item for item in get('shooting_types') if item.slug == slug), None)
@@ -0,0 +1,64 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from core import reference, storage
+from portfolio import fragments
+from .api import SERVICES
+from .models import Service, SiteSettings
+
+
+# Счетчики ссылок на блобы контентно-адресуемого хранилища
+def remember_file_names(sender, instance, raw=False, **kwargs):
+    instance._previous_file_names = {}
+    if instance.pk and not raw:
+        names = [field.attname for field in storage_fields(sender)]
+        instance._previous_file_names = sender._base_manager.filter(pk=instance.pk).values(*names).first() or {}
+
+
+def update_file_references(sender, instance, raw=False, **kwargs):
+    previous = getattr(instance, '_previous_file_names', {})
+    added, removed = [], []
+    for field in storage_fields(sender):
+        new_name = getattr(instance, field.attname).name or ''
+        old_name = previous.get(field.attname) or ''
+        if new_name != old_name:
+            added.append(new_name)
+            removed.append(old_name)
+    storage.retain(added)
+    storage.release(removed)
+
+
+def release_file_references(sender, instance, **kwargs):
+    storage.release([getattr(instance, field.attname).name or '' for field in storage_fields(sender)])
+
+
+_fields_by_model = {}
+
+
+def storage_fields(model):
+    return _fields_by_model.get(model, [])
+
+
+def connect_storage_signals():
+    for model, field in storage.content_file_fields():
+        _fields_by_model.setdefault(model, []).append(field)
+    for model in _fields_by_model:
+        uid = f'blob-refs-{model._meta.label_lower}'
+        pre_save.connect(remember_file_names, sender=model, dispatch_uid=uid)
+        post_save.connect(update_file_references, sender=model, dispatch_uid=uid)
+        post_delete.connect(release_file_references, sender=model, dispatch_uid=uid)
+
+
+# Поколение услуг для ETag API (см. core.api)
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+def invalidate_services(sender, instance, **kwargs):
+    fragments.bump(SERVICES)
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+@receiver(post_save, sender=SiteSettings)
+@receiver(post_delete, sender=SiteSettings)
+def invalidate_reference(sender, instance, **kwargs):
+    reference.invalidate()
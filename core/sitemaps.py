@@ -0,0 +1,151 @@
+"""
+Sitemap, разбитый на шарды, с кэшированием каждого шарда.
+
+Объекты раздела делятся на шарды по диапазонам pk (``shard_size`` штук в
+каждом), поэтому новый объект попадает в последний шард, а правка или
+удаление затрагивают только свой. Для шарда одним агрегатным запросом
+считается «отпечаток» — число объектов и максимальный ``updated_at``
+(разделы могут добавить свои агрегаты). Готовый XML шарда хранится в кэше
+вместе с отпечатком и перегенерируется, только если отпечаток изменился.
+
+Индекс строится одним GROUP BY по номеру шарда на раздел. Оба ответа
+отдаются с Last-Modified и ETag и поддерживают условные запросы.
+"""
+import hashlib
+
+from django.contrib.sitemaps import Sitemap
+from django.contrib.sites.requests import RequestSite
+from django.core.cache import cache
+from django.db.models import Count, F, Max, Value
+from django.http import Http404, HttpResponse
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+from .db import replica_reads
+
+CACHE_TIMEOUT = 60 * 60 * 24 * 7
+CONTENT_TYPE = 'application/xml; charset=utf-8'
+
+
+class ShardedSitemap(Sitemap):
+    """
+    Раздел sitemap, разбитый на шарды по pk.
+
+    Подкласс задает ``get_queryset()``; ``shard_size = None`` означает один шард на весь раздел.
+    """
+    shard_size = 1000
+    updated_field = 'updated_at'
+    template_name = 'core/sitemap.xml'
+
+    def __init__(self, shard=0):
+        self.shard = shard
+        self.limit = self.shard_size or 50000
+
+    def get_queryset(self):
+        raise NotImplementedError
+
+    def shard_queryset(self):
+        queryset = self.get_queryset()
+        if self.shard_size:
+            start = self.shard * self.shard_size
+            queryset = queryset.filter(pk__gte=start, pk__lt=start + self.shard_size)
+        return queryset
+
+    def items(self):
+        return self.shard_queryset().order_by('pk')
+
+    def lastmod(self, item):
+        return getattr(item, self.updated_field)
+
+    def fingerprint_aggregates(self):
+        return {'count': Count('pk', distinct=True), 'updated': Max(self.updated_field)}
+
+    def shard_lastmod(self, stats):
+        return stats['updated']
+
+    def shard_stats(self):
+        """Агрегаты всех шардов раздела одним GROUP BY: ``{номер шарда: агрегаты}``"""
+        queryset = self.get_queryset().order_by()
+        shard = F('pk') / self.shard_size if self.shard_size else Value(0)
+        rows = queryset.annotate(shard=shard).values('shard').annotate(**self.fingerprint_aggregates())
+        return {int(row.pop('shard')): row for row in rows if row['count']}
+
+    def current_stats(self):
+        """Агрегаты текущего шарда (None, если шард пуст)"""
+        stats = self.shard_queryset().order_by().aggregate(**self.fingerprint_aggregates())
+        return stats if stats['count'] else None
+
+
+def _fingerprint(*parts):
+    return hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+
+
+def _xml_response(request, content, etag, last_modified):
+    headers = {'ETag': f'"{etag}"'}
+    if last_modified:
+        headers['Last-Modified'] = http_date(last_modified.timestamp())
+    return HttpResponse(content, content_type=CONTENT_TYPE, headers=headers)
+
+
+@require_safe
+@replica_reads
+def index(request, sitemaps):
+    """Индекс sitemap: список всех непустых шардов всех разделов"""
+    entries = []
+    for section, sitemap_class in sitemaps.items():
+        sitemap = sitemap_class()
+        for shard, stats in sorted(sitemap.shard_stats().items()):
+            entries.append({
+                'location': request.build_absolute_uri(
+                    reverse('sitemap_section', kwargs={'section': section, 'shard': shard})
+                ),
+                'lastmod': sitemap.shard_lastmod(stats),
+            })
+
+    lastmods = [entry['lastmod'] for entry in entries if entry['lastmod']]
+    last_modified = max(lastmods) if lastmods else None
+    etag = _fingerprint(request.get_host(), [(entry['location'], entry['lastmod']) for entry in entries])
+    not_modified = get_conditional_response(
+        request, etag=f'"{etag}"', last_modified=last_modified and int(last_modified.timestamp())
+    )
+    if not_modified is not None:
+        return not_modified
+
+    content = render_to_string('core/sitemap_index.xml', {'sitemaps': entries})
+    return _xml_response(request, content, etag, last_modified)
+
+
+@require_safe
+@replica_reads
+def section(request, sitemaps, section, shard):
+    """Один шард раздела; XML берется из кэша, если данные шарда не менялись"""
+    if section not in sitemaps:
+        raise Http404
+    sitemap = sitemaps[section](shard)
+    stats = sitemap.current_stats()
+    if stats is None:
+        raise Http404
+
+    last_modified = sitemap.shard_lastmod(stats)
+    # Ссылки в sitemap абсолютные, поэтому схема и хост входят в отпечаток
+    fingerprint = _fingerprint(request.scheme, request.get_host(), sorted(stats.items()))
+    not_modified = get_conditional_response(
+        request, etag=f'"{fingerprint}"', last_modified=last_modified and int(last_modified.timestamp())
+    )
+    if not_modified is not None:
+        return not_modified
+
+    cache_key = f'sitemap:{section}:{shard}:{_fingerprint(request.scheme, request.get_host())}'
+    cached = cache.get(cache_key)
+    if cached and cached[0] == fingerprint:
+        content = cached[1]
+    else:
+        content = render_to_string(sitemap.template_name, {
+            'urlset': sitemap.get_urls(site=RequestSite(request), protocol=request.scheme),
+            'base_url': f'{request.scheme}://{request.get_host()}',
+        })
+        cache.set(cache_key, (fingerprint, content), CACHE_TIMEOUT)
+    return _xml_response(request, content, fingerprint, last_modified)
@@ -0,0 +1,250 @@
+"""
+Профилирование SQL по запросам и бюджет запросов в тестах.
+
+Пока активен профиль (``profiling()``), каждый SQL-запрос записывается
+вместе с местом вызова: несколько последних кадров кода проекта и, если
+запрос выполнил шаблон, имя шаблона со строкой. По записям видно:
+
+* повторяющиеся запросы одной формы — параметры и числа заменены на ``?``,
+  поэтому ``WHERE album_id = 1``, ``= 2``, ``= 3`` из цикла по карточкам
+  считаются одной формой (типичный N+1);
+* медленные запросы — для них сразу выполняется ``EXPLAIN QUERY PLAN``
+  (на других СУБД — их вариант EXPLAIN).
+
+``SQLProfileMiddleware`` включается настройкой ``SQL_PROFILE`` и пишет
+предупреждения в лог ``core.sqlprofile``; в тестах ``QueryBudgetMixin``
+проверяет, что страница укладывается в бюджет запросов и не содержит N+1.
+Обертка ставится на каждое соединение один раз (как в core.metrics), а
+профиль передается через ContextVar — так он работает и под ASGI.
+"""
+import logging
+import re
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError
+
+logger = logging.getLogger(__name__)
+
+# Столько одинаковых по форме запросов за запрос считается N+1
+REPEATED_THRESHOLD = getattr(settings, 'SQL_PROFILE_REPEATED', 3)
+SLOW_QUERY_SECONDS = getattr(settings, 'SQL_PROFILE_SLOW_MS', 100) / 1000
+STACK_DEPTH = 4
+
+_profile = ContextVar('sql_profile', default=None)
+# Свой EXPLAIN не записывается и не объясняется повторно
+_explaining = ContextVar('sql_profile_explaining', default=False)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDERS = re.compile(r'\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)')
+_SKIPPED_FILES = {__file__, str(Path(__file__).with_name('metrics.py'))}
+
+
+def query_shape(sql):
+    """Форма запроса: строки, числа и списки параметров IN (...) заменены"""
+    shape = _STRING.sub('?', sql)
+    shape = _NUMBER.sub('?', shape).replace('%s', '?')
+    return _PLACEHOLDERS.sub('(...)', shape)
+
+
+def call_site():
+    """Последние кадры кода проекта и шаблон, из которого выполнен запрос"""
+    base_dir = str(settings.BASE_DIR)
+    frames, template = [], None
+    frame = sys._getframe(2)
+    while frame is not None and (len(frames) < STACK_DEPTH or template is None):
+        filename = frame.f_code.co_filename
+        if template is None and frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            origin = getattr(node, 'origin', None)
+            token = getattr(node, 'token', None)
+            if origin is not None:
+                template = f"{origin.template_name or origin.name}:{getattr(token, 'lineno', '?')}"
+        elif (
+            len(frames) < STACK_DEPTH and filename.startswith(base_dir)
+            and filename not in _SKIPPED_FILES and 'site-packages' not in filename
+        ):
+            frames.append(f"{Path(filename).relative_to(base_dir)}:{frame.f_lineno} in {frame.f_code.co_name}")
+        frame = frame.f_back
+    return frames, template
+
+
+@dataclass
+class Query:
+    sql: str
+    params: object
+    duration: float
+    alias: str
+    stack: list
+    template: str = None
+    plan: list = field(default_factory=list)
+
+    @property
+    def shape(self):
+        return query_shape(self.sql)
+
+    def where(self):
+        return ' <- '.join(filter(None, [f"шаблон {self.template}" if self.template else None, *self.stack]))
+
+
+class Profile:
+    """SQL-запросы одного запроса к сайту (или блока кода в тесте)"""
+
+    def __init__(self, slow=SLOW_QUERY_SECONDS):
+        self.queries = []
+        self.slow = slow
+
+    @property
+    def duration(self):
+        return sum(query.duration for query in self.queries)
+
+    def repeated(self, threshold=REPEATED_THRESHOLD):
+        """{форма: [запросы]} для форм, выполненных threshold раз и больше"""
+        shapes = defaultdict(list)
+        for query in self.queries:
+            shapes[query.shape].append(query)
+        return {shape: queries for shape, queries in shapes.items() if len(queries) >= threshold}
+
+    def slow_queries(self):
+        return [query for query in self.queries if query.duration >= self.slow]
+
+    def report(self, threshold=REPEATED_THRESHOLD):
+        lines = [f"{len(self.queries)} SQL-запросов, {self.duration * 1000:.1f} мс"]
+        for number, query in enumerate(self.queries, start=1):
+            lines.append(f"{number}. [{query.duration * 1000:.1f} мс] {query.sql}")
+            if query.where():
+                lines.append(f"   {query.where()}")
+        for shape, queries in self.repeated(threshold).items():
+            lines.append(f"N+1: {len(queries)} раз {shape}\n   {queries[0].where()}")
+        for query in self.slow_queries():
+            lines.append(f"Медленный запрос {query.duration * 1000:.1f} мс: {query.sql}")
+            lines.extend(f"   {row}" for row in query.plan)
+        return '\n'.join(lines)
+
+
+def explain(connection, sql, params):
+    """План запроса; только для SELECT"""
+    if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return []
+    token = _explaining.set(True)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+            rows = cursor.fetchall()
+    except DatabaseError as exc:
+        return [f"EXPLAIN не выполнен: {exc}"]
+    finally:
+        _explaining.reset(token)
+    # У SQLite в последней колонке текст шага плана, у других СУБД — строка целиком
+    return [row[-1] if connection.vendor == 'sqlite' else ' '.join(map(str, row)) for row in rows]
+
+
+def profile_query(execute, sql, params, many, context):
+    """Обертка execute_wrapper на каждом соединении: пишет в активный профиль"""
+    profile = _profile.get()
+    if profile is None or _explaining.get():
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        connection = context['connection']
+        stack, template = call_site()
+        query = Query(sql, params, duration, connection.alias, stack, template)
+        if duration >= profile.slow and not many:
+            query.plan = explain(connection, sql, params)
+        profile.queries.append(query)
+
+
+def instrument_connection(sender, connection, **kwargs):
+    """Обработчик connection_created"""
+    if profile_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(profile_query)
+
+
+@contextmanager
+def profiling(slow=SLOW_QUERY_SECONDS):
+    """Записывает SQL-запросы блока в Profile"""
+    profile = Profile(slow)
+    token = _profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _profile.reset(token)
+
+
+def log_profile(profile, label):
+    for shape, queries in profile.repeated().items():
+        logger.warning("N+1 в %s: %d запросов вида %s\n  %s", label, len(queries), shape, queries[0].where())
+    for query in profile.slow_queries():
+        logger.warning(
+            "Медленный запрос в %s (%.1f мс): %s\n  %s\n  %s", label, query.duration * 1000, query.sql,
+            query.where(), '\n  '.join(query.plan),
+        )
+
+
+class SQLProfileMiddleware:
+    """
+    Профилирует каждый запрос при SQL_PROFILE = True (для разработки и стенда).
+
+    Добавляет заголовок ``X-SQL-Queries`` (число и время запросов) и пишет в
+    лог N+1 и медленные запросы с планом.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SQL_PROFILE', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with profiling() as profile:
+            response = self.get_response(request)
+        return self.finish(request, response, profile)
+
+    async def __acall__(self, request):
+        with profiling() as profile:
+            response = await self.get_response(request)
+        return self.finish(request, response, profile)
+
+    def finish(self, request, response, profile):
+        log_profile(profile, f"{request.method} {request.path}")
+        response['X-SQL-Queries'] = f"{len(profile.queries)}; {profile.duration * 1000:.1f}ms"
+        return response
+
+
+class QueryBudgetMixin:
+    """
+    Для TestCase: ``with self.assertQueryBudget(5): self.client.get(url)``.
+
+    Падает, если запросов больше бюджета или есть N+1 (одна форма запроса
+    ``REPEATED_THRESHOLD`` раз и больше), и показывает все запросы с местами
+    вызова.
+    """
+
+    @contextmanager
+    def assertQueryBudget(self, max_queries, allow_repeated=False):
+        with profiling() as profile:
+            yield profile
+        problems = []
+        if len(profile.queries) > max_queries:
+            problems.append(f"{len(profile.queries)} запросов при бюджете {max_queries}")
+        if not allow_repeated and profile.repeated():
+            problems.append("повторяющиеся запросы (N+1)")
+        if problems:
+            self.fail(f"{'; '.join(problems)}\n{profile.report()}")
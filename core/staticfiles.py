@@ -0,0 +1,197 @@
+"""
+Статические файлы с хешем в имени и заранее сжатыми копиями.
+
+``collectstatic`` через ``CompressedManifestStaticFilesStorage`` пишет файлы
+с хешем содержимого в имени (``portfolio.3f9a1c0b2d4e.css``), а рядом с
+каждым текстовым файлом — ``.gz`` и, если установлен пакет ``brotli``,
+``.br``. Сжатие выполняется один раз при сборке.
+
+``StaticFilesMiddleware`` отдает файлы из STATIC_ROOT, выбирая сжатый вариант
+по Accept-Encoding, — во время запроса ничего не сжимается. Файлы с хешем
+в имени не меняются никогда, поэтому кэшируются браузером на год с
+``immutable`` и больше не перепроверяются.
+"""
+import gzip
+import mimetypes
+import os
+import posixpath
+import re
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.http import FileResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+try:
+    import brotli
+except ImportError:  # brotli не обязателен: без него пишутся только .gz
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.mjs', '.map', '.svg', '.json', '.txt', '.xml', '.html', '.ico', '.ttf', '.otf', '.eot')
+# Сжатая копия пишется, только если она заметно меньше оригинала
+MIN_SAVING = 0.05
+MIN_SIZE = 256
+
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+DEFAULT_MAX_AGE = 60
+# Хеш, который ManifestStaticFilesStorage вставляет перед расширением
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^/.]+$')
+
+# (кодировка, расширение файла) в порядке предпочтения
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def compress(path):
+    """Пишет .gz и .br рядом с файлом; возвращает список созданных файлов"""
+    with open(path, 'rb') as source:
+        data = source.read()
+    if len(data) < MIN_SIZE:
+        return []
+    variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(data, quality=11)))
+    written = []
+    for suffix, compressed in variants:
+        if len(compressed) <= len(data) * (1 - MIN_SAVING):
+            with open(path + suffix, 'wb') as target:
+                target.write(compressed)
+            written.append(path + suffix)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage, который после сборки сжимает текстовые файлы"""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        names = {name for name in self.hashed_files.values() if name.endswith(COMPRESSIBLE_EXTENSIONS)}
+        # Исходные имена тоже: на них могут ссылаться напрямую (например, из админки без {% static %})
+        names.update(name for name in paths if name.endswith(COMPRESSIBLE_EXTENSIONS))
+        for name in sorted(names):
+            if self.exists(name):
+                compress(self.path(name))
+
+    def stored_name(self, name):
+        # Без collectstatic (разработка, тесты) манифеста нет — остаются исходные имена
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+
+@lru_cache(maxsize=4096)
+def find_variants(path):
+    """
+    Сжатые копии файла ``{кодировка: (путь, размер, mtime)}`` и сам файл под ключом None.
+
+    Содержимое STATIC_ROOT меняется только при деплое, поэтому stat кэшируется
+    на время жизни процесса.
+    """
+    if not os.path.isfile(path):
+        return {}
+    variants = {}
+    for encoding, suffix in ((None, ''), *ENCODINGS):
+        try:
+            stat = os.stat(path + suffix)
+        except OSError:
+            continue
+        variants[encoding] = (path + suffix, stat.st_size, stat.st_mtime)
+    return variants
+
+
+def accepted_encodings(request):
+    header = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        if params.strip().replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+class StaticFilesMiddleware:
+    """
+    Отдает STATIC_ROOT раньше остальных middleware (без сессий и URLconf).
+
+    Ставится сразу после SecurityMiddleware. Если файла нет, запрос идет
+    дальше обычным путем (при DEBUG его обслужит django.contrib.staticfiles).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = settings.STATIC_URL if settings.STATIC_URL.startswith('/') else '/' + settings.STATIC_URL
+        self.root = str(settings.STATIC_ROOT) if settings.STATIC_ROOT else None
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if self.is_static(request):
+            response = self.serve(request, request.path_info[len(self.prefix):])
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if self.is_static(request):
+            # stat и открытие файла — блокирующий ввод-вывод, не для цикла событий
+            response = await sync_to_async(self.serve, thread_sensitive=False)(
+                request, request.path_info[len(self.prefix):]
+            )
+            if response is not None:
+                return response
+        return await self.get_response(request)
+
+    def is_static(self, request):
+        return self.root and request.method in ('GET', 'HEAD') and request.path_info.startswith(self.prefix)
+
+    def serve(self, request, name):
+        name = posixpath.normpath(name).lstrip('/')
+        if name.endswith(('.gz', '.br')) or name.startswith('..'):
+            return None
+        try:
+            path = safe_join(self.root, name)
+        except ValueError:
+            return None
+        variants = find_variants(path)
+        if not variants:
+            return None
+
+        immutable = bool(HASHED_NAME.search(name))
+        _, size, mtime = variants[None]
+        # Слабый ETag: сжатые копии — другое представление того же содержимого
+        etag = f'W/"{int(mtime):x}-{size:x}"'
+        not_modified = get_conditional_response(request, etag=etag, last_modified=int(mtime))
+        if not_modified is not None:
+            response = not_modified
+        else:
+            accepted = accepted_encodings(request)
+            encoding = next((coding for coding, _ in ENCODINGS if coding in variants and coding in accepted), None)
+            file_path, size, _ = variants[encoding]
+            content_type, _ = mimetypes.guess_type(name)
+            response = FileResponse(open(file_path, 'rb'), content_type=content_type or 'application/octet-stream')
+            response['Content-Length'] = size
+            # FileResponse подставил бы имя сжатой копии
+            response.headers.pop('Content-Disposition', None)
+            response['Last-Modified'] = http_date(mtime)
+            if encoding:
+                response['Content-Encoding'] = encoding
+
+        response['ETag'] = etag
+        if immutable:
+            response['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+        else:
+            response['Cache-Control'] = f'public, max-age={DEFAULT_MAX_AGE}'
+        if len(variants) > 1:
+            patch_vary_headers(response, ['Accept-Encoding'])
+        return response
@@ -0,0 +1,240 @@
+"""
+Контентно-адресуемое хранилище загружаемых изображений.
+
+Файл сохраняется под именем ``blobs/ab/cd/<sha256><расширение>``, поэтому
+одинаковые байты, загруженные несколько раз (в разные альбомы, как обложка
+и как фото, в отзыв), лежат на диске в одном экземпляре. Каждый уникальный
+файл описывается строкой ``Blob`` со счетчиком ссылок; счетчик ведут
+сигналы моделей (см. core.signals), а файлы без ссылок удаляются пачками
+командой ``collect_blobs``.
+
+SHA-256 считается во время записи на диск: загрузку хеширует upload
+handler (core.uploadhandlers), остальные файлы хешируются прямо при
+копировании в хранилище — второго прохода по файлу нет.
+
+Сохранение обновляет ``touched_at`` строки блоба до проверки, есть ли файл,
+а сборщик мусора удаляет строку условным DELETE (без ссылок и давно не
+записывалась) и файл в той же транзакции. Поэтому одновременная загрузка
+тех же байтов либо спасает блоб от удаления, либо дожидается его удаления
+и записывает файл заново.
+"""
+import hashlib
+import os
+import tempfile
+from datetime import timedelta
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage, storages
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+BLOB_PREFIX = 'blobs'
+GC_GRACE_PERIOD = timedelta(hours=24)
+
+
+def blob_name(digest, ext):
+    return f'{BLOB_PREFIX}/{digest[:2]}/{digest[2:4]}/{digest}{ext.lower()}'
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(BLOB_PREFIX + '/')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage, в котором имя файла — SHA-256 его содержимого"""
+
+    def get_available_name(self, name, max_length=None):
+        # Имя все равно заменяется хешем в _save, проверять занятость незачем
+        return name
+
+    def _save(self, name, content):
+        ext = os.path.splitext(name)[1]
+        digest = getattr(content, 'sha256', None)
+        if not digest:
+            return self._write_new(content, ext)
+
+        target = blob_name(digest, ext)
+        self._register(target, digest, content)
+        if not self.exists(target):
+            if hasattr(content, 'temporary_file_path'):
+                self._publish(content.temporary_file_path(), target, move=True)
+            else:
+                self._write_new(content, ext, digest)
+        return target
+
+    def _write_new(self, content, ext, digest=None):
+        """Копирует содержимое во временный файл рядом с блобами, попутно считая SHA-256 (если он еще не известен)"""
+        directory = self.path(BLOB_PREFIX)
+        os.makedirs(directory, exist_ok=True)
+        sha256 = None if digest else hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.upload')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode('utf-8')
+                    if sha256:
+                        sha256.update(chunk)
+                    tmp.write(chunk)
+            target = blob_name(digest or sha256.hexdigest(), ext)
+            if sha256:
+                # Известный заранее хеш уже зарегистрирован в _save
+                self._register(target, sha256.hexdigest(), content)
+            self._publish(tmp_path, target)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return target
+
+    def _publish(self, source_path, target, move=False):
+        """Кладет файл на место блоба; если такой блоб уже есть, источник просто отбрасывается"""
+        full_path = self.path(target)
+        if os.path.exists(full_path):
+            return
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        if move:
+            file_move_safe(source_path, full_path)
+        else:
+            os.replace(source_path, full_path)
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+
+    def _register(self, name, digest, content):
+        """Отмечает запись блоба; вызывается до проверки файла, см. collect_garbage"""
+        from core.models import Blob
+        if not Blob.objects.filter(name=name).update(touched_at=timezone.now()):
+            Blob.objects.get_or_create(name=name, defaults={'digest': digest, 'size': content.size})
+
+    def delete(self, name):
+        # Блоб может использоваться другими объектами: удаляет только сборщик мусора
+        if is_blob(name):
+            return
+        super().delete(name)
+
+    def delete_blob(self, name):
+        super().delete(name)
+
+
+def select_content_storage():
+    """Хранилище для полей изображений (см. STORAGES['content'])"""
+    return storages['content']
+
+
+def content_file_fields():
+    """Все файловые поля проекта, хранящиеся в контентно-адресуемом хранилище"""
+    from django.apps import apps
+    from django.db.models import FileField
+    return [
+        (model, field)
+        for model in apps.get_models()
+        for field in model._meta.concrete_fields
+        if isinstance(field, FileField) and isinstance(field.storage, ContentAddressedStorage)
+    ]
+
+
+def retain(names):
+    """Увеличивает счетчики ссылок блобов"""
+    from core.models import Blob
+    names = [name for name in names if is_blob(name)]
+    for name in set(names):
+        Blob.objects.filter(name=name).update(ref_count=F('ref_count') + names.count(name))
+
+
+def release(names):
+    """Уменьшает счетчики ссылок блобов"""
+    from core.models import Blob
+    names = [name for name in names if is_blob(name)]
+    for name in set(names):
+        Blob.objects.filter(name=name).update(ref_count=Greatest(F('ref_count') - names.count(name), 0))
+
+
+def referenced_names(names):
+    """Какие из имен реально используются в базе (проверка перед удалением)"""
+    names = list(names)
+    found = set()
+    for model, field in content_file_fields():
+        found.update(model._base_manager.filter(**{f'{field.attname}__in': names}).values_list(field.attname, flat=True))
+    return found
+
+
+def collect_garbage(batch_size=500, grace_period=GC_GRACE_PERIOD, dry_run=False):
+    """
+    Удаляет блобы без ссылок пачками по batch_size.
+
+    Блобы моложе grace_period не трогаются: файл сохраняется в хранилище
+    раньше, чем строка модели, которая на него сошлется. Перед удалением
+    каждая пачка сверяется с базой, так что рассинхронизация счетчиков
+    (например, после queryset.update) не приводит к потере файлов — такие
+    счетчики исправляются. Условия повторяются в самом удалении
+    (см. _delete_unused): пока пачка проверялась, блоб могли загрузить снова.
+    """
+    from core.models import Blob
+
+    storage = select_content_storage()
+    deadline = timezone.now() - grace_period
+    deleted = 0
+    last_pk = 0
+    while True:
+        batch = list(
+            Blob.objects.filter(ref_count=0, touched_at__lt=deadline, pk__gt=last_pk).order_by('pk')[:batch_size]
+        )
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+        still_used = referenced_names(blob.name for blob in batch)
+        orphans = [blob for blob in batch if blob.name not in still_used]
+        if still_used:
+            recount(still_used)
+        if dry_run:
+            deleted += len(orphans)
+        elif orphans:
+            deleted += _delete_unused(storage, [blob.pk for blob in orphans], deadline)
+    return deleted
+
+
+def _delete_unused(storage, blob_ids, deadline):
+    """
+    Удаляет строки и файлы блобов, которые все еще без ссылок и давно не записывались.
+
+    Строки блокируются и удаляются с повторной проверкой условий, файлы
+    удаляются до конца транзакции: сохранение тех же байтов (_register)
+    ждет ее и после нее записывает файл заново.
+    """
+    from core.models import Blob
+
+    with transaction.atomic():
+        doomed = list(
+            Blob.objects.select_for_update()
+            .filter(pk__in=blob_ids, ref_count=0, touched_at__lt=deadline)
+            .values_list('pk', 'name')
+        )
+        Blob.objects.filter(pk__in=[pk for pk, _ in doomed]).delete()
+        for _, name in doomed:
+            storage.delete_blob(name)
+    return len(doomed)
+
+
+def recount(names=None):
+    """Пересчитывает счетчики ссылок по базе (для всех блобов или для указанных имен)"""
+    from collections import Counter
+    from core.models import Blob
+
+    counts = Counter()
+    for model, field in content_file_fields():
+        queryset = model._base_manager.filter(**{f'{field.attname}__startswith': BLOB_PREFIX + '/'})
+        if names is not None:
+            queryset = queryset.filter(**{f'{field.attname}__in': list(names)})
+        counts.update(queryset.values_list(field.attname, flat=True))
+
+    blobs = Blob.objects.all() if names is None else Blob.objects.filter(name__in=list(names))
+    changed = []
+    for blob in blobs.only('pk', 'name', 'ref_count').iterator():
+        if blob.ref_count != counts[blob.name]:
+            blob.ref_count = counts[blob.name]
+            changed.append(blob)
+    Blob.objects.bulk_update(changed, ['ref_count'], batch_size=500)
+    return len(changed)
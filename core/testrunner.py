@@ -0,0 +1,34 @@
+"""
+Запуск тестов со своим кэшем.
+
+По умолчанию кэш файловый и лежит в BASE_DIR/.cache (см. CACHES в
+настройках), то есть общий с сервером разработки: тесты видели бы его
+страницы и счетчики поколений, а cache.clear() в тестах стирал бы кэш
+разработки. На время прогона CACHES указывает на временный каталог,
+который удаляется после тестов.
+"""
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_dir = tempfile.mkdtemp(prefix='framed-test-cache-')
+        self.cache_override = override_settings(CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': self.cache_dir,
+                'OPTIONS': settings.CACHES['default'].get('OPTIONS', {}),
+            },
+        })
+        self.cache_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.cache_override.disable()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -1,3 +1,746 @@
-from django.test import TestCase
+import datetime
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connections
+from django.test import AsyncClient, AsyncRequestFactory, Client, RequestFactory, TestCase, TransactionTestCase, modify_settings, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.template import Context, Template
+from django.urls import reverse
+from django.utils import timezone, translation
+from django.utils.http import http_date
+from PIL import Image
+
+from core import api, checks, db, mailqueue, metrics, reference, sqlprofile, staticfiles, storage
+from bookings.models import Booking, TimeSlot
+from bookings.views import AsyncTimeSlotSelectionView, TimeSlotSelectionView
+from core.models import Blob, OutgoingEmail, Service, SiteSettings
+from core.views import AsyncHomeView, HomeView
+from portfolio import fragments
+from portfolio.models import Album, Photo, ShootingType
+from portfolio.views import AlbumDetailView, AsyncAlbumDetailView, AsyncGalleryView, GalleryView
+from reviews.models import Review
+from utils import ranges
+from utils.smtpstub import SMTPStub
+
+
+# Без кэша страниц: иначе повторный запрос отдается из него и справочники не проверяются
+@modify_settings(MIDDLEWARE={'remove': 'core.pagecache.PageCacheMiddleware'})
+class ReferenceDataTests(TestCase):
+    """Справочники в памяти процесса (core.reference)"""
+
+    def setUp(self):
+        cache.clear()
+        SiteSettings.objects.create(title="Студия", phone='+7 900 000-00-00', email='studio@example.com', about_text="О нас")
+        Service.objects.create(name="Портрет", price=5000)
+        wedding = ShootingType.objects.create(name="Свадьба", slug='wedding')
+        Album.objects.create(title="Весна", slug='spring').shooting_types.add(wedding)
+
+    def test_public_pages_make_no_queries_in_steady_state(self):
+        urls = [
+            reverse('core:about'),
+            reverse('core:services'),
+            reverse('core:contacts'),
+            reverse('portfolio:shooting_type', kwargs={'slug': 'wedding'}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.client.get(url)
+                with self.assertNumQueries(0):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertIsNone(response.get('X-Page-Cache'))
+
+    def test_save_invalidates_cached_rows(self):
+        self.client.get(reverse('core:services'))
+        with self.captureOnCommitCallbacks(execute=True):
+            Service.objects.create(name="Репортаж", price=9000)
+            site = SiteSettings.objects.get()
+            site.title = "Новая студия"
+            site.save()
+
+        response = self.client.get(reverse('core:services'))
+        self.assertContains(response, "Репортаж")
+        self.assertContains(response, "Новая студия")
+
+    def test_inactive_shooting_type_is_not_found(self):
+        self.assertIsNotNone(reference.shooting_type_by_slug('wedding'))
+        with self.captureOnCommitCallbacks(execute=True):
+            wedding = ShootingType.objects.get(slug='wedding')
+            wedding.is_active = False
+            wedding.save()
+
+        self.assertIsNone(reference.shooting_type_by_slug('wedding'))
+
+
+class SharedCacheTests(TestCase):
+    """Счетчики поколений в кэше, общем для процессов"""
+
+    def test_bump_in_other_process_is_seen(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        backend = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory}
+        with override_settings(CACHES={'default': backend}):
+            before = fragments.generations([reference.SCOPE])
+            # Другой процесс сервера — свой объект кэша над тем же каталогом
+            other = FileBasedCache(directory, {})
+            other.incr(f'{fragments.GENERATION_PREFIX}:{reference.SCOPE}')
+            self.assertNotEqual(fragments.generations([reference.SCOPE]), before)
+
+    def test_tests_do_not_share_the_development_cache(self):
+        location = str(settings.CACHES['default']['LOCATION'])
+        self.assertNotEqual(location, str(settings.BASE_DIR / '.cache'))
+        self.assertTrue(location.startswith(tempfile.gettempdir()))
+
+    def test_process_local_cache_is_reported(self):
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with override_settings(CACHES=locmem, DEBUG=False):
+            self.assertEqual([error.id for error in checks.check_shared_cache(None)], ['core.W001'])
+        with override_settings(DEBUG=False):
+            self.assertEqual(checks.check_shared_cache(None), [])
+
+
+class PageCacheTests(TestCase):
+    """Кэш страниц для анонимов (core.pagecache)"""
+
+    def setUp(self):
+        cache.clear()
+        SiteSettings.objects.create(title="Студия", phone='+7 900 000-00-00', email='studio@example.com', about_text="О нас")
+        self.album = Album.objects.create(title="Весна", slug='spring')
+
+    def assertCached(self, url, expected, **extra):
+        response = self.client.get(url, **extra)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get('X-Page-Cache'), expected)
+        return response
+
+    def test_album_save_evicts_only_pages_that_show_it(self):
+        album_url = reverse('portfolio:album_detail', kwargs={'slug': 'spring'})
+        urls = [album_url, reverse('portfolio:gallery'), reverse('core:about')]
+        for url in urls:
+            self.assertCached(url, 'miss')
+            self.assertCached(url, 'hit')
+
+        self.album.title = "Поздняя весна"
+        self.album.save()
+
+        self.assertContains(self.assertCached(album_url, 'miss'), "Поздняя весна")
+        self.assertCached(reverse('portfolio:gallery'), 'miss')
+        self.assertCached(reverse('core:about'), 'hit')
+
+    def test_key_includes_language_prefix_and_relevant_params(self):
+        url = reverse('portfolio:gallery')
+        self.assertCached(url, 'miss')
+        self.assertCached(f'{url}?utm_source=mail', 'hit')
+        self.assertCached(f'{url}?is_featured=true', 'miss')
+        with translation.override('en'):
+            self.assertCached(reverse('portfolio:gallery'), 'miss')
+
+    def test_bypassed_for_authenticated_users(self):
+        url = reverse('core:about')
+        self.assertCached(url, 'miss')
+        user = User.objects.create_user('admin', password='secret')
+        self.client.force_login(user)
+        self.assertCached(url, None)
+
+    def test_pages_with_csrf_token_are_not_cached(self):
+        self.client.get(reverse('core:contacts'))
+        self.assertIsNone(self.client.get(reverse('core:contacts')).get('X-Page-Cache'))
+
+    def test_home_gallery_rotates_daily_and_expires_at_midnight(self):
+        for number in range(12):
+            Photo.objects.create(album=self.album, image=f'photos/{number}.jpg')
+
+        def pick(day):
+            request = RequestFactory().get('/')
+            view = HomeView()
+            view.setup(request)
+            with mock.patch('django.utils.timezone.localdate', return_value=day):
+                photos = [photo.pk for photo in view.get_gallery_photos()]
+            return photos, request.page_cache_timeout
+
+        today = timezone.localdate()
+        photos, timeout = pick(today)
+        self.assertEqual(len(photos), 8)
+        self.assertEqual(pick(today)[0], photos)
+        self.assertNotEqual(pick(today + datetime.timedelta(days=1))[0], photos)
+        self.assertLessEqual(timeout, 24 * 60 * 60)
+
+        with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            self.assertCached(reverse('core:home'), 'miss')
+        self.assertLessEqual(cache_set.call_args.args[2], 24 * 60 * 60)
+
+
+class ApiTests(TestCase):
+    """JSON API (core.api): курсоры, ETag, проекция полей, ошибки"""
+
+    def setUp(self):
+        cache.clear()
+        for number, price in enumerate([3000, 1000, 2000, 1000, 2000]):
+            Service.objects.create(name=f"Услуга {number}", price=price)
+        self.url = reverse('api_list', args=['services'])
+
+    def pages(self, url):
+        items = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            items += response.json()['results']
+            url = response.json()['next']
+        return items
+
+    def test_cursor_walks_every_row_once(self):
+        expected = list(Service.objects.order_by('price', 'pk').values_list('pk', flat=True))
+        self.assertEqual([item['id'] for item in self.pages(self.url + '?limit=2')], expected)
+
+        # Ключи-даты с микросекундами и обратным порядком (альбомы: order, -created_at, pk)
+        for number in range(5):
+            Album.objects.create(title=f"Альбом {number}", slug=f'album-{number}', order=number // 2)
+        expected = list(Album.objects.order_by('order', '-created_at', 'pk').values_list('pk', flat=True))
+        items = self.pages(reverse('api_list', args=['albums']) + '?limit=2')
+        self.assertEqual([item['id'] for item in items], expected)
+
+    def test_cursor_round_trip(self):
+        values = [2, '2026-10-19T12:00:00.123456+00:00', 7]
+        self.assertEqual(api.decode_cursor(api.encode_cursor(values), 3), values)
+
+    def test_malformed_cursor_is_bad_request(self):
+        albums = reverse('api_list', args=['albums'])
+        crafted = [[{'a': 1}, 1, 2], [[1], 1, 2], [1, 2], [1, '2026-10-19T12:00:00+00:00', 2 ** 70]]
+        cursors = ['!!!', api.encode_cursor('abc')[:-1], *(api.encode_cursor(values) for values in crafted)]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                response = self.client.get(albums, {'cursor': cursor})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+
+    def test_not_found_is_json(self):
+        for url in (reverse('api_detail', args=['services', 999]), reverse('api_list', args=['nothing'])):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(response['Content-Type'], 'application/json')
+                self.assertIn('error', response.json())
+
+    def test_etag_revalidation(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url, headers={'If-None-Match': etag}).status_code, 304)
+
+        Service.objects.create(name="Новая", price=500)
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_fields_projection(self):
+        response = self.client.get(self.url, {'fields': 'name, price'})
+        self.assertEqual(set(response.json()['results'][0]), {'name', 'price'})
+        self.assertEqual(self.client.get(self.url, {'fields': 'name,secret'}).status_code, 400)
+
+        album = Album.objects.create(title="Весна", slug='spring')
+        album.shooting_types.add(
+            ShootingType.objects.create(name="Свадьба", slug='wedding'),
+            ShootingType.objects.create(name="Портрет", slug='portrait'),
+        )
+        response = self.client.get(reverse('api_detail', args=['albums', album.pk]), {'fields': 'slug,shooting_types'})
+        self.assertEqual(response.json(), {'slug': 'spring', 'shooting_types': ['portrait', 'wedding']})
+
+
+class ContentStorageTests(TestCase):
+    """Контентно-адресуемое хранилище (core.storage): дедупликация, счетчики ссылок, сборка мусора"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.storage = storage.select_content_storage()
+        self.album = Album.objects.create(title="Весна", slug='spring')
+
+    def image(self, color='red'):
+        buffer = io.BytesIO()
+        Image.new('RGB', (8, 8), color).save(buffer, 'JPEG')
+        return ContentFile(buffer.getvalue(), name='photo.jpg')
+
+    def age(self, *names):
+        Blob.objects.filter(name__in=names).update(touched_at=timezone.now() - storage.GC_GRACE_PERIOD * 2)
+
+    def test_identical_content_is_stored_once(self):
+        first = Photo.objects.create(album=self.album, image=self.image())
+        second = Photo.objects.create(album=self.album, image=self.image())
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(storage.is_blob(first.image.name))
+        self.assertEqual(Blob.objects.get().ref_count, 2)
+
+        first.delete()
+        self.assertEqual(Blob.objects.get().ref_count, 1)
+        self.assertTrue(self.storage.exists(second.image.name))
+
+    def test_collect_removes_only_old_unreferenced_blobs(self):
+        photo = Photo.objects.create(album=self.album, image=self.image('red'))
+        orphan = self.storage.save('orphan.jpg', self.image('green'))
+        fresh = self.storage.save('fresh.jpg', self.image('blue'))
+        # Счетчик разошелся с базой (например, после queryset.update) — файл все равно нужен
+        Blob.objects.filter(name=photo.image.name).update(ref_count=0)
+        self.age(photo.image.name, orphan)
+
+        self.assertEqual(storage.collect_garbage(dry_run=True), 1)
+        self.assertEqual(storage.collect_garbage(), 1)
+        self.assertFalse(self.storage.exists(orphan))
+        self.assertEqual(set(Blob.objects.values_list('name', flat=True)), {photo.image.name, fresh})
+        self.assertEqual(Blob.objects.get(name=photo.image.name).ref_count, 1)
+        self.assertTrue(self.storage.exists(fresh))
+
+    def test_upload_during_collection_keeps_blob(self):
+        name = self.storage.save('photo.jpg', self.image())
+        self.age(name)
+
+        def upload_again(names):
+            self.assertEqual(self.storage.save('again.jpg', self.image()), name)
+            return set()
+
+        with mock.patch.object(storage, 'referenced_names', side_effect=upload_again):
+            self.assertEqual(storage.collect_garbage(), 0)
+        self.assertTrue(Blob.objects.filter(name=name).exists())
+        self.assertTrue(self.storage.exists(name))
+
+    def test_collect_blobs_command(self):
+        name = self.storage.save('orphan.jpg', self.image())
+        self.age(name)
+        out = io.StringIO()
+        call_command('collect_blobs', '--recount', stdout=out)
+        self.assertIn("Удалено файлов: 1", out.getvalue())
+        self.assertFalse(self.storage.exists(name))
+
+
+class RangeHeaderTests(TestCase):
+    """Разбор Range и If-Range (utils.ranges)"""
+
+    def test_parse_range(self):
+        cases = {
+            None: None,
+            'bytes=0-9': (0, 9),
+            'bytes=90-': (90, 99),
+            'bytes=90-500': (90, 99),
+            'bytes=-10': (90, 99),
+            'bytes=-500': (0, 99),
+            'bytes=9-5': None,
+            'bytes=0-1,5-6': None,
+            'items=0-9': None,
+            'bytes=-': None,
+        }
+        for header, expected in cases.items():
+            with self.subTest(header=header):
+                self.assertEqual(ranges.parse_range(header, 100), expected)
+
+    def test_unsatisfiable(self):
+        for header, size in [('bytes=100-', 100), ('bytes=100-200', 100), ('bytes=-0', 100), ('bytes=0-', 0), ('bytes=-5', 0)]:
+            with self.subTest(header=header, size=size), self.assertRaises(ranges.RangeNotSatisfiable):
+                ranges.parse_range(header, size)
+
+    def test_if_range(self):
+        factory = RequestFactory()
+        modified = 1_700_000_000
+        cases = {
+            None: True,
+            '"abc"': True,
+            '"other"': False,
+            'W/"abc"': False,
+            http_date(modified): True,
+            http_date(modified - 60): False,
+            'вчера': False,
+        }
+        for value, expected in cases.items():
+            with self.subTest(value=value):
+                request = factory.get('/', **({'HTTP_IF_RANGE': value} if value else {}))
+                self.assertIs(ranges.if_range_matches(request, '"abc"', modified), expected)
+
+
+class MediaTests(TestCase):
+    """Отдача медиафайлов с Range (core.media)"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.data = bytes(range(256)) * 4
+        self.write('portfolio/videos/clip.mp4', self.data)
+        self.url = '/media/portfolio/videos/clip.mp4'
+
+    def write(self, name, data):
+        full_path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, 'wb') as file:
+            file.write(data)
+
+    def get(self, **headers):
+        response = self.client.get(self.url, **headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_range_and_suffix(self):
+        response, body = self.get(HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(body, self.data[10:20])
+
+        response, body = self.get(HTTP_RANGE='bytes=-24')
+        self.assertEqual(response['Content-Range'], 'bytes 1000-1023/1024')
+        self.assertEqual(body, self.data[-24:])
+
+    def test_if_range_and_conditional_get(self):
+        full, body = self.get()
+        self.assertEqual((full.status_code, body), (200, self.data))
+
+        response, body = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=full['ETag'])
+        self.assertEqual((response.status_code, body), (206, self.data[:10]))
+        response, body = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual((response.status_code, body), (200, self.data))
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=full['ETag']).status_code, 304)
+
+    def test_unsatisfiable_range(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=1024-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */1024')
+
+    def test_head_and_missing_files(self):
+        response = self.client.head(self.url, HTTP_RANGE='bytes=0-99')
+        self.assertEqual((response.status_code, response['Content-Length']), (206, '100'))
+        self.assertEqual(self.client.get('/media/portfolio/videos/missing.mp4').status_code, 404)
+        self.assertEqual(self.client.get('/media/../framed/settings.py').status_code, 404)
+
+    @override_settings(MEDIA_SENDFILE_BACKEND='nginx')
+    def test_offload_to_nginx(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/portfolio/videos/clip.mp4')
+        self.assertEqual(response.content, b'')
+
+        self.write('portfolio/videos/летний клип.mp4', self.data)
+        response = self.client.get('/media/portfolio/videos/летний клип.mp4')
+        self.assertEqual(
+            response['X-Accel-Redirect'],
+            '/protected-media/portfolio/videos/%D0%BB%D0%B5%D1%82%D0%BD%D0%B8%D0%B9%20%D0%BA%D0%BB%D0%B8%D0%BF.mp4'
+        )
+
+    @override_settings(MEDIA_SERVE=False)
+    def test_disabled_without_media_serve(self):
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_only_committed_blobs_and_known_prefixes(self):
+        self.write('secrets/notes.txt', b'x')
+        self.assertEqual(self.client.get('/media/secrets/notes.txt').status_code, 404)
+
+        # Временный файл незавершенной загрузки и блоб без записи в базе
+        self.write('blobs/tmpabc123.upload', b'x')
+        self.assertEqual(self.client.get('/media/blobs/tmpabc123.upload').status_code, 404)
+        name = storage.blob_name('a' * 64, '.jpg')
+        self.write(name, b'x')
+        self.assertEqual(self.client.get(f'/media/{name}').status_code, 404)
+        Blob.objects.create(digest='a' * 64, name=name, size=1)
+        self.assertEqual(self.client.get(f'/media/{name}').status_code, 200)
+
+        # Фото отзыва доступно только после модерации
+        review = Review.objects.create(author="Анна", email='anna@example.com', rating=5, text="Спасибо", photo=name)
+        self.assertEqual(self.client.get(f'/media/{name}').status_code, 404)
+        Review.objects.filter(pk=review.pk).update(status='approved', is_public=True)
+        self.assertEqual(self.client.get(f'/media/{name}').status_code, 200)
+
+
+class DatabaseRoutingTests(TransactionTestCase):
+    """Чтение публичных страниц с реплики (core.db)"""
+
+    databases = {'default', db.REPLICA_DB_ALIAS}
+
+    def setUp(self):
+        cache.clear()
+        Service.objects.create(name="Съемка", description="Описание", price=1000)
+
+    def test_public_reads_go_to_replica(self):
+        with CaptureQueriesContext(connections[db.REPLICA_DB_ALIAS]) as replica:
+            self.assertEqual(self.client.get(reverse('api_list', args=['services'])).status_code, 200)
+        self.assertTrue(any('core_service' in query['sql'] for query in replica.captured_queries))
+
+    def test_reads_outside_public_views_use_default(self):
+        router = db.PrimaryReplicaRouter()
+        self.assertEqual(router.db_for_read(Service), 'default')
+        token = db._replica_reads.set(True)
+        try:
+            self.assertEqual(router.db_for_read(Service), db.REPLICA_DB_ALIAS)
+        finally:
+            db._replica_reads.reset(token)
+        self.assertEqual(router.db_for_write(Service), 'default')
+
+
+class AsyncViewsTests(TestCase):
+    """Async-варианты посещаемых страниц (core.asyncviews) отдают то же, что синхронные"""
+
+    def setUp(self):
+        cache.clear()
+        SiteSettings.objects.create(title="Студия", phone='+7 900 000-00-00', email='studio@example.com', about_text="О нас")
+        for number in range(15):
+            album = Album.objects.create(title=f"Альбом {number}", slug=f'album-{number}')
+        Photo.objects.create(album=album, image='photos/spring.jpg', title="Весна")
+
+    def render_sync(self, view_class, path, **kwargs):
+        response = view_class.as_view()(RequestFactory().get(path), **kwargs)
+        return response.render().content
+
+    async def render_async(self, view_class, path, **kwargs):
+        response = await view_class.as_view()(AsyncRequestFactory().get(path), **kwargs)
+        return (await sync_to_async(response.render)()).content
+
+    async def test_pages_match_sync_views(self):
+        pages = [
+            (HomeView, AsyncHomeView, '/', {}),
+            (GalleryView, AsyncGalleryView, '/portfolio/?page=2', {}),
+            (AlbumDetailView, AsyncAlbumDetailView, '/portfolio/album/album-14/', {'slug': 'album-14'}),
+        ]
+        for sync_view, async_view, path, kwargs in pages:
+            with self.subTest(path=path):
+                await sync_to_async(cache.clear)()
+                expected = await sync_to_async(self.render_sync)(sync_view, path, **kwargs)
+                await sync_to_async(cache.clear)()
+                self.assertEqual(await self.render_async(async_view, path, **kwargs), expected)
+
+    def test_calendar_counts_bookings_in_one_query(self):
+        saturday = datetime.date(2030, 1, 5)
+        free = TimeSlot.objects.create(date_type='weekend', start_time='10:00', end_time='11:00')
+        full = TimeSlot.objects.create(date_type='weekend', start_time='12:00', end_time='13:00')
+        TimeSlot.objects.create(date_type='weekday', start_time='12:00', end_time='13:00')
+        Booking.objects.create(
+            time_slot=full, client_name="Анна", client_email='anna@example.com', client_phone='1', is_confirmed=True,
+        )
+        path = f'/bookings/?date={saturday:%Y-%m-%d}'
+        expected = self.render_sync(TimeSlotSelectionView, path)
+        # Справочники уже в памяти: остается один запрос слотов с числом броней
+        with self.assertNumQueries(1):
+            content = async_to_sync(self.render_async)(AsyncTimeSlotSelectionView, path)
+        self.assertEqual(content, expected)
+        self.assertIn(f'/slot/{free.pk}/'.encode(), content)
+        self.assertNotIn(f'/slot/{full.pk}/'.encode(), content)
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+    EMAIL_HOST='127.0.0.1', EMAIL_USE_TLS=False, EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='',
+)
+class MailQueueTests(TestCase):
+    """Очередь писем (core.mailqueue) на локальной SMTP-заглушке"""
+
+    def setUp(self):
+        self.stub = SMTPStub().start()
+        self.addCleanup(self.stub.stop)
+        settings_override = override_settings(EMAIL_PORT=self.stub.port)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def enqueue(self, count):
+        return [mailqueue.enqueue(f"Письмо {number}", "Текст", ['owner@example.com'], 'site@example.com') for number in range(count)]
+
+    def test_batch_is_sent_over_one_connection(self):
+        self.enqueue(5)
+        self.assertEqual(mailqueue.process(), (5, 0))
+        self.assertEqual(self.stub.connections, 1)
+        self.assertEqual(len(self.stub.messages), 5)
+        self.assertFalse(OutgoingEmail.objects.exclude(status='sent').exists())
+
+    def test_temporary_failure_is_retried_with_backoff(self):
+        email, = self.enqueue(1)
+        self.stub.fail_next(1, code=451)
+        self.assertEqual(mailqueue.process(), (0, 1))
+
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('pending', 1))
+        self.assertGreater(email.next_attempt_at, timezone.now())
+        self.assertEqual(mailqueue.process(), (0, 0))
+
+        OutgoingEmail.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(mailqueue.process(), (1, 0))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('sent', 2))
+
+    def test_permanent_failure_is_not_retried(self):
+        first, second = self.enqueue(2)
+        self.stub.fail_next(1, code=550)
+        self.assertEqual(mailqueue.process(), (1, 1))
+        first.refresh_from_db()
+        self.assertEqual(first.status, 'failed')
+        self.assertEqual(OutgoingEmail.objects.get(pk=second.pk).status, 'sent')
+
+
+class StaticFilesTests(TestCase):
+    """Отдача сжатой статики (core.staticfiles)"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        path = os.path.join(self.root, 'site.0123456789ab.css')
+        with open(path, 'w') as file:
+            file.write('body { color: #333; }\n' * 100)
+        staticfiles.compress(path)
+
+    def get(self, name, **headers):
+        with override_settings(STATIC_ROOT=self.root):
+            return Client().get(f'/static/{name}', **headers)
+
+    def test_precompressed_variant_is_chosen_by_accept_encoding(self):
+        response = self.get('site.0123456789ab.css', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)).decode()[:4], 'body')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+        plain = self.get('site.0123456789ab.css')
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertEqual(int(plain['Content-Length']), 2200)
+
+    def test_conditional_request(self):
+        etag = self.get('site.0123456789ab.css')['ETag']
+        self.assertEqual(self.get('site.0123456789ab.css', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+@override_settings(METRICS_TOKEN=None, METRICS_ALLOWED_IPS=['127.0.0.1'])
+class MetricsTests(TestCase):
+    """Метрики и /metrics (core.metrics)"""
+
+    def setUp(self):
+        cache.clear()
+        SiteSettings.objects.create(title="Студия", phone='+7 900 000-00-00', email='studio@example.com', about_text="О нас")
+        Album.objects.create(title="Весна", slug='spring')
+
+    def value(self, metric, **labels):
+        values = metric.values.get(tuple(str(labels[name]) for name in metric.labelnames))
+        return values and values[-1]
+
+    def test_request_queries_and_template_are_recorded(self):
+        requests = self.value(metrics.REQUESTS, view='portfolio:gallery', method='GET', status=200) or 0
+        queries = self.value(metrics.DB_QUERIES, view='portfolio:gallery') or 0
+        self.client.get(reverse('portfolio:gallery'))
+
+        self.assertEqual(self.value(metrics.REQUESTS, view='portfolio:gallery', method='GET', status=200), requests + 1)
+        self.assertGreater(self.value(metrics.DB_QUERIES, view='portfolio:gallery'), queries)
+        text = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('django_http_request_duration_seconds_bucket{view="portfolio:gallery",method="GET",le="+Inf"}', text)
+        self.assertIn('django_template_render_duration_seconds_count{template="portfolio/gallery.html"}', text)
+
+    async def test_async_requests_are_recorded(self):
+        before = self.value(metrics.DB_QUERIES, view='core:about') or 0
+        await AsyncClient().get(reverse('core:about'))
+        self.assertGreater(self.value(metrics.DB_QUERIES, view='core:about'), before)
+
+    def test_multiprocess_files_are_summed(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with open(os.path.join(directory, '1.json'), 'w') as file:
+            json.dump({'outbound_notifications_total': [[['telegram', 'ok'], [3]]]}, file)
+        with override_settings(PROMETHEUS_MULTIPROC_DIR=directory):
+            with metrics.notification('telegram'):
+                pass
+            text = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('outbound_notifications_total{channel="telegram",outcome="ok"} 4', text)
+        self.assertIn(f'{os.getpid()}.json', os.listdir(directory))
+
+    def test_files_of_finished_processes_are_archived(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        for pid, count in [(1001, 2), (1002, 5)]:
+            with open(os.path.join(directory, f'{pid}.json'), 'w') as file:
+                json.dump({'outbound_notifications_total': [[['sms', 'ok'], [count]]]}, file)
+        alive = lambda pid: pid not in (1001, 1002)
+        with override_settings(PROMETHEUS_MULTIPROC_DIR=directory), mock.patch.object(metrics, 'pid_alive', alive):
+            for _ in range(2):
+                text = self.client.get(reverse('metrics')).content.decode()
+                self.assertIn('outbound_notifications_total{channel="sms",outcome="ok"} 7', text)
+        files = sorted(name for name in os.listdir(directory) if name.endswith('.json'))
+        self.assertEqual(files, sorted([metrics.ARCHIVE_FILE, f'{os.getpid()}.json']))
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+    @override_settings(METRICS_ALLOWED_IPS=[])
+    def test_closed_without_configuration(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.5').status_code, 403)
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+        with override_settings(METRICS_ALLOWED_IPS=['10.0.0.5']):
+            self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.5').status_code, 200)
+
+
+class SQLProfileTests(TestCase):
+    """Профилирование SQL (core.sqlprofile)"""
+
+    def setUp(self):
+        for number in range(3):
+            Album.objects.create(title=f"Альбом {number}", slug=f'album-{number}').shooting_types.add(
+                ShootingType.objects.create(name=f"Тип {number}", slug=f'type-{number}')
+            )
+
+    def test_shape_ignores_literals_and_parameter_lists(self):
+        self.assertEqual(
+            sqlprofile.query_shape("SELECT * FROM t WHERE id IN (%s, %s) AND name = 'x' LIMIT 21"),
+            sqlprofile.query_shape("SELECT * FROM t WHERE id IN (%s) AND name = 'y' LIMIT 5"),
+        )
+
+    def test_repeated_queries_point_to_template(self):
+        template = Template("{% for album in albums %}{{ album.get_shooting_types_display }}{% endfor %}")
+        with sqlprofile.profiling() as profile:
+            template.render(Context({'albums': Album.objects.all()}))
+        (queries,) = profile.repeated().values()
+        self.assertEqual(len(queries), 3)
+        self.assertIn("шаблон", queries[0].where())
+
+    def test_slow_query_is_explained(self):
+        with sqlprofile.profiling(slow=0) as profile:
+            list(Album.objects.filter(slug='album-1'))
+        self.assertTrue(any('album' in row.lower() for row in profile.queries[0].plan))
+
+    @override_settings(SQL_PROFILE=True)
+    def test_middleware_reports_query_count(self):
+        cache.clear()
+        SiteSettings.objects.create(title="Студия", phone='+7 900 000-00-00', email='studio@example.com', about_text="О нас")
+        self.assertRegex(Client().get(reverse('core:about'))['X-SQL-Queries'], r'^\d+; [\d.]+ms$')
+
+
+class QueryBudgetTests(sqlprofile.QueryBudgetMixin, TestCase):
+    """Бюджет SQL-запросов страниц core (кэши пусты — худший случай)"""
+
+    def setUp(self):
+        SiteSettings.objects.create(title="Студия", phone='+7 900 000-00-00', email='studio@example.com', about_text="О нас")
+        for number in range(4):
+            Service.objects.create(name=f"Услуга {number}", price=1000)
+            album = Album.objects.create(title=f"Альбом {number}", slug=f'album-{number}')
+            for order in range(3):
+                Photo.objects.create(album=album, image=f'photos/{number}-{order}.jpg', order=order)
+
+    def test_pages(self):
+        budgets = {
+            reverse('core:home'): 5,
+            reverse('core:about'): 1,
+            reverse('core:services'): 2,
+            reverse('core:contacts'): 1,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                cache.clear()
+                with self.assertQueryBudget(budget):
+                    self.assertEqual(self.client.get(url).status_code, 200)
@@ -1,10 +1,11 @@
 from django.urls import path
-from .views import ContactView, HomeView, AboutView, ServicesView  
+from .asyncviews import as_view
+from .views import AsyncHomeView, ContactView, HomeView, AboutView, ServicesView
 
 app_name = 'core'
 
 urlpatterns = [
-    path('', HomeView.as_view(), name='home'),
+    path('', as_view(HomeView, AsyncHomeView), name='home'),
     path('about/', AboutView.as_view(), name='about'),
     path('services/', ServicesView.as_view(), name='services'),
     path('contacts/', ContactView.as_view(), name='contacts'),  
@@ -1,49 +1,85 @@
+import datetime
+
+from django.db.models import F
+from django.db.models.functions import Mod
+from django.utils import timezone
 from django.views.generic import TemplateView, ListView, FormView
 from django.urls import reverse_lazy
 from django.contrib.messages.views import SuccessMessageMixin
-from .models import SiteSettings, Service
+from portfolio.fragments import PORTFOLIO
+from reviews.api import REVIEWS
+from . import pagecache, reference
+from .asyncviews import AsyncViewMixin, alist, gather
 from .forms import ContactForm
 from portfolio.models import Photo, Album  
 
 class HomeView(TemplateView):
     template_name = "core/home.html"
+    page_cache_tags = (PORTFOLIO, REVIEWS)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['site_settings'] = SiteSettings.load()
-        context['services'] = Service.objects.filter(is_active=True)[:3]  # 3 последние услуги
+        context['site_settings'] = reference.get('site_settings')
+        context['services'] = reference.get('services')[:3]  # 3 первые услуги
         
-        # Случайные фото для галереи (8 штук)
-        context['gallery_photos'] = Photo.objects.filter(
+        context['gallery_photos'] = self.get_gallery_photos()
+        context['latest_albums'] = self.get_latest_albums()
+        return context
+
+    def get_gallery_photos(self):
+        # Подборка из 8 фото меняется раз в сутки, а не на каждый запрос: страница
+        # хранится в кэше (core.pagecache), и случайный выбор застыл бы там на весь
+        # срок хранения. Поэтому порядок — псевдослучайная перестановка по pk со
+        # сдвигом от даты, а страница живет в кэше только до полуночи
+        today = timezone.localdate()
+        tomorrow = datetime.datetime.combine(today + datetime.timedelta(days=1), datetime.time.min)
+        seconds_left = (timezone.make_aware(tomorrow) - timezone.now()).total_seconds()
+        pagecache.limit_timeout(self.request, seconds_left)
+        return Photo.objects.filter(
             album__is_published=True
-        ).order_by('?')[:8]  # order_by('?') - случайный порядок
-        
+        ).annotate(
+            rotation=Mod((F('pk') + today.toordinal()) * 2654435761, 4294967291)
+        ).order_by('rotation')[:8]
+
+    def get_latest_albums(self):
         # 3 последних опубликованных альбома
-        context['latest_albums'] = Album.objects.filter(
+        return Album.objects.filter(
             is_published=True
         ).order_by('-created_at')[:3]
-        
-        return context
+
+class AsyncHomeView(AsyncViewMixin, HomeView):
+    """HomeView под ASGI: справочники, фото и альбомы читаются одновременно"""
+
+    async def get(self, request, *args, **kwargs):
+        data = await gather(
+            site_settings=reference.aget('site_settings'),
+            services=reference.aget('services'),
+            gallery_photos=alist(self.get_gallery_photos()),
+            latest_albums=alist(self.get_latest_albums()),
+        )
+        data['services'] = data['services'][:3]
+        return self.render_to_response(self.get_context_data(**kwargs, **data))
 
 class AboutView(TemplateView):
     template_name = "core/about.html"
+    page_cache_tags = ()
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['settings'] = SiteSettings.load()
+        context['settings'] = reference.get('site_settings')
         return context
 
 class ServicesView(ListView):
-    model = Service
     template_name = "core/services.html"
     context_object_name = "services"
+    page_cache_tags = ()
 
     def get_queryset(self):
-        return Service.objects.filter(is_active=True)
+        return reference.get('services')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['settings'] = SiteSettings.load()
+        context['settings'] = reference.get('site_settings')
         return context
 
 class ContactView(SuccessMessageMixin, FormView):
@@ -58,5 +94,5 @@ class ContactView(SuccessMessageMixin, FormView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['settings'] = SiteSettings.load()
+        context['settings'] = reference.get('site_settings')
         return context
\ No newline at end of file
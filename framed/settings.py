@@ -27,26 +27,35 @@ INSTALLED_APPS = [
     'portfolio.apps.PortfolioConfig', # Приложение портфолио
     'bookings.apps.BookingsConfig', # Приложение для записи
     'reviews.apps.ReviewsConfig',    # Приложение отзывов
+    'benchmarks.apps.BenchmarksConfig', # Замеры на синтетических данных (seed_benchmark, run_benchmarks)
 ]
 
 # Промежуточное ПО (middleware)
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',                      # Метрики для /metrics (первым: замеряет всю цепочку)
+    'core.sqlprofile.SQLProfileMiddleware',                # Профиль SQL: N+1 и медленные запросы (при SQL_PROFILE)
     'django.middleware.security.SecurityMiddleware',        # Безопасность
+    'core.staticfiles.StaticFilesMiddleware',              # Статика из STATIC_ROOT (сжатые копии, immutable)
     'django.contrib.sessions.middleware.SessionMiddleware', # Сессии
     'django.middleware.common.CommonMiddleware',           # Общие функции
     'django.middleware.csrf.CsrfViewMiddleware',           # Защита от CSRF
     'django.contrib.auth.middleware.AuthenticationMiddleware', # Аутентификация
+    'core.db.ReplicaReadsMiddleware',                      # Чтение публичных страниц с реплики
     'django.contrib.messages.middleware.MessageMiddleware', # Сообщения
     'django.middleware.clickjacking.XFrameOptionsMiddleware', # Защита от clickjacking
+    'core.pagecache.PageCacheMiddleware',                  # Кэш страниц для анонимов (последним)
 ]
 
 # Корневая конфигурация URL
 ROOT_URLCONF = 'framed.urls'
 
+# Async-варианты посещаемых страниц (core.asyncviews); включается в framed/asgi.py
+ASYNC_VIEWS = os.getenv('DJANGO_ASYNC_VIEWS') == '1'
+
 # Настройки шаблонов
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.metrics.DjangoTemplates',  # Стандартный бэкенд с замером времени рендера
         'DIRS': [BASE_DIR / 'templates'],  # Директории с шаблонами
         'APP_DIRS': True,  # Поиск шаблонов в приложениях
         'OPTIONS': {
@@ -66,12 +75,30 @@ TEMPLATES = [
 WSGI_APPLICATION = 'framed.wsgi.application'
 
 # Настройки базы данных
+# PRAGMA соединений SQLite (WAL, busy_timeout и др.) задаются в core.db
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',  # Движок БД
-        'NAME': BASE_DIR / 'db.sqlite3',        # Путь к файлу БД
-    }
+        'NAME': os.getenv('DATABASE_PATH') or BASE_DIR / 'db.sqlite3',  # Путь к файлу БД
+        'OPTIONS': {
+            'timeout': 20,                       # Ожидание блокировки, с
+            'transaction_mode': 'IMMEDIATE',     # Запись берет блокировку сразу, без взаимоблокировки при повышении
+        },
+        # Тестовая база — файл, а не память: в общей памяти SQLite блокировка таблицы
+        # не ждет timeout, и запись из рабочих потоков импорта падает сразу
+        'TEST': {'NAME': os.getenv('TEST_DATABASE_PATH') or BASE_DIR / 'test_db.sqlite3'},
+    },
+    # Чтение публичных страниц (core.db.PrimaryReplicaRouter). По умолчанию — тот же файл
+    # через отдельные соединения только для чтения; при репликации — путь к копии
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.getenv('DATABASE_REPLICA_PATH') or os.getenv('DATABASE_PATH') or BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {'timeout': 20},
+        'PRAGMAS': {'query_only': 'ON'},
+        'TEST': {'MIRROR': 'default'},
+    },
 }
+DATABASE_ROUTERS = ['core.db.PrimaryReplicaRouter']
 
 # Валидация паролей
 AUTH_PASSWORD_VALIDATORS = [
@@ -106,6 +133,47 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'  # Директория для collectsta
 # Медиа файлы (загружаемые пользователями)
 MEDIA_URL = '/media/'   # URL-префикс для медиа файлов
 MEDIA_ROOT = BASE_DIR / 'media'  # Директория для хранения медиа файлов
+# Хранилища: загружаемые изображения хранятся по SHA-256 содержимого (core.storage)
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    # collectstatic пишет имена с хешем содержимого и сжатые копии .gz/.br (core.staticfiles)
+    'staticfiles': {'BACKEND': 'core.staticfiles.CompressedManifestStaticFilesStorage'},
+    'content': {'BACKEND': 'core.storage.ContentAddressedStorage'},
+}
+# SHA-256 загружаемых файлов считается прямо во время приема запроса
+FILE_UPLOAD_HANDLERS = [
+    'core.uploadhandlers.HashingMemoryFileUploadHandler',
+    'core.uploadhandlers.HashingTemporaryFileUploadHandler',
+]
+# Отдача медиафайлов: None — сам Django (Range + sendfile через wsgi.file_wrapper),
+# 'nginx' — X-Accel-Redirect, 'apache' — X-Sendfile
+MEDIA_SENDFILE_BACKEND = os.getenv('MEDIA_SENDFILE_BACKEND') or None
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'  # internal-location в nginx
+# Маршрут MEDIA_URL подключается только в режиме отладки, при отдаче через nginx/Apache
+# или явно (MEDIA_SERVE=1); иначе медиа отдает фронтовый сервер напрямую
+MEDIA_SERVE = DEBUG or bool(MEDIA_SENDFILE_BACKEND) or os.getenv('MEDIA_SERVE') == '1'
+# Префиксы обычных (не контентно-адресуемых) загрузок, которые можно отдавать
+MEDIA_SERVE_PREFIXES = ('portfolio/', 'about/')
+
+# Кэш должен быть общим для всех процессов сервера: в нем лежат счетчики поколений,
+# по которым справочники (core.reference), фрагменты (portfolio.fragments) и кэш
+# страниц (core.pagecache) узнают об изменениях. С LocMemCache каждый процесс видел бы
+# только свои изменения и отдавал устаревшие данные (см. проверку core.W001).
+# По умолчанию — файловый кэш, общий для процессов одной машины; при нескольких
+# серверах — Redis (REDIS_URL, нужен пакет redis)
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL}}
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('CACHE_DIR') or BASE_DIR / '.cache',
+            'OPTIONS': {'MAX_ENTRIES': 20000},
+        },
+    }
+# Тесты получают свой кэш во временном каталоге, а не общий с разработкой (core.testrunner)
+TEST_RUNNER = 'core.testrunner.TestRunner'
 
 # Тип поля первичного ключа по умолчанию
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -123,6 +191,16 @@ TELEGRAM_BOT_API_KEY = os.getenv("TELEGRAM_BOT_API_KEY")
 TELEGRAM_USER_ID = os.getenv("TELEGRAM_USER_ID")
 BASE_URL = os.getenv("BASE_URL")
 
+# Метрики (core.metrics): каталог для сборки значений всех воркеров и доступ к /metrics —
+# токен или адреса скрейпера (за обратным прокси REMOTE_ADDR у всех 127.0.0.1, тогда нужен токен)
+PROMETHEUS_MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR') or None
+METRICS_TOKEN = os.getenv('METRICS_TOKEN') or None
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.getenv('METRICS_ALLOWED_IPS', '').split(',') if ip.strip()]
+
+# Профилирование SQL каждого запроса (core.sqlprofile): лог N+1 и медленных запросов с планом
+SQL_PROFILE = os.getenv('SQL_PROFILE') == '1'
+SQL_PROFILE_SLOW_MS = 100
+
 JAZZMIN_SETTINGS = {
     "site_title": "Ваш Проект",
     "site_header": "Панель управления",
@@ -139,4 +217,6 @@ JAZZMIN_SETTINGS = {
         "auth.user": "fas fa-user",
         "auth.Group": "fas fa-users",
     },
-}
\ No newline at end of file
+}
+# Каталог на сервере, из которого разрешен массовый импорт фотографий через админку
+PHOTO_IMPORT_ROOT = BASE_DIR / 'import'
@@ -1,13 +1,42 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf.urls.i18n import i18n_patterns
 from django.conf import settings
-from django.conf.urls.static import static
+from core import api, metrics, sitemaps
+from core.media import serve_media
+from portfolio.api import AlbumResource, PhotoResource, ShootingTypeResource, VideoResource
+from portfolio.sitemaps import AlbumSitemap, ShootingTypeSitemap, VideoSitemap
+from reviews.api import ReviewResource
+
+SITEMAPS = {
+    'albums': AlbumSitemap,
+    'types': ShootingTypeSitemap,
+    'videos': VideoSitemap,
+}
+
+API_RESOURCES = {
+    'albums': AlbumResource,
+    'photos': PhotoResource,
+    'videos': VideoResource,
+    'shooting-types': ShootingTypeResource,
+    'services': api.ServiceResource,
+    'reviews': ReviewResource,
+}
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('sitemap.xml', sitemaps.index, {'sitemaps': SITEMAPS}, name='sitemap_index'),
+    path('sitemap-<slug:section>-<int:shard>.xml', sitemaps.section, {'sitemaps': SITEMAPS}, name='sitemap_section'),
+    # JSON API только для чтения (без языкового префикса: данные не переводятся)
+    path('api/<slug:resource>/', api.resource_list, {'resources': API_RESOURCES}, name='api_list'),
+    path('api/<slug:resource>/<int:pk>/', api.resource_detail, {'resources': API_RESOURCES}, name='api_detail'),
+    path('metrics', metrics.metrics_view, name='metrics'),
 ]
 
+if settings.MEDIA_SERVE:
+    # Медиафайлы с поддержкой Range (перемотка видео, докачка)
+    urlpatterns.append(re_path(r'^%s(?P<path>.*)$' % settings.MEDIA_URL.lstrip('/'), serve_media, name='media'))
+
 urlpatterns += i18n_patterns(
     path('', include('core.urls', namespace='core')),
     path('portfolio/', include('portfolio.urls', namespace='portfolio')),
@@ -15,7 +44,3 @@ urlpatterns += i18n_patterns(
     path('reviews/',include('reviews.urls', namespace='reviews')),
     prefix_default_language=False
 )
-
-# Обработка медиа файлов в development
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
@@ -1,13 +1,75 @@
-from django.contrib import admin
+import json
+
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponseNotAllowed, JsonResponse
+from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import path, reverse
 from django.utils.safestring import mark_safe
 from django.utils.translation import gettext_lazy as _
-from .models import ShootingType, Album, Photo, Video
+from core import reference
+from .forms import PhotoImportForm
+from .imagehash import DUPLICATE_RADIUS, duplicate_groups
+from .models import ShootingType, Album, Photo, PhotoImport, Video
+from . import fragments, importer, ordering
+
+
+class DragReorderMixin:
+    """
+    Перестановка строк списка перетаскиванием (см. portfolio.ordering).
+
+    Перетаскивание включается, только когда список отсортирован по
+    умолчанию и отфильтрован ровно по ``reorder_scope_params`` — иначе
+    строки страницы не образуют непрерывный участок порядка.
+    """
+    reorder_scope_params = ()
+    reorder_hint = _("Чтобы менять порядок перетаскиванием, сбросьте фильтры, поиск и сортировку")
+
+    def get_reorder_queryset(self, ids):
+        return self.model.objects.all()
+
+    def reordered(self, queryset):
+        """Вызывается после перестановки (bulk_update не вызывает сигналы)"""
+        fragments.bump(fragments.PORTFOLIO)
+
+    def get_urls(self):
+        info = self.model._meta.app_label, self.model._meta.model_name
+        urls = [
+            path('reorder/', self.admin_site.admin_view(self.reorder_view), name='%s_%s_reorder' % info),
+        ]
+        return urls + super().get_urls()
+
+    def changelist_view(self, request, extra_context=None):
+        extra_context = extra_context or {}
+        if self.has_change_permission(request):
+            if set(request.GET) - {'p'} == set(self.reorder_scope_params):
+                info = self.model._meta.app_label, self.model._meta.model_name
+                extra_context['reorder_url'] = reverse('admin:%s_%s_reorder' % info)
+            else:
+                extra_context['reorder_hint'] = self.reorder_hint
+        return super().changelist_view(request, extra_context)
+
+    def reorder_view(self, request):
+        """Принимает JSON {"ids": [...]} — id строк страницы в новом порядке"""
+        if request.method != 'POST':
+            return HttpResponseNotAllowed(['POST'])
+        if not self.has_change_permission(request):
+            raise PermissionDenied
+        try:
+            ids = json.loads(request.body)['ids']
+            queryset = self.get_reorder_queryset(ids)
+            updated = ordering.reorder(queryset, ids)
+        except (ValueError, KeyError, TypeError) as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        self.reordered(queryset)
+        return JsonResponse({'updated': updated})
+
 
 @admin.register(ShootingType)
-class ShootingTypeAdmin(admin.ModelAdmin):
+class ShootingTypeAdmin(DragReorderMixin, admin.ModelAdmin):
     """Админка для типов съемок"""
     list_display = ['name', 'slug', 'is_active', 'order']
-    list_editable = ['is_active', 'order']
+    list_editable = ['is_active']
     list_filter = ['is_active']  
     search_fields = ['name', 'description']
     prepopulated_fields = {'slug': ('name',)}
@@ -21,6 +83,21 @@ class ShootingTypeAdmin(admin.ModelAdmin):
         }),
     )
 
+    def reordered(self, queryset):
+        super().reordered(queryset)
+        reference.invalidate()
+
+
+def _duplicates_list(photos):
+    return ', '.join(f"#{photo.pk} «{photo}» ({photo.album})" for photo in photos)
+
+
+def warn_about_duplicates(request, photo):
+    """Предупреждение при загрузке фото, похожего на уже существующие"""
+    duplicates = photo.find_duplicates()
+    if duplicates:
+        messages.warning(request, f"Фото «{photo}» похоже на уже загруженные: {_duplicates_list(duplicates)}")
+
 
 class PhotoInline(admin.TabularInline):
     """Фотографии внутри альбома"""
@@ -37,20 +114,20 @@ class PhotoInline(admin.TabularInline):
 
 
 @admin.register(Album)
-class AlbumAdmin(admin.ModelAdmin):
+class AlbumAdmin(DragReorderMixin, admin.ModelAdmin):
     """Админка для альбомов"""
-    list_display = ['title', 'cover_preview', 'shooting_types_list', 'is_published', 'is_featured', 'order', 'created_at']
-    list_editable = ['is_published', 'is_featured', 'order']
+    list_display = ['title', 'cover_preview', 'photo_count', 'shooting_types_list', 'is_published', 'is_featured', 'order', 'created_at']
+    list_editable = ['is_published', 'is_featured']
     list_filter = ['is_published', 'is_featured', 'shooting_types']
     search_fields = ['title', 'description']
     prepopulated_fields = {'slug': ('title',)}
     filter_horizontal = ['shooting_types']
     inlines = [PhotoInline]
-    readonly_fields = ['cover_preview', 'created_at', 'updated_at']
+    readonly_fields = ['cover_preview', 'photo_count', 'created_at', 'updated_at']
     
     fieldsets = (
         (_('Основная информация'), {
-            'fields': ('title', 'slug', 'cover', 'cover_preview')
+            'fields': ('title', 'slug', 'cover', 'cover_preview', 'photo_count')
         }),
         (_('Настройки'), {
             'fields': ('shooting_types', 'is_published', 'is_featured', 'order')
@@ -66,8 +143,8 @@ class AlbumAdmin(admin.ModelAdmin):
     )
     
     def cover_preview(self, obj):
-        if obj.cover:
-            return mark_safe(f'<img src="{obj.cover.url}" style="max-height: 200px; max-width: 300px;">')
+        if obj.effective_cover:
+            return mark_safe(f'<img src="{obj.effective_cover.url}" style="max-height: 200px; max-width: 300px;">')
         return _("Нет обложки")
     cover_preview.short_description = _("Предпросмотр обложки")
     
@@ -75,19 +152,76 @@ class AlbumAdmin(admin.ModelAdmin):
         return ", ".join([st.name for st in obj.shooting_types.all()])
     shooting_types_list.short_description = _("Типы съемок")
 
+    def save_formset(self, request, form, formset, change):
+        super().save_formset(request, form, formset, change)
+        if formset.model is Photo:
+            for photo in formset.new_objects + [obj for obj, fields in formset.changed_objects if 'image' in fields]:
+                warn_about_duplicates(request, photo)
+
+    def get_urls(self):
+        urls = [
+            path(
+                '<path:object_id>/import/',
+                self.admin_site.admin_view(self.import_photos_view),
+                name='portfolio_album_import_photos'
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def import_photos_view(self, request, object_id):
+        """Ставит в очередь массовый импорт фотографий из ZIP-архива или каталога на сервере"""
+        album = get_object_or_404(Album, pk=object_id)
+        if not self.has_change_permission(request, album):
+            raise PermissionDenied
+
+        form = PhotoImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            job = importer.enqueue(
+                album, archive=form.cleaned_data['archive'] or None, directory=form.cleaned_data['directory'],
+            )
+            messages.success(request, mark_safe(
+                f"Импорт поставлен в очередь. Результат — на странице "
+                f"<a href=\"{reverse('admin:portfolio_photoimport_change', args=[job.pk])}\">задания импорта</a>."
+            ))
+            return redirect('admin:portfolio_album_change', album.pk)
+
+        context = {
+            **self.admin_site.each_context(request),
+            'title': _("Импорт фотографий"),
+            'opts': self.model._meta,
+            'original': album,
+            'form': form,
+        }
+        return render(request, 'admin/portfolio/album/import_photos.html', context)
+
+
+@admin.register(PhotoImport)
+class PhotoImportAdmin(admin.ModelAdmin):
+    """Задания импорта фотографий (выполняет команда process_photo_imports)"""
+    list_display = ['album', 'source', 'status', 'created_count', 'created_at', 'finished_at']
+    list_filter = ['status']
+    readonly_fields = ['album', 'source', 'is_upload', 'status', 'created_count', 'report', 'created_at', 'finished_at']
+    exclude = ['lease_until']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 
 @admin.register(Photo)
-class PhotoAdmin(admin.ModelAdmin):
+class PhotoAdmin(DragReorderMixin, admin.ModelAdmin):
     """Админка для фотографий"""
     list_display = ['title', 'album', 'image_preview', 'order', 'is_cover_candidate', 'created_at']
-    list_editable = ['order', 'is_cover_candidate']
+    list_editable = ['is_cover_candidate']
     list_filter = ['album', 'is_cover_candidate']
     search_fields = ['title', 'description', 'album__title']
-    readonly_fields = ['image_preview', 'created_at']
+    readonly_fields = ['image_preview', 'palette_preview', 'created_at']
     
     fieldsets = (
         (_('Основная информация'), {
-            'fields': ('album', 'image', 'image_preview')
+            'fields': ('album', 'image', 'image_preview', 'palette_preview')
         }),
         (_('Детали'), {
             'fields': ('title', 'description', 'order', 'is_cover_candidate')
@@ -104,6 +238,64 @@ class PhotoAdmin(admin.ModelAdmin):
         return _("Нет изображения")
     image_preview.short_description = _("Предпросмотр")
 
+    def palette_preview(self, obj):
+        swatches = [
+            f'<span title="{color.get_color_display()} {color.weight:.0%}" '
+            f'style="display:inline-block; width:24px; height:24px; margin-right:4px; background:{color.hex_value};"></span>'
+            for color in obj.colors.all()
+        ] if obj.pk else []
+        return mark_safe(''.join(swatches)) if swatches else _("Нет данных")
+    palette_preview.short_description = _("Доминирующие цвета")
+
+    reorder_scope_params = ('album__id__exact',)
+    reorder_hint = _("Чтобы менять порядок перетаскиванием, выберите альбом в фильтре и сбросьте поиск и сортировку")
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if 'image' in form.changed_data:
+            warn_about_duplicates(request, obj)
+
+    def get_reorder_queryset(self, ids):
+        album_ids = set(Photo.objects.filter(pk__in=ids).values_list('album_id', flat=True))
+        if len(album_ids) != 1:
+            raise ordering.OrderingError("Переставлять можно только фотографии одного альбома")
+        return Photo.objects.filter(album_id=album_ids.pop())
+
+    def reordered(self, queryset):
+        album_id = queryset.values_list('album_id', flat=True).first()
+        Album.refresh_effective_cover(album_id)
+        fragments.bump(fragments.album_scope(album_id), fragments.PORTFOLIO)
+
+    def get_urls(self):
+        urls = [
+            path(
+                'duplicates/',
+                self.admin_site.admin_view(self.duplicates_view),
+                name='portfolio_photo_duplicates'
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def duplicates_view(self, request):
+        """Отчет о похожих фотографиях во всей библиотеке"""
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        photos = Photo.objects.exclude(image_hash=None).select_related('album').only(
+            'pk', 'image', 'title', 'image_hash', 'album__title', 'album__slug'
+        )
+        groups = duplicate_groups((photo.image_hash, photo) for photo in photos.iterator(chunk_size=2000))
+        groups.sort(key=len, reverse=True)
+        context = {
+            **self.admin_site.each_context(request),
+            'title': _("Похожие фотографии"),
+            'opts': self.model._meta,
+            'groups': groups,
+            'radius': DUPLICATE_RADIUS,
+            'unhashed_count': Photo.objects.filter(image_hash=None, image_hash_failed=False).count(),
+            'failed_count': Photo.objects.filter(image_hash_failed=True).count(),
+        }
+        return render(request, 'admin/portfolio/photo/duplicates.html', context)
+
 
 @admin.register(Video)
 class VideoAdmin(admin.ModelAdmin):
@@ -0,0 +1,79 @@
+from core.api import Resource
+from . import fragments
+from .models import Album, Photo, ShootingType, Video
+
+
+class AlbumResource(Resource):
+    fields = {
+        'id': 'pk',
+        'title': 'title',
+        'slug': 'slug',
+        'description': 'description',
+        'cover': 'effective_cover',
+        'is_featured': 'is_featured',
+        'photo_count': 'photo_count',
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+    }
+    many_fields = {'shooting_types': 'shooting_types__slug'}
+    ordering = ('order', '-created_at', 'pk')
+    filters = {'type': 'shooting_types__slug', 'featured': 'is_featured'}
+    generation_scopes = (fragments.PORTFOLIO,)
+
+    def get_queryset(self):
+        return Album.objects.filter(is_published=True)
+
+
+class PhotoResource(Resource):
+    fields = {
+        'id': 'pk',
+        'album': 'album_id',
+        'image': 'image',
+        'title': 'title',
+        'description': 'description',
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+    }
+    many_fields = {'colors': 'colors__color'}
+    # Совпадает с индексом photo_album_sequence_idx
+    ordering = ('album', 'order', 'pk')
+    filters = {'album': 'album_id', 'color': 'colors__color'}
+    generation_scopes = (fragments.PORTFOLIO,)
+
+    def get_queryset(self):
+        return Photo.objects.filter(album__is_published=True)
+
+
+class VideoResource(Resource):
+    fields = {
+        'id': 'pk',
+        'title': 'title',
+        'video_file': 'video_file',
+        'youtube_url': 'youtube_url',
+        'thumbnail': 'thumbnail',
+        'description': 'description',
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+    }
+    many_fields = {'shooting_types': 'shooting_types__slug'}
+    ordering = ('-created_at', '-pk')
+    filters = {'type': 'shooting_types__slug'}
+    generation_scopes = (fragments.PORTFOLIO,)
+
+    def get_queryset(self):
+        return Video.objects.filter(is_published=True)
+
+
+class ShootingTypeResource(Resource):
+    fields = {
+        'id': 'pk',
+        'name': 'name',
+        'slug': 'slug',
+        'description': 'description',
+        'updated_at': 'updated_at',
+    }
+    ordering = ('order', 'pk')
+    generation_scopes = (fragments.PORTFOLIO,)
+
+    def get_queryset(self):
+        return ShootingType.objects.filter(is_active=True)
@@ -1,5 +1,42 @@
+import hashlib
+from dataclasses import dataclass, field
+
 import django_filters
-from .models import Album, ShootingType
+from django.core.cache import cache
+from django.db.models import Count, Value
+
+from core import reference
+from .models import Album, PhotoColor, ShootingType
+from . import fragments, palette, search
+
+# Фильтры, по которым считаются фасеты (каждый счетчик не учитывает собственный фильтр)
+FACET_FILTERS = ('shooting_type', 'is_featured')
+# Значение в колонке типа съемки для итоговых строк (без разбивки по типам)
+ALL_TYPES = -1
+
+
+@dataclass
+class Facets:
+    """Счетчики альбомов для боковой панели фильтра"""
+    shooting_types: list = field(default_factory=list)
+    featured: int = 0
+    unfeatured: int = 0
+
+    @classmethod
+    def build(cls, rows, types, shooting_type=None, is_featured=None):
+        """Собирает фасеты из строк (рекомендуемое, id типа, число альбомов) с учетом выбранных значений"""
+        def count(type_id, featured=None):
+            return sum(
+                albums for row_featured, row_type, albums in rows
+                if row_type == type_id and (featured is None or row_featured == featured)
+            )
+
+        selected_type = shooting_type.pk if shooting_type else ALL_TYPES
+        return cls(
+            shooting_types=[{**item, 'count': count(item['id'], is_featured)} for item in types],
+            featured=count(selected_type, True),
+            unfeatured=count(selected_type, False),
+        )
 
 class AlbumFilter(django_filters.FilterSet):
     shooting_type = django_filters.ModelChoiceFilter(
@@ -10,7 +47,7 @@ class AlbumFilter(django_filters.FilterSet):
     )
     
     title = django_filters.CharFilter(
-        lookup_expr='icontains',
+        method='filter_title',
         label="Название"
     )
     
@@ -18,6 +55,57 @@ class AlbumFilter(django_filters.FilterSet):
         label="Только рекомендуемые"
     )
 
+    color = django_filters.ChoiceFilter(
+        method='filter_color',
+        choices=palette.FILTER_CHOICES,
+        label="Цвет",
+        empty_label="Любой цвет"
+    )
+
     class Meta:
         model = Album
-        fields = ['shooting_type', 'title', 'is_featured']
\ No newline at end of file
+        fields = ['shooting_type', 'title', 'is_featured', 'color']
+
+    def filter_title(self, queryset, name, value):
+        """Поиск по названию через полнотекстовый индекс (LIKE — только без FTS5)"""
+        if not search.is_available():
+            return queryset.filter(title__icontains=value)
+        return queryset.filter(pk__in=search.matching_ids(search.KIND_ALBUM, value, column='title'))
+
+    def filter_color(self, queryset, name, value):
+        """Альбомы, в которых есть фото с заметной долей цвета (выборка по индексу PhotoColor)"""
+        return queryset.filter(pk__in=PhotoColor.matching(value).values('photo__album_id'))
+
+    def facets(self):
+        """
+        Счетчики по типам съемки и по признаку «рекомендуемое» для текущего состояния фильтра.
+
+        Считаются одним запросом: GROUP BY по признаку и типу, объединенный
+        (UNION ALL) с итогами по признаку без разбивки по типам — сумма по типам
+        завысила бы итог для альбомов с несколькими типами. Результат кэшируется
+        по сигнатуре остальных условий фильтра до изменения контента портфолио.
+        """
+        cleaned = self.form.cleaned_data if self.is_valid() else {}
+        other = {
+            name: value for name, value in self.data.items()
+            if name in self.filters and name not in FACET_FILTERS and value
+        }
+        signature = hashlib.md5(repr((str(self.queryset.query), sorted(other.items()))).encode('utf-8')).hexdigest()
+        generation, = fragments.generations([fragments.PORTFOLIO])
+        cache_key = f'facets:{signature}:{generation}'
+        counts = cache.get(cache_key)
+        if counts is None:
+            counts = self._count_facets(other)
+            cache.set(cache_key, counts, fragments.FRAGMENT_TIMEOUT)
+        rows, types = counts
+        return Facets.build(rows, types, cleaned.get('shooting_type'), cleaned.get('is_featured'))
+
+    def _count_facets(self, data):
+        albums = AlbumFilter(data, queryset=self.queryset).qs.order_by()
+        per_type = albums.values_list('is_featured', 'shooting_types').annotate(albums=Count('pk', distinct=True))
+        totals = albums.annotate(type_id=Value(ALL_TYPES)).values_list('is_featured', 'type_id').annotate(
+            albums=Count('pk', distinct=True)
+        )
+        rows = list(per_type.union(totals, all=True))
+        types = [{'id': item.pk, 'name': item.name, 'slug': item.slug} for item in reference.get('shooting_types')]
+        return rows, types
@@ -0,0 +1,44 @@
+import os
+import zipfile
+
+from django import forms
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+
+
+class PhotoImportForm(forms.Form):
+    """Форма массового импорта фотографий в альбом"""
+    archive = forms.FileField(
+        label=_("ZIP-архив"),
+        required=False,
+        help_text=_("Архив с фотографиями (.jpg, .jpeg, .png, .webp)")
+    )
+    directory = forms.CharField(
+        label=_("Каталог на сервере"),
+        required=False,
+        help_text=_("Путь относительно каталога импорта на сервере")
+    )
+
+    def clean_archive(self):
+        archive = self.cleaned_data.get('archive')
+        if archive and not zipfile.is_zipfile(archive):
+            raise forms.ValidationError(_("Файл не является ZIP-архивом"))
+        return archive
+
+    def clean_directory(self):
+        directory = self.cleaned_data.get('directory', '').strip()
+        if not directory:
+            return ''
+        root = os.path.realpath(settings.PHOTO_IMPORT_ROOT)
+        path = os.path.realpath(os.path.join(root, directory))
+        if os.path.commonpath([root, path]) != root:
+            raise forms.ValidationError(_("Каталог должен находиться внутри каталога импорта"))
+        if not os.path.isdir(path):
+            raise forms.ValidationError(_("Каталог не найден"))
+        return path
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if bool(cleaned_data.get('archive')) == bool(cleaned_data.get('directory')):
+            raise forms.ValidationError(_("Укажите либо ZIP-архив, либо каталог"))
+        return cleaned_data
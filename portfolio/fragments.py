@@ -0,0 +1,139 @@
+"""
+Кэширование HTML публичных страниц портфолио по поколениям.
+
+У каждой области — всего портфолио, альбома, типа съемки — есть счетчик
+поколения в кэше. Ключ фрагмента включает поколения областей, от которых
+зависит страница, поэтому при изменении контента сигналы (см.
+portfolio.signals) просто увеличивают счетчик: старые фрагменты перестают
+находиться и вытесняются сами, а новые живут, пока контент не изменится,
+без подбора TTL.
+
+Счетчики работают, только если кэш общий для всех процессов сервера (Redis
+или файловый кэш, см. CACHES и проверку core.W001): иначе увеличение
+счетчика в одном процессе не заметят остальные.
+
+Фрагмент пишется стандартным тегом ``{% cache %}``, а view заранее
+проверяет кэш с тем же ключом и, если фрагмент есть, не выполняет
+запросов к базе вовсе.
+"""
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.utils import make_template_fragment_key
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
+
+GENERATION_PREFIX = 'fragments:generation'
+# Большой TTL нужен только чтобы фрагменты устаревших поколений не копились вечно
+FRAGMENT_TIMEOUT = 60 * 60 * 24 * 7
+
+PORTFOLIO = 'portfolio'
+
+
+def album_scope(album_id):
+    return f'album:{album_id}'
+
+
+def shooting_type_scope(shooting_type_id):
+    return f'shooting_type:{shooting_type_id}'
+
+
+def _generation_key(scope):
+    return f'{GENERATION_PREFIX}:{scope}'
+
+
+def generations(scopes):
+    """Текущие поколения областей; отсутствующие счетчики создаются"""
+    keys = [_generation_key(scope) for scope in scopes]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            # Начальное значение — время в наносекундах: счетчик, вытесненный
+            # из кэша и созданный заново, не вернется к старым поколениям
+            cache.add(key, time.time_ns(), None)
+            values[key] = cache.get(key)
+    return [values[key] for key in keys]
+
+
+def track(request, *scopes):
+    """
+    Запоминает поколения областей, от которых зависит ответ на запрос.
+
+    Работает, только если кто-то ждет снимок (``request.generation_snapshot``,
+    его заводит core.pagecache); поколения снимаются до чтения данных, чтобы
+    изменение во время рендера сразу делало ответ устаревшим.
+    """
+    snapshot = getattr(request, 'generation_snapshot', None)
+    if snapshot is not None:
+        new = [scope for scope in scopes if scope not in snapshot]
+        snapshot.update(zip(new, generations(new)))
+
+
+def bump(*scopes):
+    """Делает недействительными все фрагменты, зависящие от областей"""
+    for scope in set(scopes):
+        key = _generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+
+def fragment_cache():
+    """Кэш, в который пишет тег {% cache %}"""
+    return caches['template_fragments'] if 'template_fragments' in settings.CACHES else cache
+
+
+def vary_on(scopes, request):
+    """Строка, от которой зависит фрагмент: язык, параметры запроса и поколения областей"""
+    query = '&'.join(f'{key}={value}' for key, values in sorted(request.GET.lists()) for value in values)
+    return ':'.join([get_language() or '', query, *map(str, generations(scopes))])
+
+
+class FragmentCacheMixin:
+    """
+    Отдает страницу из кэша фрагментов без обращения к базе.
+
+    Шаблон оборачивает содержимое в
+    ``{% cache view.fragment_timeout <fragment_name> view.fragment_vary_on %}``,
+    а если фрагмент уже в кэше, выводит ``cached_fragment``.
+    """
+    fragment_name = None
+    fragment_timeout = FRAGMENT_TIMEOUT
+    # Страница целиком кэшируется для анонимов с теми же областями (core.pagecache)
+    page_cache_tags = ()
+
+    def get_fragment_scopes(self):
+        return [PORTFOLIO]
+
+    def get(self, request, *args, **kwargs):
+        response = self.get_cached_response(request)
+        if response is not None:
+            return response
+        return super().get(request, *args, **kwargs)
+
+    def get_cached_response(self, request):
+        """Ответ из кэша фрагментов или None, если фрагмента нет"""
+        scopes = self.get_fragment_scopes()
+        track(request, *scopes)
+        self.fragment_vary_on = vary_on(scopes, request)
+        cached = fragment_cache().get(make_template_fragment_key(self.fragment_name, [self.fragment_vary_on]))
+        if cached is None:
+            return None
+        # render_to_response не годится: get_template_names у ListView/DetailView требует object_list/object
+        return self.response_class(
+            request=request,
+            template=[self.template_name],
+            context=self.get_fragment_context(cached_fragment=mark_safe(cached)),
+            using=self.template_engine,
+        )
+
+    async def aget_cached_response(self, request):
+        # Области и поколения читаются синхронно (кэш, иногда база) — одним переходом в поток
+        return await sync_to_async(self.get_cached_response)(request)
+
+    def get_fragment_context(self, **kwargs):
+        kwargs.setdefault('view', self)
+        return kwargs
@@ -0,0 +1,156 @@
+"""
+Перцептивный хеш изображений (dHash) и поиск похожих фотографий.
+
+dHash — 64 бита: изображение уменьшается до 9×8 в оттенках серого, и для
+каждой пары соседних пикселей в строке записывается, светлее ли левый.
+Хеш устойчив к пересжатию, изменению размера и небольшой цветокоррекции,
+поэтому дубликаты находятся по расстоянию Хэмминга.
+
+Для поиска хеш делится на 4 полосы по 16 бит (multi-index hashing). Если
+расстояние между хешами не больше ``radius``, то по принципу Дирихле хотя
+бы одна полоса отличается не больше чем на ``radius // 4`` бит — значит,
+кандидатов можно найти индексными выборками по полосам, а не перебором.
+"""
+from itertools import combinations
+
+from django.db.models import Q
+from PIL import Image
+
+HASH_SIZE = 8
+BANDS = 4
+BAND_BITS = 64 // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+DUPLICATE_RADIUS = 6
+
+
+def dhash(fp):
+    """Считает 64-битный dHash изображения из файла или файлового объекта"""
+    with Image.open(fp) as image:
+        # Для JPEG draft() декодирует сразу в уменьшенном масштабе
+        image.draft('L', (HASH_SIZE * 8, HASH_SIZE * 8))
+        small = image.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.LANCZOS)
+        pixels = small.tobytes()
+
+    value = 0
+    width = HASH_SIZE + 1
+    for row in range(HASH_SIZE):
+        offset = row * width
+        for col in range(HASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+def to_signed(value):
+    """64-битный хеш -> значение для BigIntegerField (знаковое)"""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+def bands(value):
+    """Делит хеш на полосы по 16 бит"""
+    value = to_unsigned(value)
+    return [(value >> (BAND_BITS * i)) & BAND_MASK for i in range(BANDS)]
+
+
+def band_neighbors(band, radius):
+    """Все значения полосы на расстоянии не больше radius от данного"""
+    values = [band]
+    for distance in range(1, radius + 1):
+        for bits in combinations(range(BAND_BITS), distance):
+            flipped = band
+            for bit in bits:
+                flipped ^= 1 << bit
+            values.append(flipped)
+    return values
+
+
+def candidates_query_many(values, radius=DUPLICATE_RADIUS):
+    """
+    Q-условие по индексированным полосам, покрывающее всех соседей хешей
+    values в радиусе radius (значения полос объединяются по номеру полосы)
+    """
+    band_radius = radius // BANDS
+    neighbors = [set() for _ in range(BANDS)]
+    for value in values:
+        for index, band in enumerate(bands(value)):
+            neighbors[index].update(band_neighbors(band, band_radius))
+    query = Q()
+    for index, band_values in enumerate(neighbors):
+        query |= Q(**{f'hash_band_{index}__in': sorted(band_values)})
+    return query
+
+
+class BKTree:
+    """BK-дерево по расстоянию Хэмминга для поиска соседей по всей библиотеке"""
+
+    def __init__(self):
+        self.root = None
+
+    def add(self, value, item):
+        if self.root is None:
+            self.root = (value, [item], {})
+            return
+        node = self.root
+        while True:
+            node_value, items, children = node
+            distance = hamming(value, node_value)
+            if distance == 0:
+                items.append(item)
+                return
+            if distance not in children:
+                children[distance] = (value, [item], {})
+                return
+            node = children[distance]
+
+    def search(self, value, radius):
+        """Возвращает пары (расстояние, item) для всех хешей в радиусе radius"""
+        found = []
+        stack = [self.root] if self.root else []
+        while stack:
+            node_value, items, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= radius:
+                found.extend((distance, item) for item in items)
+            for child_distance, child in children.items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+        return found
+
+
+def duplicate_groups(items, radius=DUPLICATE_RADIUS):
+    """
+    Группирует похожие изображения.
+
+    ``items`` — пары ``(хеш, объект)``. Возвращает список групп (списков
+    объектов) размером от двух; группы — компоненты связности графа
+    «расстояние не больше radius».
+    """
+    items = [(to_unsigned(value), obj) for value, obj in items if value is not None]
+    tree = BKTree()
+    for index, (value, _) in enumerate(items):
+        tree.add(value, index)
+
+    parent = list(range(len(items)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for index, (value, _) in enumerate(items):
+        for _, other in tree.search(value, radius):
+            if other != index:
+                parent[find(other)] = find(index)
+
+    groups = {}
+    for index, (_, obj) in enumerate(items):
+        groups.setdefault(find(index), []).append(obj)
+    return [group for group in groups.values() if len(group) > 1]
@@ -0,0 +1,284 @@
+"""
+Массовый импорт фотографий в альбом из ZIP-архива или каталога на сервере.
+
+Архив не распаковывается целиком: каждый файл читается из ZIP один раз и
+сразу сохраняется в хранилище. Проверка изображений и запись файлов
+выполняются в пуле потоков, а строки ``Photo`` вставляются пачками через
+``bulk_create``. Так как ``bulk_create`` не вызывает сигналы, счетчик
+фотографий, обложка, поисковый индекс, кэш страниц и рекомендации альбома
+обновляются в конце явно — даже если импорт прервался ошибкой.
+
+Из админки импорт не выполняется в запросе: ``enqueue`` создает задание
+``PhotoImport``, а выполняет его команда ``process_photo_imports`` (как
+очередь писем в core.mailqueue).
+"""
+import io
+import logging
+import os
+import uuid
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.utils import timezone
+from PIL import Image
+
+from core import storage
+from . import fragments, imagehash, ordering, palette, recommendations, search
+from .models import Album, Photo, PhotoColor, PhotoImport, validate_image_extension
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+UPLOADS_DIR = 'uploads'
+LEASE = timedelta(hours=2)
+EXIF_IMAGE_DESCRIPTION = 270
+
+
+@dataclass
+class ImportEntry:
+    """Файл-кандидат на импорт и способ открыть его содержимое"""
+    name: str
+    open: object
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    skipped: list = field(default_factory=list)
+    duplicates: list = field(default_factory=list)
+
+
+def _is_hidden(path):
+    return any(part.startswith('.') or part == '__MACOSX' for part in path.replace('\\', '/').split('/'))
+
+
+def iter_zip(archive):
+    """Перебирает файлы ZIP-архива (путь или файловый объект) без чтения архива в память"""
+    zf = zipfile.ZipFile(archive)
+    for info in sorted(zf.infolist(), key=lambda info: info.filename):
+        if info.is_dir() or _is_hidden(info.filename):
+            continue
+        yield ImportEntry(info.filename, lambda info=info: zf.open(info))
+
+
+def iter_directory(path):
+    """Перебирает файлы каталога рекурсивно, в алфавитном порядке"""
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if not _is_hidden(d))
+        for filename in sorted(files):
+            if _is_hidden(filename):
+                continue
+            full_path = os.path.join(root, filename)
+            yield ImportEntry(
+                os.path.relpath(full_path, path),
+                lambda full_path=full_path: open(full_path, 'rb')
+            )
+
+
+def _read_title(image):
+    try:
+        description = image.getexif().get(EXIF_IMAGE_DESCRIPTION)
+    except Exception:
+        return ''
+    if isinstance(description, bytes):
+        description = description.decode('utf-8', errors='ignore')
+    return (description or '').strip()[:200]
+
+
+def process_entry(entry):
+    """
+    Проверяет файл и сохраняет его в хранилище.
+
+    Возвращает ``(имя в хранилище, название, перцептивный хеш, палитра)`` или бросает ValidationError.
+    Выполняется в рабочем потоке. Файл читается один раз: запись ZIP-архива
+    при каждом повторном чтении распаковывалась бы заново.
+    """
+    basename = os.path.basename(entry.name)
+    validate_image_extension(File(None, name=basename))
+
+    try:
+        with entry.open() as fh:
+            data = fh.read()
+    except (OSError, EOFError, zipfile.BadZipFile, zlib.error) as e:
+        raise ValidationError(f'Не удалось прочитать файл: {e}')
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            title = _read_title(image)
+            image.verify()
+        image_hash = imagehash.dhash(io.BytesIO(data))
+        swatches = palette.extract(io.BytesIO(data))
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as e:
+        raise ValidationError(f'Файл не является изображением: {e}')
+
+    image_field = Photo._meta.get_field('image')
+    stored_name = image_field.storage.save(
+        image_field.generate_filename(None, basename),
+        ContentFile(data, name=basename)
+    )
+    return stored_name, title, image_hash, swatches
+
+
+def _safe_process(entry):
+    try:
+        return entry, process_entry(entry), None
+    except ValidationError as e:
+        return entry, None, ' '.join(e.messages)
+    finally:
+        # Хранилище пишет Blob из рабочего потока — у потока свое соединение,
+        # которое иначе осталось бы открытым после завершения пула
+        connections.close_all()
+
+
+def _create_photos(photos):
+    # На SQLite и PostgreSQL bulk_create проставляет pk, так что палитры можно вставить следом
+    Photo.objects.bulk_create(photos)
+    PhotoColor.objects.bulk_create([row for photo in photos for row in photo.palette_rows(photo._swatches)])
+
+
+def import_photos(album, entries, workers=None, progress=None):
+    """
+    Импортирует фотографии в альбом.
+
+    ``entries`` — итератор ImportEntry (см. iter_zip / iter_directory),
+    ``progress`` — необязательный callback ``progress(processed, total)``.
+    Если импорт прервется ошибкой, уже созданные фотографии все равно
+    учитываются в альбоме, поиске и кэше.
+    """
+    entries = list(entries)
+    total = len(entries)
+    result = ImportResult()
+    next_order = ordering.next_key(album.photos.all())
+
+    batch, photo_names, imported = [], [], []
+
+    def flush():
+        _create_photos(batch)
+        result.created += len(batch)
+        photo_names.extend(photo.image.name for photo in batch)
+        batch.clear()
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for processed, (entry, stored, error) in enumerate(executor.map(_safe_process, entries), start=1):
+                if error:
+                    result.skipped.append((entry.name, error))
+                else:
+                    stored_name, title, image_hash, swatches = stored
+                    photo = Photo(album=album, image=stored_name, title=title, order=next_order)
+                    photo.set_image_hash(image_hash)
+                    photo._swatches = swatches
+                    batch.append(photo)
+                    imported.append((entry.name, photo))
+                    next_order += ordering.GAP
+                if len(batch) >= BATCH_SIZE:
+                    flush()
+                if progress:
+                    progress(processed, total)
+        if batch:
+            flush()
+        _report_duplicates(result, imported)
+    finally:
+        if result.created:
+            _finish(album, result.created, photo_names)
+    return result
+
+
+def _report_duplicates(result, imported):
+    """Похожие на импортированные фото, загруженные до импорта: запросы пачками по полосам хеша"""
+    photos = [photo for name, photo in imported]
+    imported_pks = {photo.pk for photo in photos}
+    for (name, photo), duplicates in zip(imported, Photo.find_duplicates_many(photos)):
+        duplicates = [duplicate for duplicate in duplicates if duplicate.pk not in imported_pks]
+        if duplicates:
+            result.duplicates.append((name, duplicates))
+
+
+def _finish(album, created, photo_names):
+    """То, что для одиночного фото делают сигналы (bulk_create их не вызывает)"""
+    storage.retain(photo_names)
+    Album.change_photo_count(album.pk, created)
+    Album.refresh_effective_cover(album.pk)
+    search.index_album(album)
+    fragments.bump(fragments.album_scope(album.pk), fragments.PORTFOLIO)
+    recommendations.mark_stale([album.pk])
+
+
+def enqueue(album, archive=None, directory=None):
+    """
+    Ставит импорт в очередь; выполнит его команда ``process_photo_imports``.
+
+    Загруженный архив сохраняется в ``PHOTO_IMPORT_ROOT/uploads`` — временный
+    файл загрузки удаляется вместе с концом запроса.
+    """
+    if archive is not None:
+        directory_path = os.path.join(settings.PHOTO_IMPORT_ROOT, UPLOADS_DIR)
+        os.makedirs(directory_path, exist_ok=True)
+        source = os.path.join(directory_path, f'{uuid.uuid4().hex}.zip')
+        with open(source, 'wb') as fh:
+            for chunk in archive.chunks():
+                fh.write(chunk)
+        return PhotoImport.objects.create(album=album, source=source, is_upload=True)
+    return PhotoImport.objects.create(album=album, source=directory)
+
+
+def claim():
+    """
+    Берет следующее задание и арендует его на LEASE.
+
+    Задания, воркер которых пропал (аренда истекла), помечаются ошибкой, а
+    не выполняются снова: часть фотографий могла уже попасть в альбом.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        PhotoImport.objects.filter(status='running', lease_until__lt=now).update(
+            status='failed', report="Импорт прерван: воркер не завершил задание", finished_at=now,
+        )
+        job = PhotoImport.objects.select_for_update(skip_locked=True).filter(
+            status='pending'
+        ).order_by('pk').first()
+        if job is not None:
+            job.status, job.lease_until = 'running', now + LEASE
+            job.save(update_fields=['status', 'lease_until'])
+    return job
+
+
+def run(job, workers=None):
+    """Выполняет задание и записывает отчет"""
+    report = []
+    try:
+        entries = iter_directory(job.source) if os.path.isdir(job.source) else iter_zip(job.source)
+        result = import_photos(job.album, entries, workers=workers)
+    except Exception as e:
+        # Задание не должно остаться «выполняющимся»; созданные фото уже учтены в import_photos
+        logger.exception("Импорт #%s не выполнен", job.pk)
+        job.status = 'failed'
+        report.append(f"Ошибка: {e}")
+    else:
+        job.status, job.created_count = 'done', result.created
+        report += [f"Пропущен {name}: {reason}" for name, reason in result.skipped]
+        report += [
+            f"{name} похоже на уже загруженные фото: "
+            + ', '.join(f"#{photo.pk} ({photo.album})" for photo in duplicates)
+            for name, duplicates in result.duplicates
+        ]
+    finally:
+        if job.is_upload and os.path.exists(job.source):
+            os.remove(job.source)
+    job.report = '\n'.join(report)
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'created_count', 'report', 'finished_at'])
+    return job
+
+
+def process(workers=None):
+    """Выполняет одно задание из очереди; None, если очередь пуста"""
+    job = claim()
+    return job and run(job, workers=workers)
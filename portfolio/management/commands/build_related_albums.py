@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from portfolio import recommendations
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает рекомендации похожих альбомов для измененных альбомов (запускать по cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Пересчитать рекомендации для всех альбомов")
+
+    def handle(self, *args, **options):
+        if options['full']:
+            refreshed = recommendations.refresh()
+        else:
+            refreshed = recommendations.refresh_stale()
+        self.stdout.write(self.style.SUCCESS(f"Пересчитаны рекомендации альбомов: {refreshed}"))
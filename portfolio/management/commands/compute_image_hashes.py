@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from portfolio.models import Photo
+
+
+class Command(BaseCommand):
+    help = "Считает перцептивные хеши для фотографий, у которых их еще нет"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Пересчитать хеши для всех фотографий")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        # Фото, чей файл уже не удалось прочитать, пропускаются (кроме --all)
+        queryset = Photo.objects.all() if options['all'] else Photo.objects.filter(image_hash=None, image_hash_failed=False)
+        fields = ['image_hash', 'hash_band_0', 'hash_band_1', 'hash_band_2', 'hash_band_3', 'image_hash_failed']
+        batch, processed, failed = [], 0, 0
+        for photo in queryset.only('pk', 'image').iterator(chunk_size=options['batch_size']):
+            photo.compute_image_hash()
+            failed += photo.image_hash_failed
+            batch.append(photo)
+            if len(batch) >= options['batch_size']:
+                Photo.objects.bulk_update(batch, fields)
+                processed += len(batch)
+                batch = []
+                self.stdout.write(f"Обработано: {processed}")
+        Photo.objects.bulk_update(batch, fields)
+        processed += len(batch)
+        self.stdout.write(self.style.SUCCESS(f"Хеши посчитаны: {processed - failed}, не удалось открыть: {failed}"))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from portfolio import recommendations
+from portfolio.models import Photo, PhotoColor
+
+
+class Command(BaseCommand):
+    help = "Извлекает доминирующие цвета для фотографий, у которых их еще нет"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Пересчитать палитры для всех фотографий")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        queryset = Photo.objects.all() if options['all'] else Photo.objects.filter(colors=None)
+        batch, processed, failed = [], 0, 0
+        for photo in queryset.only('pk', 'album_id', 'image').iterator(chunk_size=options['batch_size']):
+            swatches = photo.extract_palette()
+            if swatches is None:
+                failed += 1
+                continue
+            batch.append((photo, swatches))
+            if len(batch) >= options['batch_size']:
+                self.save_batch(batch)
+                processed += len(batch)
+                batch = []
+                self.stdout.write(f"Обработано: {processed}")
+        self.save_batch(batch)
+        processed += len(batch)
+        self.stdout.write(self.style.SUCCESS(f"Палитры извлечены: {processed}, не удалось открыть: {failed}"))
+
+    def save_batch(self, batch):
+        PhotoColor.objects.filter(photo__in=[photo for photo, _ in batch]).delete()
+        PhotoColor.objects.bulk_create([row for photo, swatches in batch for row in photo.palette_rows(swatches)])
+        # Цвета — признак для рекомендаций похожих альбомов
+        recommendations.mark_stale({photo.album_id for photo, _ in batch})
@@ -0,0 +1,45 @@
+import os
+import zipfile
+
+from django.core.management.base import BaseCommand, CommandError
+
+from portfolio.importer import import_photos, iter_directory, iter_zip
+from portfolio.models import Album
+
+
+class Command(BaseCommand):
+    help = "Импортирует фотографии в альбом из ZIP-архива или каталога"
+
+    def add_arguments(self, parser):
+        parser.add_argument('album', help="Slug альбома")
+        parser.add_argument('source', help="Путь к ZIP-архиву или каталогу с фотографиями")
+        parser.add_argument('--workers', type=int, default=None, help="Количество рабочих потоков")
+
+    def handle(self, *args, **options):
+        try:
+            album = Album.objects.get(slug=options['album'])
+        except Album.DoesNotExist:
+            raise CommandError(f"Альбом '{options['album']}' не найден")
+
+        source = options['source']
+        if os.path.isdir(source):
+            entries = iter_directory(source)
+        elif zipfile.is_zipfile(source):
+            entries = iter_zip(source)
+        else:
+            raise CommandError(f"'{source}' не является ни каталогом, ни ZIP-архивом")
+
+        def progress(processed, total):
+            self.stdout.write(f"\r{processed}/{total}", ending='')
+            self.stdout.flush()
+
+        result = import_photos(album, entries, workers=options['workers'], progress=progress)
+        self.stdout.write('')
+        for name, reason in result.skipped:
+            self.stderr.write(self.style.WARNING(f"Пропущен {name}: {reason}"))
+        for name, duplicates in result.duplicates:
+            similar = ', '.join(f"#{photo.pk} ({photo.album})" for photo in duplicates)
+            self.stderr.write(self.style.WARNING(f"{name} похоже на уже загруженные фото: {similar}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"Импортировано фотографий: {result.created}, пропущено: {len(result.skipped)}"
+        ))
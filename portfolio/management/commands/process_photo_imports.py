@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from portfolio import importer
+
+
+class Command(BaseCommand):
+    help = "Выполняет задания импорта фотографий, поставленные из админки"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help="Количество рабочих потоков")
+        parser.add_argument('--loop', action='store_true', help="Работать постоянно, опрашивая очередь (иначе — до опустошения очереди)")
+        parser.add_argument('--interval', type=float, default=5.0, help="Пауза между опросами пустой очереди, с")
+
+    def handle(self, *args, **options):
+        while True:
+            job = importer.process(workers=options['workers'])
+            if job is None:
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+                continue
+            self.stdout.write(f"Импорт #{job.pk} в «{job.album}»: {job.get_status_display()}, фотографий: {job.created_count}")
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from portfolio import fragments, ordering
+from portfolio.models import Album, Photo, ShootingType
+
+
+class Command(BaseCommand):
+    help = "Перенумеровывает ключи порядка с шагом GAP там, где промежутки между ними закончились"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-gap', type=int, default=8, help="Перенумеровать, если соседние ключи ближе")
+        parser.add_argument('--force', action='store_true', help="Перенумеровать все области")
+
+    def handle(self, *args, **options):
+        scopes = [("Типы съемок", ShootingType.objects.all()), ("Альбомы", Album.objects.all())]
+        scopes += [
+            (f"Фото альбома #{album_id}", Photo.objects.filter(album_id=album_id))
+            for album_id in Album.objects.values_list('pk', flat=True)
+        ]
+        total = 0
+        for label, queryset in scopes:
+            if options['force'] or ordering.needs_rebalance(queryset, options['min_gap']):
+                changed = ordering.rebalance(queryset)
+                total += changed
+                self.stdout.write(f"{label}: изменено строк {changed}")
+        if total:
+            fragments.bump(fragments.PORTFOLIO)
+        self.stdout.write(self.style.SUCCESS(f"Готово, изменено строк: {total}"))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from portfolio import search
+
+
+class Command(BaseCommand):
+    help = "Перестраивает полнотекстовый индекс альбомов, фотографий и видео"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Размер пачки для вставки в индекс")
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            self.stderr.write(self.style.WARNING("FTS5-индекс поддерживается только для SQLite, пропускаем"))
+            return
+        total = search.rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Проиндексировано документов: {total}"))
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:04
+
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, NullIf
+
+
+def fill_album_stats(apps, schema_editor):
+    Album = apps.get_model('portfolio', 'Album')
+    Photo = apps.get_model('portfolio', 'Photo')
+    counts = Photo.objects.filter(album=OuterRef('pk')).order_by().values('album').annotate(
+        total=Count('pk')
+    ).values('total')
+    fallback = Photo.objects.filter(album=OuterRef('pk')).order_by(
+        '-is_cover_candidate', 'order', 'created_at'
+    ).values('image')[:1]
+    Album.objects.update(
+        photo_count=Coalesce(Subquery(counts), 0),
+        effective_cover=Coalesce(NullIf(F('cover'), Value('')), Subquery(fallback), Value('')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0002_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='album',
+            name='effective_cover',
+            field=models.ImageField(blank=True, editable=False, help_text='Обложка альбома, а если она не задана — кандидат на обложку или первое фото', upload_to='', verbose_name='Итоговая обложка'),
+        ),
+        migrations.AddField(
+            model_name='album',
+            name='photo_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество фотографий'),
+        ),
+        migrations.RunPython(fill_album_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0003_album_photo_count_effective_cover'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='hash_band_0',
+            field=models.PositiveIntegerField(db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='hash_band_1',
+            field=models.PositiveIntegerField(db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='hash_band_2',
+            field=models.PositiveIntegerField(db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='hash_band_3',
+            field=models.PositiveIntegerField(db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='image_hash',
+            field=models.BigIntegerField(blank=True, editable=False, null=True, verbose_name='Перцептивный хеш'),
+        ),
+    ]
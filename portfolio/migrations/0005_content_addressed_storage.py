@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:12
+
+import core.storage
+import portfolio.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0004_photo_image_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='album',
+            name='cover',
+            field=models.ImageField(blank=True, null=True, storage=core.storage.select_content_storage, upload_to='portfolio/covers/%Y/%m/%d/', validators=[portfolio.models.validate_image_extension], verbose_name='Обложка'),
+        ),
+        migrations.AlterField(
+            model_name='photo',
+            name='image',
+            field=models.ImageField(storage=core.storage.select_content_storage, upload_to='portfolio/photos/%Y/%m/%d/', validators=[portfolio.models.validate_image_extension], verbose_name='Изображение'),
+        ),
+        migrations.AlterField(
+            model_name='video',
+            name='thumbnail',
+            field=models.ImageField(blank=True, null=True, storage=core.storage.select_content_storage, upload_to='portfolio/video_thumbs/%Y/%m/%d/', validators=[portfolio.models.validate_image_extension], verbose_name='Превью'),
+        ),
+    ]
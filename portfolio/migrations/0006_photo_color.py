@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0005_content_addressed_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PhotoColor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('color', models.CharField(choices=[('red', 'Красный'), ('orange', 'Оранжевый'), ('yellow', 'Желтый'), ('green', 'Зеленый'), ('teal', 'Бирюзовый'), ('blue', 'Синий'), ('purple', 'Фиолетовый'), ('pink', 'Розовый'), ('brown', 'Коричневый'), ('black', 'Черный'), ('gray', 'Серый'), ('white', 'Белый')], max_length=10, verbose_name='Цвет')),
+                ('weight', models.FloatField(verbose_name='Доля кадра')),
+                ('hex_value', models.CharField(max_length=7, verbose_name='Оттенок')),
+                ('photo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='colors', to='portfolio.photo', verbose_name='Фотография')),
+            ],
+            options={
+                'verbose_name': 'Цвет фотографии',
+                'verbose_name_plural': 'Цвета фотографий',
+                'ordering': ['-weight'],
+                'indexes': [models.Index(fields=['color', 'weight'], name='photo_color_weight_idx')],
+                'constraints': [models.UniqueConstraint(fields=('photo', 'color'), name='unique_photo_color')],
+            },
+        ),
+    ]
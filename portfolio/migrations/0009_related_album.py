@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0008_photo_album_sequence_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='album',
+            name='related_stale',
+            field=models.BooleanField(db_index=True, default=True, editable=False),
+        ),
+        migrations.CreateModel(
+            name='RelatedAlbum',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Сходство')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Место')),
+                ('album', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_albums', to='portfolio.album', verbose_name='Альбом')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='portfolio.album', verbose_name='Похожий альбом')),
+            ],
+            options={
+                'verbose_name': 'Похожий альбом',
+                'verbose_name_plural': 'Похожие альбомы',
+                'ordering': ['album', 'rank'],
+                'indexes': [models.Index(fields=['album', 'rank'], name='related_album_rank_idx')],
+                'constraints': [models.UniqueConstraint(fields=('album', 'related'), name='unique_related_album')],
+            },
+        ),
+    ]
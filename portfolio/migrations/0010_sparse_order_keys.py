@@ -0,0 +1,31 @@
+from django.db import migrations
+
+GAP = 1024
+
+
+def spread(queryset, ordering):
+    objects = list(queryset.order_by(*ordering, 'pk'))
+    for position, obj in enumerate(objects, start=1):
+        obj.order = position * GAP
+    queryset.model.objects.bulk_update(objects, ['order'], batch_size=500)
+
+
+def forwards(apps, schema_editor):
+    ShootingType = apps.get_model('portfolio', 'ShootingType')
+    Album = apps.get_model('portfolio', 'Album')
+    Photo = apps.get_model('portfolio', 'Photo')
+    spread(ShootingType.objects.all(), ['order', 'name'])
+    spread(Album.objects.all(), ['order', '-created_at'])
+    for album_id in Album.objects.values_list('pk', flat=True):
+        spread(Photo.objects.filter(album_id=album_id), ['order', 'created_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0009_related_album'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0010_sparse_order_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PhotoImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=500, verbose_name='Архив или каталог')),
+                ('is_upload', models.BooleanField(default=False, verbose_name='Загруженный архив')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('done', 'Завершен'), ('failed', 'Ошибка')], default='pending', max_length=10, verbose_name='Статус')),
+                ('created_count', models.PositiveIntegerField(default=0, verbose_name='Импортировано')),
+                ('report', models.TextField(blank=True, verbose_name='Отчет')),
+                ('lease_until', models.DateTimeField(blank=True, null=True, verbose_name='Аренда до')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата завершения')),
+                ('album', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='imports', to='portfolio.album', verbose_name='Альбом')),
+            ],
+            options={
+                'verbose_name': 'Импорт фотографий',
+                'verbose_name_plural': 'Импорт фотографий',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
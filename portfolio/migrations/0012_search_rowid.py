@@ -0,0 +1,31 @@
+from django.db import migrations
+
+
+def key_search_rows(apps, schema_editor):
+    """Переносит индекс в таблицу с rowid = object_id * 3 + номер типа (см. portfolio.search._rowid)"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE portfolio_search_keyed USING fts5("
+        "kind UNINDEXED, object_id UNINDEXED, title, description, "
+        "tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        "INSERT INTO portfolio_search_keyed (rowid, kind, object_id, title, description) "
+        "SELECT object_id * 3 + CASE kind WHEN 'album' THEN 0 WHEN 'photo' THEN 1 ELSE 2 END, "
+        "kind, object_id, title, description FROM portfolio_search "
+        "WHERE rowid IN (SELECT MAX(rowid) FROM portfolio_search GROUP BY kind, object_id)"
+    )
+    schema_editor.execute("DROP TABLE portfolio_search")
+    schema_editor.execute("ALTER TABLE portfolio_search_keyed RENAME TO portfolio_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0011_photo_import'),
+    ]
+
+    operations = [
+        migrations.RunPython(key_search_rows, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+def backfill_search_index(apps, schema_editor):
+    """Заполняет индекс уже существующими данными: сигналы индексируют только новые изменения"""
+    from portfolio import search
+    search.rebuild_index(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0012_search_rowid'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0013_search_backfill'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='image_hash_failed',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
@@ -1,9 +1,13 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import DEFERRED, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest, NullIf
 from django.utils.translation import gettext_lazy as _
 from django.urls import reverse
 from django.core.exceptions import ValidationError
 import os
 from urllib.parse import urlparse, parse_qs
+from core.storage import select_content_storage
+from . import fragments, imagehash, ordering, palette
 
 def validate_image_extension(value):
     ext = os.path.splitext(value.name)[1]
@@ -24,6 +28,7 @@ class ShootingType(models.Model):
     description = models.TextField(_("Описание"), blank=True)
     is_active = models.BooleanField(_("Активно"), default=True)
     order = models.PositiveIntegerField(_("Порядок"), default=0)
+    updated_at = models.DateTimeField(_("Дата обновления"), auto_now=True)
     
     class Meta:
         verbose_name = _("Тип съемки")
@@ -33,6 +38,11 @@ class ShootingType(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        if self._state.adding and not self.order:
+            self.order = ordering.next_key(ShootingType.objects.all())
+        super().save(*args, **kwargs)
+
 class Album(models.Model):
     """Альбом фотографий"""
     title = models.CharField(_("Название"), max_length=200)
@@ -41,6 +51,7 @@ class Album(models.Model):
     cover = models.ImageField(
         _("Обложка"), 
         upload_to='portfolio/covers/%Y/%m/%d/',
+        storage=select_content_storage,
         validators=[validate_image_extension],
         blank=True,
         null=True
@@ -55,6 +66,16 @@ class Album(models.Model):
     is_published = models.BooleanField(_("Опубликовано"), default=True)
     is_featured = models.BooleanField(_("Рекомендуемое"), default=False)
     order = models.PositiveIntegerField(_("Порядок"), default=0)
+    # Денормализованные поля, поддерживаются сигналами фотографий
+    photo_count = models.PositiveIntegerField(_("Количество фотографий"), default=0, editable=False)
+    effective_cover = models.ImageField(
+        _("Итоговая обложка"),
+        blank=True,
+        editable=False,
+        help_text=_("Обложка альбома, а если она не задана — кандидат на обложку или первое фото")
+    )
+    # Рекомендации нужно пересчитать (см. portfolio.recommendations)
+    related_stale = models.BooleanField(default=True, editable=False, db_index=True)
 
     class Meta:
         verbose_name = _("Альбом")
@@ -67,6 +88,39 @@ class Album(models.Model):
     def get_absolute_url(self):
         return reverse('portfolio:album_detail', kwargs={'slug': self.slug})
     
+    def save(self, *args, **kwargs):
+        # Новая загрузка получает имя блоба только при сохранении, поэтому
+        # итоговую обложку для нее выставляем уже после super().save()
+        new_cover = bool(self.cover) and not self.cover._committed
+        if not new_cover:
+            self.effective_cover = self.cover.name if self.cover else self.pick_cover()
+        super().save(*args, **kwargs)
+        if new_cover:
+            self.effective_cover = self.cover.name
+            Album.objects.filter(pk=self.pk).update(effective_cover=self.cover.name)
+
+    def pick_cover(self):
+        """Обложка по умолчанию: первый кандидат на обложку, иначе первое фото альбома"""
+        if not self.pk:
+            return ''
+        return self.photos.order_by('-is_cover_candidate', 'order', 'created_at').values_list(
+            'image', flat=True
+        ).first() or ''
+
+    @classmethod
+    def refresh_effective_cover(cls, album_id):
+        """Пересчитывает итоговую обложку одним UPDATE без загрузки альбома"""
+        fallback = Photo.objects.filter(album=OuterRef('pk')).order_by(
+            '-is_cover_candidate', 'order', 'created_at'
+        ).values('image')[:1]
+        cls.objects.filter(pk=album_id).update(
+            effective_cover=Coalesce(NullIf(F('cover'), Value('')), Subquery(fallback), Value(''))
+        )
+
+    @classmethod
+    def change_photo_count(cls, album_id, delta):
+        cls.objects.filter(pk=album_id).update(photo_count=Greatest(F('photo_count') + delta, 0))
+
     def get_shooting_types_display(self):
         # type: ignore 
         types = self.shooting_types.all()
@@ -83,24 +137,217 @@ class Photo(models.Model):
     image = models.ImageField(
         _("Изображение"),
         upload_to='portfolio/photos/%Y/%m/%d/',
+        storage=select_content_storage,
         validators=[validate_image_extension]
     )
     title = models.CharField(_("Название"), max_length=200, blank=True)
     description = models.TextField(_("Описание"), blank=True)
     order = models.PositiveIntegerField(_("Порядок"), default=0)
     created_at = models.DateTimeField(_("Дата создания"), auto_now_add=True)
+    updated_at = models.DateTimeField(_("Дата обновления"), auto_now=True)
     is_cover_candidate = models.BooleanField(_("Кандидат на обложку"), default=False)
+    # Перцептивный хеш (dHash) и его 16-битные полосы для поиска дубликатов
+    image_hash = models.BigIntegerField(_("Перцептивный хеш"), null=True, blank=True, editable=False)
+    hash_band_0 = models.PositiveIntegerField(null=True, editable=False, db_index=True)
+    hash_band_1 = models.PositiveIntegerField(null=True, editable=False, db_index=True)
+    hash_band_2 = models.PositiveIntegerField(null=True, editable=False, db_index=True)
+    hash_band_3 = models.PositiveIntegerField(null=True, editable=False, db_index=True)
+    # Файл не удалось прочитать: хеш не пересчитывается, пока файл не сменится
+    image_hash_failed = models.BooleanField(default=False, editable=False)
 
     class Meta:
         verbose_name = _("Фотография")
         verbose_name_plural = _("Фотографии")
         ordering = ['order', 'created_at']
+        indexes = [
+            # Навигация по альбому: seek-запросы по (order, id)
+            models.Index(fields=['album', 'order', 'id'], name='photo_album_sequence_idx'),
+        ]
 
     def __str__(self):
         if self.title:
             return self.title
         return f"Фото {self.pk}"
 
+    def save(self, *args, **kwargs):
+        if self._state.adding and not self.order:
+            # Ключи разреженные (см. portfolio.ordering): новое фото — в конец альбома, а не перед всеми
+            self.order = ordering.next_key(Photo.objects.filter(album_id=self.album_id))
+        new_image = bool(self.image) and not self.image._committed
+        if self.image and (new_image or self.image.name != self._stored_hash_image_name()):
+            self.compute_image_hash()
+        swatches = self.extract_palette() if new_image else None
+        super().save(*args, **kwargs)
+        # Загрузка получила имя блоба только сейчас; хеш посчитан для этого файла
+        self._hashed_image_name = self.image.name
+        if swatches is not None:
+            self.set_palette(swatches)
+            # post_save уже увеличил поколения, но палитра записана позже: страница или ETag,
+            # закэшированные в промежутке, остались бы без цветов до следующей правки
+            album_id = self.album_id
+            transaction.on_commit(lambda: fragments.bump(fragments.album_scope(album_id), fragments.PORTFOLIO))
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Хеш в базе относится к сохраненному файлу (или файл не читался — image_hash_failed)
+        instance._hashed_image_name = instance.__dict__.get('image', DEFERRED)
+        return instance
+
+    def _stored_hash_image_name(self):
+        """Имя файла, для которого посчитан текущий хеш; None — хеша еще не считали"""
+        name = getattr(self, '_hashed_image_name', None)
+        if name is DEFERRED:
+            name = Photo.objects.filter(pk=self.pk).values_list('image', flat=True).first()
+        return name
+
+    def set_image_hash(self, value):
+        self.image_hash = None if value is None else imagehash.to_signed(value)
+        band_values = imagehash.bands(value) if value is not None else [None] * imagehash.BANDS
+        for index, band in enumerate(band_values):
+            setattr(self, f'hash_band_{index}', band)
+        self.image_hash_failed = False
+        self._hashed_image_name = self.image.name
+
+    def _analyze_image(self, analyze):
+        """Применяет analyze к файлу изображения (в том числе еще не сохраненному в хранилище); None, если файл не читается"""
+        committed = self.image._committed
+        try:
+            self.image.open('rb')
+            self.image.seek(0)
+            result = analyze(self.image)
+            self.image.seek(0)
+            return result
+        except (OSError, ValueError):
+            return None
+        finally:
+            if committed:
+                self.image.close()
+
+    def compute_image_hash(self):
+        """Считает dHash по файлу изображения; если файл не читается, ставит image_hash_failed"""
+        value = self._analyze_image(imagehash.dhash)
+        self.set_image_hash(value)
+        self.image_hash_failed = value is None
+
+    def extract_palette(self):
+        """Палитра изображения: список (rgb, доля кадра) или None, если файл не читается"""
+        return self._analyze_image(palette.extract)
+
+    def palette_rows(self, swatches):
+        """Несохраненные строки PhotoColor для палитры"""
+        return [
+            PhotoColor(photo=self, color=color, weight=weight, hex_value=hex_value)
+            for color, (weight, hex_value) in palette.color_weights(swatches).items()
+        ]
+
+    def set_palette(self, swatches):
+        PhotoColor.objects.filter(photo=self).delete()
+        PhotoColor.objects.bulk_create(self.palette_rows(swatches))
+
+    def get_neighbors(self):
+        """
+        Предыдущая и следующая фотографии альбома в порядке (order, id).
+
+        Два seek-запроса по индексу (album, order, id) с LIMIT 1 — альбом целиком не загружается.
+        """
+        siblings = Photo.objects.filter(album_id=self.album_id).only('id', 'album_id', 'image', 'title')
+        previous = siblings.filter(
+            Q(order__lt=self.order) | Q(order=self.order, pk__lt=self.pk)
+        ).order_by('-order', '-pk').first()
+        following = siblings.filter(
+            Q(order__gt=self.order) | Q(order=self.order, pk__gt=self.pk)
+        ).order_by('order', 'pk').first()
+        return previous, following
+
+    def find_duplicates(self, radius=imagehash.DUPLICATE_RADIUS):
+        """Похожие фотографии во всей библиотеке (по расстоянию Хэмминга между хешами)"""
+        return Photo.find_duplicates_many([self], radius)[0]
+
+    @classmethod
+    def find_duplicates_many(cls, photos, radius=imagehash.DUPLICATE_RADIUS, chunk_size=50):
+        """
+        find_duplicates для многих фотографий: по одному запросу на chunk_size фото.
+
+        Возвращает списки похожих фото в порядке photos.
+        """
+        found = [[] for _ in photos]
+        hashed = [(index, photo) for index, photo in enumerate(photos) if photo.image_hash is not None]
+        for start in range(0, len(hashed), chunk_size):
+            chunk = hashed[start:start + chunk_size]
+            query = imagehash.candidates_query_many([photo.image_hash for _, photo in chunk], radius)
+            candidates = list(cls.objects.filter(query).select_related('album'))
+            for index, photo in chunk:
+                value = imagehash.to_unsigned(photo.image_hash)
+                found[index] = [
+                    candidate for candidate in candidates
+                    if candidate.pk != photo.pk
+                    and imagehash.hamming(imagehash.to_unsigned(candidate.image_hash), value) <= radius
+                ]
+        return found
+
+class PhotoColor(models.Model):
+    """Доля кадра, занятая цветовой группой (индекс для поиска по цвету)"""
+    photo = models.ForeignKey(
+        Photo,
+        on_delete=models.CASCADE,
+        related_name='colors',
+        verbose_name=_("Фотография")
+    )
+    color = models.CharField(_("Цвет"), max_length=10, choices=palette.COLOR_CHOICES)
+    weight = models.FloatField(_("Доля кадра"))
+    hex_value = models.CharField(_("Оттенок"), max_length=7)
+
+    class Meta:
+        verbose_name = _("Цвет фотографии")
+        verbose_name_plural = _("Цвета фотографий")
+        ordering = ['-weight']
+        constraints = [
+            models.UniqueConstraint(fields=['photo', 'color'], name='unique_photo_color'),
+        ]
+        indexes = [
+            models.Index(fields=['color', 'weight'], name='photo_color_weight_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_color_display()} {self.weight:.0%}"
+
+    @classmethod
+    def matching(cls, value, min_weight=palette.MIN_WEIGHT):
+        """Строки для значения фильтра по цвету: группа или цвет, занимающие не меньше min_weight кадра"""
+        return cls.objects.filter(color__in=palette.resolve(value), weight__gte=min_weight)
+
+class RelatedAlbum(models.Model):
+    """Предрассчитанная рекомендация: похожий альбом и его место в списке"""
+    album = models.ForeignKey(
+        Album,
+        on_delete=models.CASCADE,
+        related_name='related_albums',
+        verbose_name=_("Альбом")
+    )
+    related = models.ForeignKey(
+        Album,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name=_("Похожий альбом")
+    )
+    score = models.FloatField(_("Сходство"))
+    rank = models.PositiveSmallIntegerField(_("Место"))
+
+    class Meta:
+        verbose_name = _("Похожий альбом")
+        verbose_name_plural = _("Похожие альбомы")
+        ordering = ['album', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['album', 'related'], name='unique_related_album'),
+        ]
+        indexes = [
+            models.Index(fields=['album', 'rank'], name='related_album_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.album} → {self.related}"
+
 class Video(models.Model):
     """Видео в портфолио"""
     title = models.CharField(_("Название"), max_length=200)
@@ -115,6 +362,7 @@ class Video(models.Model):
     thumbnail = models.ImageField(
         _("Превью"),
         upload_to='portfolio/video_thumbs/%Y/%m/%d/',
+        storage=select_content_storage,
         validators=[validate_image_extension],
         blank=True,
         null=True
@@ -127,6 +375,7 @@ class Video(models.Model):
     )
     is_published = models.BooleanField(_("Опубликовано"), default=True)
     created_at = models.DateTimeField(_("Дата создания"), auto_now_add=True)
+    updated_at = models.DateTimeField(_("Дата обновления"), auto_now=True)
 
     class Meta:
         verbose_name = _("Видео")
@@ -158,4 +407,33 @@ class Video(models.Model):
         except (ValueError, AttributeError, IndexError):
             pass
         
-        return None
\ No newline at end of file
+        return None
+
+class PhotoImport(models.Model):
+    """Задание массового импорта фотографий (выполняет команда process_photo_imports)"""
+    STATUS_CHOICES = [
+        ('pending', _("В очереди")),
+        ('running', _("Выполняется")),
+        ('done', _("Завершен")),
+        ('failed', _("Ошибка")),
+    ]
+
+    album = models.ForeignKey(Album, on_delete=models.CASCADE, related_name='imports', verbose_name=_("Альбом"))
+    source = models.CharField(_("Архив или каталог"), max_length=500)
+    # Архив загружен через админку и удаляется после импорта
+    is_upload = models.BooleanField(_("Загруженный архив"), default=False)
+    status = models.CharField(_("Статус"), max_length=10, choices=STATUS_CHOICES, default='pending')
+    created_count = models.PositiveIntegerField(_("Импортировано"), default=0)
+    report = models.TextField(_("Отчет"), blank=True)
+    # Для running — до какого момента воркер считается живым
+    lease_until = models.DateTimeField(_("Аренда до"), null=True, blank=True)
+    created_at = models.DateTimeField(_("Дата создания"), auto_now_add=True)
+    finished_at = models.DateTimeField(_("Дата завершения"), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("Импорт фотографий")
+        verbose_name_plural = _("Импорт фотографий")
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.album} ← {os.path.basename(self.source)}"
@@ -0,0 +1,153 @@
+"""
+Разреженные ключи порядка (поле ``order``) и перестановка перетаскиванием.
+
+Ключи идут с шагом ``GAP``, поэтому переставленному элементу достаточно
+выбрать ключ между соседями — остальные строки не меняются. При
+перестановке находится наибольшая возрастающая подпоследовательность
+текущих ключей: эти элементы остаются на месте, а новые ключи получают
+только остальные, и все они записываются одним ``bulk_update``.
+
+Если между соседями не осталось свободных ключей, область перенумеровывается
+(``rebalance``); то же периодически делает команда ``rebalance_order``.
+Новый объект без явного ключа получает ``next_key`` — встает в конец области.
+"""
+from bisect import bisect_left
+
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+GAP = 1024
+
+
+class OrderingError(ValueError):
+    pass
+
+
+def next_key(queryset):
+    """Ключ для нового объекта в конце области"""
+    last = queryset.aggregate(value=Max('order'))['value']
+    return GAP if last is None else last + GAP
+
+
+def _longest_increasing(keys):
+    """Индексы наибольшей строго возрастающей подпоследовательности keys"""
+    tails, tail_indices, previous = [], [], [None] * len(keys)
+    for index, key in enumerate(keys):
+        position = bisect_left(tails, key)
+        if position == len(tails):
+            tails.append(key)
+            tail_indices.append(index)
+        else:
+            tails[position] = key
+            tail_indices[position] = index
+        previous[index] = tail_indices[position - 1] if position else None
+
+    result = set()
+    index = tail_indices[-1] if tail_indices else None
+    while index is not None:
+        result.add(index)
+        index = previous[index]
+    return result
+
+
+def _spread(low, high, count):
+    """count ключей строго между low и high (high=None — без верхней границы) или None, если не помещаются"""
+    if high is None:
+        return [low + GAP * step for step in range(1, count + 1)]
+    if high - low - 1 < count:
+        return None
+    return [low + (high - low) * step // (count + 1) for step in range(1, count + 1)]
+
+
+def plan(items, low, high):
+    """
+    Новые ключи для последовательности объектов в желаемом порядке.
+
+    ``low``/``high`` — ключи ближайших соседей вне последовательности
+    (``high=None``, если последовательность в конце). Возвращает список
+    объектов с измененным ``order`` или None, если ключей не хватает.
+    """
+    keep = _longest_increasing([item.order for item in items])
+    keep = {index for index in keep if low < items[index].order and (high is None or items[index].order < high)}
+    moved = []
+    run = []
+    left = low
+    for index, item in enumerate(items + [None]):
+        if item is not None and index not in keep:
+            run.append(item)
+            continue
+        right = high if item is None else item.order
+        if run:
+            keys = _spread(left, right, len(run))
+            if keys is None:
+                return None
+            for run_item, key in zip(run, keys):
+                run_item.order = key
+            moved.extend(run)
+            run = []
+        if item is not None:
+            left = item.order
+    return moved
+
+
+def rebalance(queryset):
+    """Перенумеровывает область с шагом GAP в текущем порядке; возвращает число измененных строк"""
+    model = queryset.model
+    objects = list(queryset.order_by(*model._meta.ordering, 'pk').only('pk', 'order'))
+    changed = []
+    for position, obj in enumerate(objects, start=1):
+        if obj.order != position * GAP:
+            obj.order = position * GAP
+            changed.append(obj)
+    model.objects.bulk_update(changed, ['order'], batch_size=500)
+    return len(changed)
+
+
+def needs_rebalance(queryset, min_gap=2):
+    """Есть ли в области соседние ключи ближе min_gap (в том числе одинаковые)"""
+    keys = list(queryset.order_by('order').values_list('order', flat=True))
+    return any(following - current < min_gap for current, following in zip(keys, keys[1:]))
+
+
+def _save_moved(model, moved):
+    # Перестановка меняет страницу — updated_at (lastmod карты сайта, API) тоже.
+    # rebalance его не трогает: видимый порядок при перенумерации не меняется
+    fields = ['order']
+    if any(field.name == 'updated_at' for field in model._meta.concrete_fields):
+        now = timezone.now()
+        for obj in moved:
+            obj.updated_at = now
+        fields.append('updated_at')
+    model.objects.bulk_update(moved, fields)
+
+
+@transaction.atomic
+def reorder(queryset, ids):
+    """
+    Ставит объекты области ``queryset`` в порядке ``ids``.
+
+    ``ids`` — непрерывный участок списка (например, страница списка в админке)
+    в новом порядке; соседние элементы за его пределами не трогаются.
+    Возвращает число измененных строк.
+    """
+    ids = [int(pk) for pk in ids]
+    objects = queryset.select_for_update().only('pk', 'order').in_bulk(ids)
+    if len(objects) != len(set(ids)) or len(ids) != len(set(ids)):
+        raise OrderingError("Объекты не найдены или повторяются")
+
+    for _ in range(2):
+        items = [objects[pk] for pk in ids]
+        keys = [item.order for item in items]
+        outside = queryset.exclude(pk__in=ids)
+        # Равные ключи снаружи тоже считаются границей: новые ключи не должны с ними совпасть
+        low = outside.filter(order__lte=min(keys)).aggregate(value=Max('order'))['value']
+        high = outside.filter(order__gte=max(keys)).aggregate(value=Min('order'))['value']
+        moved = plan(items, -1 if low is None else low, high)
+        if moved is not None:
+            _save_moved(queryset.model, moved)
+            return len(moved)
+        # Свободных ключей нет — перенумеровываем область и пробуем снова
+        rebalance(queryset)
+        objects = queryset.only('pk', 'order').in_bulk(ids)
+    raise OrderingError("Не удалось подобрать ключи порядка")
@@ -0,0 +1,121 @@
+"""
+Доминирующие цвета фотографий и поиск по цвету.
+
+Палитра извлекается медианным сечением (Pillow ``quantize`` с MEDIANCUT)
+по уменьшенной копии изображения — для JPEG ``draft()`` декодирует файл
+сразу в малом масштабе, поэтому извлечение занимает миллисекунды.
+
+Каждый цвет палитры относится к одной из фиксированных цветовых групп
+(«красный», «бирюзовый», «серый» ...). В базе хранится доля кадра,
+приходящаяся на каждую группу (модель ``PhotoColor`` с индексом по
+``(color, weight)``), так что запрос «теплые кадры» — это индексная выборка,
+а не анализ изображений.
+"""
+import colorsys
+
+from PIL import Image
+
+PALETTE_SIZE = 6
+SAMPLE_SIZE = 100
+MIN_WEIGHT = 0.15
+
+COLORS = [
+    ('red', 'Красный', '#d62828'),
+    ('orange', 'Оранжевый', '#f77f00'),
+    ('yellow', 'Желтый', '#fcbf49'),
+    ('green', 'Зеленый', '#2a9d3f'),
+    ('teal', 'Бирюзовый', '#2a9d8f'),
+    ('blue', 'Синий', '#1d5fbf'),
+    ('purple', 'Фиолетовый', '#7b2cbf'),
+    ('pink', 'Розовый', '#e56b9f'),
+    ('brown', 'Коричневый', '#7f5539'),
+    ('black', 'Черный', '#111111'),
+    ('gray', 'Серый', '#8d8d8d'),
+    ('white', 'Белый', '#f5f5f5'),
+]
+COLOR_CHOICES = [(key, label) for key, label, _ in COLORS]
+SWATCHES = {key: swatch for key, _, swatch in COLORS}
+
+# Группы цветов для фильтра: значение фильтра -> набор цветов
+GROUPS = {
+    'warm': ('Теплые тона', ('red', 'orange', 'yellow', 'pink', 'brown')),
+    'cool': ('Холодные тона', ('green', 'teal', 'blue', 'purple')),
+    'mono': ('Монохром', ('black', 'gray', 'white')),
+}
+FILTER_CHOICES = [(key, label) for key, (label, _) in GROUPS.items()] + COLOR_CHOICES
+
+# Границы оттенков (в градусах) для хроматических цветов
+HUE_RANGES = [
+    (15, 'red'),
+    (45, 'orange'),
+    (70, 'yellow'),
+    (160, 'green'),
+    (200, 'teal'),
+    (255, 'blue'),
+    (290, 'purple'),
+    (345, 'pink'),
+    (360, 'red'),
+]
+
+
+def extract(fp, size=PALETTE_SIZE):
+    """
+    Извлекает палитру изображения из файла или файлового объекта.
+
+    Возвращает список ``(rgb, доля кадра)`` по убыванию доли, где rgb — кортеж из трех байт.
+    """
+    with Image.open(fp) as image:
+        image.draft('RGB', (SAMPLE_SIZE * 2, SAMPLE_SIZE * 2))
+        sample = image.convert('RGB')
+        sample.thumbnail((SAMPLE_SIZE, SAMPLE_SIZE))
+
+    quantized = sample.quantize(colors=size, method=Image.Quantize.MEDIANCUT)
+    palette = quantized.getpalette()
+    total = quantized.width * quantized.height
+    swatches = [
+        (tuple(palette[index * 3:index * 3 + 3]), count / total)
+        for count, index in quantized.getcolors(size)
+    ]
+    return sorted(swatches, key=lambda swatch: swatch[1], reverse=True)
+
+
+def classify(rgb):
+    """Относит цвет к одной из групп COLORS"""
+    hue, lightness, saturation = colorsys.rgb_to_hls(*(channel / 255 for channel in rgb))
+    if lightness < 0.12:
+        return 'black'
+    if lightness > 0.92:
+        return 'white'
+    if saturation < 0.15 or (saturation < 0.3 and (lightness < 0.25 or lightness > 0.85)):
+        return 'gray'
+    degrees = hue * 360
+    for bound, color in HUE_RANGES:
+        if degrees < bound:
+            break
+    if color in ('orange', 'red') and lightness < 0.35:
+        return 'brown'
+    return color
+
+
+def color_weights(swatches):
+    """
+    Сворачивает палитру в доли цветовых групп.
+
+    Возвращает словарь ``цвет -> (доля кадра, hex самого крупного оттенка этой группы)``.
+    """
+    weights = {}
+    for rgb, weight in swatches:
+        color = classify(rgb)
+        if color in weights:
+            total, hex_value = weights[color]
+            weights[color] = (total + weight, hex_value)
+        else:
+            weights[color] = (weight, '#%02x%02x%02x' % rgb)
+    return weights
+
+
+def resolve(value):
+    """Значение фильтра (группа или отдельный цвет) -> список цветов"""
+    if value in GROUPS:
+        return list(GROUPS[value][1])
+    return [value] if value in SWATCHES else []
@@ -0,0 +1,159 @@
+"""
+Предрассчитанные рекомендации «похожие альбомы».
+
+Сходство двух альбомов — взвешенная сумма коэффициентов Жаккара по типам
+съемки и по заметным цветам фотографий (см. portfolio.palette). Матрица
+сходства разреженная: через инвертированный индекс «признак -> альбомы»
+сравниваются только альбомы с общими признаками. Для каждого альбома в
+таблицу ``RelatedAlbum`` записываются ``TOP_K`` лучших соседей, и страница
+альбома читает их одним запросом по индексу.
+
+Изменения альбомов помечают их флагом ``related_stale`` (сигналы в
+portfolio.signals), а команда ``build_related_albums`` пересчитывает только
+помеченные альбомы и тех, чьи списки они могли затронуть, читая признаки
+лишь этих альбомов и их соседей.
+"""
+import heapq
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Sum
+
+from . import fragments
+from .models import Album, PhotoColor, RelatedAlbum
+
+TOP_K = 6
+TYPE_WEIGHT = 0.8
+COLOR_WEIGHT = 0.2
+# Цвет считается признаком альбома, если занимает в среднем не меньше этой доли кадра
+COLOR_MIN_SHARE = 0.2
+
+
+def mark_stale(album_ids):
+    Album.objects.filter(pk__in=album_ids).update(related_stale=True)
+
+
+def album_features(album_ids=None):
+    """
+    Признаки опубликованных альбомов: ``{id альбома: {('type', id), ('color', имя), ...}}``.
+
+    С ``album_ids`` — только для этих альбомов.
+    """
+    albums = Album.objects.filter(is_published=True)
+    types = Album.shooting_types.through.objects.filter(album__is_published=True, shootingtype__is_active=True)
+    colors = PhotoColor.objects.filter(photo__album__is_published=True)
+    if album_ids is not None:
+        albums = albums.filter(pk__in=album_ids)
+        types = types.filter(album_id__in=album_ids)
+        colors = colors.filter(photo__album_id__in=album_ids)
+
+    features = {pk: set() for pk in albums.values_list('pk', flat=True)}
+    for album_id, type_id in types.values_list('album_id', 'shootingtype_id'):
+        features[album_id].add(('type', type_id))
+    for album_id, color in _color_features(colors):
+        features[album_id].add(('color', color))
+    return features
+
+
+def albums_with_features(features):
+    """Опубликованные альбомы, у которых есть хотя бы один из признаков"""
+    type_ids = {value for kind, value in features if kind == 'type'}
+    color_names = {value for kind, value in features if kind == 'color'}
+    found = set()
+    if type_ids:
+        found.update(Album.shooting_types.through.objects.filter(
+            album__is_published=True, shootingtype__is_active=True, shootingtype_id__in=type_ids
+        ).values_list('album_id', flat=True))
+    if color_names:
+        colors = PhotoColor.objects.filter(photo__album__is_published=True, color__in=color_names)
+        found.update(album_id for album_id, color in _color_features(colors))
+    return found
+
+
+def _color_features(colors):
+    """Пары (id альбома, цвет) для цветов, занимающих в альбоме не меньше COLOR_MIN_SHARE"""
+    rows = colors.values('photo__album_id', 'photo__album__photo_count', 'color').annotate(total=Sum('weight'))
+    for row in rows:
+        if row['total'] / max(row['photo__album__photo_count'], 1) >= COLOR_MIN_SHARE:
+            yield row['photo__album_id'], row['color']
+
+
+def _jaccard(a, b):
+    union = len(a | b)
+    return len(a & b) / union if union else 0.0
+
+
+def similarity(a, b):
+    types_a = {value for kind, value in a if kind == 'type'}
+    types_b = {value for kind, value in b if kind == 'type'}
+    colors_a = {value for kind, value in a if kind == 'color'}
+    colors_b = {value for kind, value in b if kind == 'color'}
+    return TYPE_WEIGHT * _jaccard(types_a, types_b) + COLOR_WEIGHT * _jaccard(colors_a, colors_b)
+
+
+def _inverted_index(features):
+    index = defaultdict(set)
+    for album_id, values in features.items():
+        for feature in values:
+            index[feature].add(album_id)
+    return index
+
+
+def top_related(album_id, features, index, k=TOP_K):
+    """Лучшие k соседей альбома: список пар (сходство, id альбома)"""
+    own = features[album_id]
+    candidates = set().union(*(index[feature] for feature in own)) if own else set()
+    candidates.discard(album_id)
+    scored = ((similarity(own, features[other]), other) for other in candidates)
+    # При равном сходстве выше более новые альбомы
+    return heapq.nlargest(k, (item for item in scored if item[0] > 0))
+
+
+def refresh(album_ids=None):
+    """
+    Пересчитывает рекомендации.
+
+    Без ``album_ids`` — для всех альбомов, иначе для указанных альбомов,
+    альбомов с общими признаками и альбомов, у которых они уже в списке.
+    Признаки при этом читаются только для этих альбомов и их возможных
+    соседей, а не для всего каталога. Возвращает число альбомов, чьи
+    списки пересчитаны.
+    """
+    if album_ids is None:
+        features = album_features()
+        targets = set(features)
+        stale = Album.objects.all()
+    else:
+        changed = set(album_ids)
+        changed_features = album_features(changed)
+        targets = changed | albums_with_features(set().union(*changed_features.values()))
+        targets |= set(RelatedAlbum.objects.filter(related__in=changed).values_list('album_id', flat=True))
+        # Соседями пересчитываемых альбомов могут быть только альбомы с общими признаками
+        features = album_features(targets)
+        neighbors = albums_with_features(set().union(*features.values())) - set(features)
+        if neighbors:
+            features.update(album_features(neighbors))
+        stale = Album.objects.filter(pk__in=changed)
+    index = _inverted_index(features)
+
+    rows = []
+    for album_id in targets & set(features):
+        for rank, (score, related_id) in enumerate(top_related(album_id, features, index), start=1):
+            rows.append(RelatedAlbum(album_id=album_id, related_id=related_id, score=score, rank=rank))
+
+    with transaction.atomic():
+        if album_ids is None:
+            RelatedAlbum.objects.all().delete()
+        else:
+            RelatedAlbum.objects.filter(album__in=targets).delete()
+        RelatedAlbum.objects.bulk_create(rows, batch_size=500)
+        stale.update(related_stale=False)
+
+    fragments.bump(*(fragments.album_scope(album_id) for album_id in targets))
+    return len(targets)
+
+
+def refresh_stale():
+    """Пересчет для альбомов, помеченных related_stale"""
+    album_ids = list(Album.objects.filter(related_stale=True).values_list('pk', flat=True))
+    return refresh(album_ids) if album_ids else 0
@@ -0,0 +1,300 @@
+"""
+Полнотекстовый поиск по портфолио на базе SQLite FTS5.
+
+Индекс хранится в виртуальной таблице ``portfolio_search`` и содержит
+только публичный контент: опубликованные альбомы, фотографии из них и
+опубликованные видео. Текст индексируется уже прошедшим стемминг, поэтому
+запросы «свадьба», «свадебный», «свадьбы» находят одни и те же документы.
+На других СУБД поиск деградирует до ``icontains``.
+
+Строки индекса адресуются по rowid, в котором закодированы тип и id объекта
+(см. ``_rowid``): удаление и переиндексация — поиск по первичному ключу,
+а не перебор всей таблицы по UNINDEXED-колонкам.
+"""
+import re
+from dataclasses import dataclass
+
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .models import Album, Photo, Video
+
+SEARCH_TABLE = 'portfolio_search'
+SEARCH_LIMIT = 200
+
+# Вес колонок для bm25: совпадение в названии важнее, чем в описании
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+KIND_ALBUM = 'album'
+KIND_PHOTO = 'photo'
+KIND_VIDEO = 'video'
+# Порядок задает кодировку rowid — менять его можно только вместе с миграцией индекса
+KINDS = (KIND_ALBUM, KIND_PHOTO, KIND_VIDEO)
+DELETE_CHUNK = 500
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+CYRILLIC_RE = re.compile(r'[а-я]')
+
+# Стеммер Портера для русского языка
+_RVRE = re.compile(r'^(.*?[аеиоуыэюя])(.*)$')
+_PERFECTIVE_GERUND = re.compile(r'((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$')
+_REFLEXIVE = re.compile(r'(с[яь])$')
+_ADJECTIVE = re.compile(
+    r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|ую|юю|ая|яя|ою|ею)$'
+)
+_PARTICIPLE = re.compile(r'((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$')
+_VERB = re.compile(
+    r'((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)'
+    r'|((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$'
+)
+_NOUN = re.compile(
+    r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$'
+)
+_DERIVATIONAL = re.compile(r'.*[^аеиоуыэюя]+[аеиоуыэюя].*ость?$')
+_DER = re.compile(r'ость?$')
+_SUPERLATIVE = re.compile(r'(ейше|ейш)$')
+_I = re.compile(r'и$')
+_SOFT_SIGN = re.compile(r'ь$')
+_NN = re.compile(r'нн$')
+
+
+def stem(word):
+    """Возвращает основу слова (русские слова стеммируются, остальные только приводятся к нижнему регистру)"""
+    word = word.lower().replace('ё', 'е')
+    if not CYRILLIC_RE.search(word):
+        return word
+
+    match = _RVRE.match(word)
+    if not match:
+        return word
+    prefix, rv = match.groups()
+
+    temp = _PERFECTIVE_GERUND.sub('', rv, 1)
+    if temp == rv:
+        rv = _REFLEXIVE.sub('', rv, 1)
+        temp = _ADJECTIVE.sub('', rv, 1)
+        if temp != rv:
+            rv = _PARTICIPLE.sub('', temp, 1)
+        else:
+            temp = _VERB.sub('', rv, 1)
+            rv = _NOUN.sub('', rv, 1) if temp == rv else temp
+    else:
+        rv = temp
+
+    rv = _I.sub('', rv, 1)
+    if _DERIVATIONAL.match(rv):
+        rv = _DER.sub('', rv, 1)
+
+    temp = _SOFT_SIGN.sub('', rv, 1)
+    if temp == rv:
+        rv = _SUPERLATIVE.sub('', rv, 1)
+        rv = _NN.sub('н', rv, 1)
+    else:
+        rv = temp
+
+    return prefix + rv
+
+
+def normalize(text):
+    """Разбивает текст на слова и возвращает строку из их основ"""
+    return ' '.join(stem(word) for word in WORD_RE.findall(text or ''))
+
+
+def build_match_query(query, column=None):
+    """
+    Строит выражение MATCH для FTS5.
+
+    Каждое слово экранируется кавычками (чтобы пользовательский ввод не
+    интерпретировался как синтаксис FTS5) и ищется по префиксу основы.
+    Если указана колонка, поиск ограничивается ею.
+    """
+    terms = [stem(word) for word in WORD_RE.findall(query or '')]
+    column_filter = f'{column} : ' if column else ''
+    return ' '.join(f'{column_filter}"{term}"*' for term in terms if term)
+
+
+def is_available():
+    """FTS5-индекс есть только в SQLite"""
+    return connection.vendor == 'sqlite'
+
+
+@dataclass
+class SearchHit:
+    """Результат поиска: тип объекта и сам объект"""
+    kind: str
+    object: object
+
+    @property
+    def url(self):
+        if self.kind == KIND_ALBUM:
+            return self.object.get_absolute_url()
+        if self.kind == KIND_PHOTO:
+            return self.object.album.get_absolute_url()
+        return None
+
+
+def _rowid(kind, object_id):
+    return object_id * len(KINDS) + KINDS.index(kind)
+
+
+def _document(kind, obj):
+    return (_rowid(kind, obj.pk), kind, obj.pk, normalize(obj.title), normalize(obj.description))
+
+
+def _delete(kind, object_ids):
+    rowids = [_rowid(kind, object_id) for object_id in object_ids]
+    with connection.cursor() as cursor:
+        for start in range(0, len(rowids), DELETE_CHUNK):
+            chunk = rowids[start:start + DELETE_CHUNK]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})', chunk)
+
+
+def _insert(documents):
+    documents = list(documents)
+    if not documents:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, kind, object_id, title, description) VALUES (%s, %s, %s, %s, %s)',
+            documents
+        )
+
+
+def index_album(album, photos=True):
+    """
+    Переиндексирует альбом, а с ``photos=True`` — и его фотографии.
+
+    Документы фотографий зависят от альбома только через публикацию, так что
+    при правке названия или описания альбома их можно не трогать.
+    """
+    if not is_available():
+        return
+    with transaction.atomic():
+        _delete(KIND_ALBUM, [album.pk])
+        if photos:
+            _delete(KIND_PHOTO, album.photos.values_list('pk', flat=True))
+        if album.is_published:
+            _insert([_document(KIND_ALBUM, album)])
+            if photos:
+                _insert(_document(KIND_PHOTO, photo) for photo in album.photos.only('pk', 'title', 'description'))
+
+
+def index_photo(photo):
+    if not is_available():
+        return
+    with transaction.atomic():
+        _delete(KIND_PHOTO, [photo.pk])
+        if photo.album.is_published:
+            _insert([_document(KIND_PHOTO, photo)])
+
+
+def index_video(video):
+    if not is_available():
+        return
+    with transaction.atomic():
+        _delete(KIND_VIDEO, [video.pk])
+        if video.is_published:
+            _insert([_document(KIND_VIDEO, video)])
+
+
+def remove(kind, object_id):
+    if is_available():
+        _delete(kind, [object_id])
+
+
+def rebuild_index(batch_size=1000, apps=None):
+    """
+    Полностью перестраивает индекс. Возвращает количество проиндексированных документов.
+
+    ``apps`` — реестр исторических моделей, когда индекс строится из миграции.
+    """
+    if not is_available():
+        return 0
+
+    album_model, photo_model, video_model = (
+        (apps.get_model('portfolio', name) for name in ('Album', 'Photo', 'Video')) if apps else (Album, Photo, Video)
+    )
+    sources = [
+        (KIND_ALBUM, album_model.objects.filter(is_published=True)),
+        (KIND_PHOTO, photo_model.objects.filter(album__is_published=True)),
+        (KIND_VIDEO, video_model.objects.filter(is_published=True)),
+    ]
+    total = 0
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        for kind, queryset in sources:
+            batch = []
+            for obj in queryset.only('pk', 'title', 'description').iterator(chunk_size=batch_size):
+                batch.append(_document(kind, obj))
+                if len(batch) >= batch_size:
+                    _insert(batch)
+                    total += len(batch)
+                    batch = []
+            _insert(batch)
+            total += len(batch)
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
+    return total
+
+
+def matching_ids(kind, query, column=None):
+    """Возвращает id всех объектов заданного типа, подходящих под запрос"""
+    match = build_match_query(query, column)
+    if not match:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT object_id FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s AND kind = %s',
+            [match, kind]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _fallback_search(query, limit):
+    lookup = Q(title__icontains=query) | Q(description__icontains=query)
+    hits = [SearchHit(KIND_ALBUM, album) for album in Album.objects.filter(lookup, is_published=True)[:limit]]
+    hits += [
+        SearchHit(KIND_PHOTO, photo)
+        for photo in Photo.objects.filter(lookup, album__is_published=True).select_related('album')[:limit]
+    ]
+    hits += [SearchHit(KIND_VIDEO, video) for video in Video.objects.filter(lookup, is_published=True)[:limit]]
+    return hits[:limit]
+
+
+def search(query, limit=SEARCH_LIMIT):
+    """Ищет по альбомам, фотографиям и видео. Возвращает список SearchHit по убыванию релевантности"""
+    query = (query or '').strip()
+    if not query:
+        return []
+    if not is_available():
+        return _fallback_search(query, limit)
+
+    match = build_match_query(query)
+    if not match:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT kind, object_id FROM {SEARCH_TABLE} '
+            f'WHERE {SEARCH_TABLE} MATCH %s '
+            f'ORDER BY bm25({SEARCH_TABLE}, 0, 0, %s, %s) LIMIT %s',
+            [match, TITLE_WEIGHT, DESCRIPTION_WEIGHT, limit]
+        )
+        rows = cursor.fetchall()
+
+    ids_by_kind = {KIND_ALBUM: [], KIND_PHOTO: [], KIND_VIDEO: []}
+    for kind, object_id in rows:
+        ids_by_kind[kind].append(object_id)
+
+    objects = {
+        KIND_ALBUM: Album.objects.in_bulk(ids_by_kind[KIND_ALBUM]),
+        KIND_PHOTO: Photo.objects.select_related('album').in_bulk(ids_by_kind[KIND_PHOTO]),
+        KIND_VIDEO: Video.objects.in_bulk(ids_by_kind[KIND_VIDEO]),
+    }
+    return [
+        SearchHit(kind, objects[kind][object_id])
+        for kind, object_id in rows
+        if object_id in objects[kind]
+    ]
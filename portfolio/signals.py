@@ -0,0 +1,202 @@
+from django.db.models.signals import m2m_changed, pre_delete, pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from core import reference
+from . import fragments, recommendations, search
+from .models import Album, Photo, RelatedAlbum, ShootingType, Video
+
+
+# Синхронизация полнотекстового индекса
+ALBUM_SEARCH_FIELDS = ('title', 'description', 'is_published')
+
+
+@receiver(pre_save, sender=Album)
+def remember_album_state(sender, instance, raw=False, **kwargs):
+    instance._previous_state = None
+    if instance.pk and not raw:
+        instance._previous_state = Album.objects.filter(pk=instance.pk).values(
+            *ALBUM_SEARCH_FIELDS, 'related_stale'
+        ).first()
+
+
+@receiver(post_save, sender=Album)
+def index_album(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_state', None)
+    if previous is None or previous['is_published'] != instance.is_published:
+        # Публикация открывает или скрывает и фотографии альбома
+        search.index_album(instance)
+    elif any(previous[field] != getattr(instance, field) for field in ('title', 'description')):
+        search.index_album(instance, photos=False)
+
+
+@receiver(post_delete, sender=Album)
+def unindex_album(sender, instance, **kwargs):
+    search.remove(search.KIND_ALBUM, instance.pk)
+
+
+@receiver(post_save, sender=Photo)
+def index_photo(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_photo(instance)
+
+
+@receiver(post_delete, sender=Photo)
+def unindex_photo(sender, instance, **kwargs):
+    search.remove(search.KIND_PHOTO, instance.pk)
+
+
+@receiver(post_save, sender=Video)
+def index_video(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_video(instance)
+
+
+@receiver(post_delete, sender=Video)
+def unindex_video(sender, instance, **kwargs):
+    search.remove(search.KIND_VIDEO, instance.pk)
+
+
+# Счетчик фотографий и итоговая обложка альбома
+COVER_FIELDS = ('image', 'is_cover_candidate', 'order')
+
+
+@receiver(pre_save, sender=Photo)
+def remember_photo_state(sender, instance, raw=False, **kwargs):
+    instance._previous_state = None
+    if instance.pk and not raw:
+        instance._previous_state = Photo.objects.filter(pk=instance.pk).values(
+            'album_id', *COVER_FIELDS
+        ).first()
+
+
+@receiver(post_save, sender=Photo)
+def update_album_stats(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_state', None)
+    if created or previous is None:
+        Album.change_photo_count(instance.album_id, 1)
+        Album.refresh_effective_cover(instance.album_id)
+    elif previous['album_id'] != instance.album_id:
+        Album.change_photo_count(previous['album_id'], -1)
+        Album.change_photo_count(instance.album_id, 1)
+        Album.refresh_effective_cover(previous['album_id'])
+        Album.refresh_effective_cover(instance.album_id)
+    elif any(previous[field] != getattr(instance, field) for field in COVER_FIELDS):
+        Album.refresh_effective_cover(instance.album_id)
+
+
+@receiver(post_delete, sender=Photo)
+def update_album_stats_on_delete(sender, instance, **kwargs):
+    Album.change_photo_count(instance.album_id, -1)
+    Album.refresh_effective_cover(instance.album_id)
+
+
+# Поколения кэша фрагментов (см. portfolio.fragments)
+@receiver(post_save, sender=Album)
+@receiver(post_delete, sender=Album)
+def invalidate_album_fragments(sender, instance, **kwargs):
+    fragments.bump(fragments.album_scope(instance.pk), fragments.PORTFOLIO)
+
+
+@receiver(post_save, sender=Photo)
+@receiver(post_delete, sender=Photo)
+def invalidate_photo_fragments(sender, instance, **kwargs):
+    # Фото меняет и страницу альбома, и карточку альбома в галерее (обложка, счетчик)
+    scopes = [fragments.album_scope(instance.album_id), fragments.PORTFOLIO]
+    previous = getattr(instance, '_previous_state', None)
+    if previous and previous['album_id'] != instance.album_id:
+        scopes.append(fragments.album_scope(previous['album_id']))
+    fragments.bump(*scopes)
+
+
+@receiver(post_save, sender=ShootingType)
+@receiver(post_delete, sender=ShootingType)
+def invalidate_shooting_type_fragments(sender, instance, **kwargs):
+    fragments.bump(fragments.shooting_type_scope(instance.pk), fragments.PORTFOLIO)
+
+
+@receiver(post_save, sender=Video)
+@receiver(post_delete, sender=Video)
+def invalidate_video_fragments(sender, instance, **kwargs):
+    fragments.bump(fragments.PORTFOLIO)
+
+
+@receiver(m2m_changed, sender=Album.shooting_types.through)
+@receiver(m2m_changed, sender=Video.shooting_types.through)
+def invalidate_shooting_types_fragments(sender, instance, action, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    scopes = [fragments.PORTFOLIO]
+    if isinstance(instance, ShootingType):
+        scopes.append(fragments.shooting_type_scope(instance.pk))
+    else:
+        scopes.extend(fragments.shooting_type_scope(pk) for pk in pk_set or ())
+    fragments.bump(*scopes)
+
+
+# Справочник типов съемки в памяти процессов (см. core.reference)
+@receiver(post_save, sender=ShootingType)
+@receiver(post_delete, sender=ShootingType)
+def invalidate_shooting_types_reference(sender, instance, **kwargs):
+    reference.invalidate()
+
+
+# Пометки для пересчета рекомендаций (см. portfolio.recommendations)
+@receiver(pre_save, sender=Album)
+def mark_album_related_stale(sender, instance, raw=False, **kwargs):
+    # Из полей самого альбома на рекомендации влияет только публикация (типы съемки —
+    # m2m_changed ниже); состояние до сохранения запомнил remember_album_state
+    if raw:
+        return
+    previous = getattr(instance, '_previous_state', None)
+    if previous is None or previous['is_published'] != instance.is_published:
+        instance.related_stale = True
+    else:
+        # Пометку мог поставить UPDATE уже после загрузки альбома — не затираем ее
+        instance.related_stale = previous['related_stale']
+
+
+@receiver(pre_delete, sender=Album)
+def mark_referring_albums_stale(sender, instance, **kwargs):
+    recommendations.mark_stale(RelatedAlbum.objects.filter(related=instance).values('album_id'))
+
+
+@receiver(m2m_changed, sender=Album.shooting_types.through)
+def mark_retyped_albums_stale(sender, instance, action, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if isinstance(instance, Album):
+        recommendations.mark_stale([instance.pk])
+    elif pk_set:
+        recommendations.mark_stale(pk_set)
+    else:
+        # clear() со стороны типа съемки: затронутые альбомы уже не найти, пересчитаем все
+        recommendations.mark_stale(Album.objects.values('pk'))
+
+
+@receiver(post_save, sender=ShootingType)
+@receiver(pre_delete, sender=ShootingType)
+def mark_type_albums_stale(sender, instance, **kwargs):
+    recommendations.mark_stale(Album.objects.filter(shooting_types=instance).values('pk'))
+
+
+@receiver(post_save, sender=Photo)
+def mark_photo_album_stale(sender, instance, created, raw=False, **kwargs):
+    # Фото меняет цветовые признаки альбома, только если появилось, сменило файл или альбом
+    if raw:
+        return
+    previous = getattr(instance, '_previous_state', None)
+    if created or previous is None:
+        recommendations.mark_stale([instance.album_id])
+    elif previous['album_id'] != instance.album_id:
+        recommendations.mark_stale([previous['album_id'], instance.album_id])
+    elif previous['image'] != instance.image.name:
+        recommendations.mark_stale([instance.album_id])
+
+
+@receiver(post_delete, sender=Photo)
+def mark_deleted_photo_album_stale(sender, instance, **kwargs):
+    recommendations.mark_stale([instance.album_id])
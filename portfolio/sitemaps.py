@@ -0,0 +1,73 @@
+from django.core.paginator import Paginator
+from django.db.models import Count, Max, Prefetch
+from django.urls import reverse
+
+from core.sitemaps import ShardedSitemap
+from .models import Album, Photo, ShootingType, Video
+from .views import VideoListView
+
+
+class AlbumSitemap(ShardedSitemap):
+    """Альбомы с фотографиями в виде image-записей"""
+    shard_size = 500
+    changefreq = 'weekly'
+    template_name = 'portfolio/sitemap_albums.xml'
+
+    def get_queryset(self):
+        return Album.objects.filter(is_published=True)
+
+    def items(self):
+        return super().items().annotate(photos_updated=Max('photos__updated_at')).prefetch_related(
+            Prefetch('photos', queryset=Photo.objects.only('id', 'album_id', 'image').order_by('order', 'created_at'))
+        )
+
+    def lastmod(self, item):
+        return max(filter(None, [item.updated_at, item.photos_updated]))
+
+    def fingerprint_aggregates(self):
+        # Фотографии не меняют updated_at альбома — учитываем их отдельно
+        return {
+            **super().fingerprint_aggregates(),
+            'photos_total': Count('photos', distinct=True),
+            'photos_updated': Max('photos__updated_at'),
+        }
+
+    def shard_lastmod(self, stats):
+        return max(filter(None, [stats['updated'], stats['photos_updated']]))
+
+
+class ShootingTypeSitemap(ShardedSitemap):
+    changefreq = 'weekly'
+
+    def get_queryset(self):
+        return ShootingType.objects.filter(is_active=True)
+
+    def location(self, item):
+        return reverse('portfolio:shooting_type', kwargs={'slug': item.slug})
+
+
+class VideoSitemap(ShardedSitemap):
+    """
+    Страницы списка видео с video-записями.
+
+    У видео нет собственных страниц, поэтому в sitemap попадают страницы
+    пагинации списка; раздел не шардируется — видео немного, а вставка
+    нового видео все равно сдвигает все страницы.
+    """
+    shard_size = None
+    changefreq = 'weekly'
+    template_name = 'portfolio/sitemap_videos.xml'
+
+    def get_queryset(self):
+        return Video.objects.filter(is_published=True)
+
+    def items(self):
+        videos = self.get_queryset().order_by(*Video._meta.ordering)
+        return list(Paginator(videos, VideoListView.paginate_by))
+
+    def location(self, page):
+        url = reverse('portfolio:video_list')
+        return url if page.number == 1 else f'{url}?page={page.number}'
+
+    def lastmod(self, page):
+        return max(video.updated_at for video in page.object_list)
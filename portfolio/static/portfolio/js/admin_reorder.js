@@ -0,0 +1,91 @@
+// Перестановка строк списка в админке перетаскиванием.
+// После перестановки отправляет id строк страницы в новом порядке на endpoint reorder/.
+// Сохраняет по dragend, а не по drop: строку можно отпустить и ниже последней строки.
+(function() {
+    'use strict';
+
+    document.addEventListener('DOMContentLoaded', function() {
+        const config = document.getElementById('reorder-config');
+        const tbody = document.querySelector('#result_list tbody');
+        if (!config || !tbody) {
+            return;
+        }
+        const status = document.getElementById('reorder-status');
+        const csrfToken = document.querySelector('[name=csrfmiddlewaretoken]').value;
+        let dragged = null;
+        let initialOrder = null;
+
+        function rowIds() {
+            return Array.from(tbody.querySelectorAll('input.action-select')).map(function(input) {
+                return input.value;
+            });
+        }
+
+        function save() {
+            status.textContent = 'Сохранение…';
+            fetch(config.dataset.url, {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json', 'X-CSRFToken': csrfToken},
+                body: JSON.stringify({ids: rowIds()})
+            }).then(function(response) {
+                if (!response.ok) {
+                    throw new Error(response.statusText);
+                }
+                return response.json();
+            }).then(function(data) {
+                status.textContent = 'Порядок сохранен (изменено строк: ' + data.updated + ')';
+            }).catch(function() {
+                status.textContent = 'Не удалось сохранить порядок, страница будет обновлена';
+                window.setTimeout(function() { window.location.reload(); }, 1500);
+            });
+        }
+
+        tbody.querySelectorAll('tr').forEach(function(row) {
+            row.draggable = true;
+            row.style.cursor = 'move';
+
+            row.addEventListener('dragstart', function(event) {
+                dragged = row;
+                initialOrder = rowIds().join(',');
+                event.dataTransfer.effectAllowed = 'move';
+                row.style.opacity = '0.4';
+            });
+
+            row.addEventListener('dragend', function() {
+                row.style.opacity = '';
+                dragged = null;
+                if (rowIds().join(',') !== initialOrder) {
+                    save();
+                }
+            });
+
+            row.addEventListener('dragover', function(event) {
+                if (!dragged || dragged === row) {
+                    return;
+                }
+                event.preventDefault();
+                const rect = row.getBoundingClientRect();
+                const after = event.clientY > rect.top + rect.height / 2;
+                tbody.insertBefore(dragged, after ? row.nextSibling : row);
+            });
+        });
+
+        // Ниже последней строки (в том числе под таблицей) — перенос в конец страницы
+        document.addEventListener('dragover', function(event) {
+            if (!dragged) {
+                return;
+            }
+            event.preventDefault();
+            const last = tbody.lastElementChild;
+            if (last !== dragged && event.clientY > last.getBoundingClientRect().bottom) {
+                tbody.appendChild(dragged);
+            }
+        });
+
+        document.addEventListener('drop', function(event) {
+            if (dragged) {
+                event.preventDefault();
+            }
+        });
+    });
+})();
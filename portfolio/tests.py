@@ -1,3 +1,973 @@
-from django.test import TestCase
+import datetime
+import importlib
+import io
+import json
+import os
+import random
+import shutil
+import struct
+import tempfile
+import zipfile
+import zlib
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, modify_settings, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from core.models import SiteSettings
+from core.sqlprofile import QueryBudgetMixin
+from core.models import Blob
+from . import fragments, imagehash, importer, ordering, palette, recommendations, search, zipstream
+from .filters import AlbumFilter
+from .models import Album, Photo, PhotoColor, PhotoImport, RelatedAlbum, ShootingType, Video
+from .sitemaps import AlbumSitemap
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Бюджет SQL-запросов страниц портфолио (кэши пусты — худший случай)"""
+
+    def setUp(self):
+        SiteSettings.objects.create(title="Студия", phone='+7 900 000-00-00', email='studio@example.com', about_text="О нас")
+        types = [ShootingType.objects.create(name=f"Тип {number}", slug=f'type-{number}') for number in range(3)]
+        self.albums = []
+        for number in range(4):
+            album = Album.objects.create(title=f"Весна {number}", slug=f'spring-{number}')
+            album.shooting_types.add(*types)
+            for order in range(4):
+                Photo.objects.create(album=album, image=f'photos/{number}-{order}.jpg', order=order, title=f"Весна {order}")
+            self.albums.append(album)
+        for rank, related in enumerate(self.albums[1:], start=1):
+            RelatedAlbum.objects.create(album=self.albums[0], related=related, rank=rank, score=1.0)
+        for number in range(3):
+            Video.objects.create(title=f"Видео {number}", youtube_url='https://www.youtube.com/watch?v=abc').shooting_types.add(*types)
+        Album.objects.create(title="Пустой", slug='empty')
+
+    def test_pages(self):
+        photo = self.albums[0].photos.first()
+        budgets = {
+            reverse('portfolio:gallery'): 6,
+            reverse('portfolio:gallery') + '?shooting_type=1&is_featured=false': 7,
+            reverse('portfolio:album_detail', kwargs={'slug': 'spring-0'}): 6,
+            reverse('portfolio:album_download', kwargs={'slug': 'empty'}): 2,
+            reverse('portfolio:search') + '?q=весна': 4,
+            reverse('portfolio:video_list'): 4,
+            reverse('portfolio:shooting_type', kwargs={'slug': 'type-1'}): 6,
+            reverse('portfolio:media_fullscreen', kwargs={'photo_id': photo.pk}): 4,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                cache.clear()
+                with self.assertQueryBudget(budget):
+                    self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class OrderingTests(TestCase):
+    """Разреженные ключи порядка и перестановка (portfolio.ordering)"""
+
+    def setUp(self):
+        self.album = Album.objects.create(title="Весна", slug='spring')
+        self.photos = [Photo.objects.create(album=self.album, image=f'photos/{number}.jpg') for number in range(5)]
+
+    def album_order(self):
+        return list(Photo.objects.filter(album=self.album).order_by('order', 'pk').values_list('pk', flat=True))
+
+    def test_new_rows_go_to_the_end(self):
+        self.assertEqual([photo.order for photo in self.photos], [ordering.GAP * step for step in range(1, 6)])
+        other = Album.objects.create(title="Лето", slug='summer')
+        self.assertEqual(Photo.objects.create(album=other, image='photos/x.jpg').order, ordering.GAP)
+        types = [ShootingType.objects.create(name=name, slug=slug) for name, slug in [("Б", 'b'), ("А", 'a')]]
+        self.assertEqual(list(ShootingType.objects.all()), types)
+
+    def test_plan_moves_only_rows_outside_longest_increasing_run(self):
+        items = [SimpleNamespace(order=key) for key in (4096, 1024, 2048, 3072)]
+        moved = ordering.plan(items, 0, None)
+        self.assertEqual(moved, [items[0]])
+        self.assertTrue(0 < items[0].order < 1024)
+
+    def test_plan_reports_exhausted_gap(self):
+        items = [SimpleNamespace(order=2), SimpleNamespace(order=1)]
+        self.assertIsNone(ordering.plan(items, 0, 3))
+
+    def test_reorder_writes_minimal_moves(self):
+        ids = [photo.pk for photo in self.photos]
+        ids.insert(0, ids.pop())
+        self.assertEqual(ordering.reorder(Photo.objects.filter(album=self.album), ids), 1)
+        self.assertEqual(self.album_order(), ids)
+
+    def test_reorder_rebalances_when_keys_run_out(self):
+        for key, photo in enumerate(self.photos, start=1):
+            Photo.objects.filter(pk=photo.pk).update(order=key)
+        ids = [photo.pk for photo in self.photos]
+        ids.insert(1, ids.pop())
+        ordering.reorder(Photo.objects.filter(album=self.album), ids)
+
+        self.assertEqual(self.album_order(), ids)
+        self.assertFalse(ordering.needs_rebalance(Photo.objects.filter(album=self.album)))
+
+    def test_reorder_rejects_unknown_ids(self):
+        with self.assertRaises(ordering.OrderingError):
+            ordering.reorder(Photo.objects.filter(album=self.album), [self.photos[0].pk, 0])
+
+
+class ReorderViewTests(TestCase):
+    """Endpoint reorder/ в админке"""
+
+    def setUp(self):
+        self.album = Album.objects.create(title="Весна", slug='spring')
+        self.photos = [Photo.objects.create(album=self.album, image=f'photos/{number}.jpg') for number in range(3)]
+        self.url = reverse('admin:portfolio_photo_reorder')
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'secret'))
+
+    def post(self, ids):
+        return self.client.post(self.url, json.dumps({'ids': ids}), content_type='application/json')
+
+    def test_reorder(self):
+        ids = [photo.pk for photo in reversed(self.photos)]
+        response = self.post(ids)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['updated'], 2)
+        self.assertEqual(list(self.album.photos.values_list('pk', flat=True)), ids)
+
+    def test_photos_of_different_albums_are_rejected(self):
+        other = Photo.objects.create(album=Album.objects.create(title="Лето", slug='summer'), image='photos/x.jpg')
+        self.assertEqual(self.post([self.photos[0].pk, other.pk]).status_code, 400)
+        self.assertEqual(self.post([self.photos[0].pk, 'x']).status_code, 400)
+
+    def test_method_and_permission(self):
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+        staff = User.objects.create_user('staff', password='secret', is_staff=True)
+        staff.user_permissions.add(Permission.objects.get(codename='view_photo'))
+        self.client.force_login(staff)
+        self.assertEqual(self.post([photo.pk for photo in self.photos]).status_code, 403)
+
+
+def jpeg_bytes(color='red', size=(64, 48)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+def zip_bytes(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+class TempMediaMixin:
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, PHOTO_IMPORT_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class ImporterTests(TempMediaMixin, TransactionTestCase):
+    """Массовый импорт фотографий (portfolio.importer); файлы сохраняются в рабочих потоках со своими соединениями"""
+
+    def setUp(self):
+        super().setUp()
+        self.album = Album.objects.create(title="Весна", slug='spring')
+
+    def entry(self, name, data=None, error=None):
+        def open_entry():
+            self.opened.append(name)
+            if error:
+                raise error
+            return io.BytesIO(data)
+        return importer.ImportEntry(name, open_entry)
+
+    def test_valid_files_are_imported_and_bad_ones_skipped(self):
+        self.opened = []
+        result = importer.import_photos(self.album, [
+            self.entry('a.jpg', jpeg_bytes('red')),
+            self.entry('b.jpg', jpeg_bytes('blue')),
+            self.entry('broken.jpg', b'not an image'),
+            self.entry('notes.txt', b'text'),
+            self.entry('bad-member.jpg', error=zipfile.BadZipFile("Bad CRC-32")),
+        ], workers=2)
+
+        self.assertEqual(result.created, 2)
+        self.assertEqual(sorted(name for name, _ in result.skipped), ['bad-member.jpg', 'broken.jpg', 'notes.txt'])
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.photo_count, 2)
+        self.assertEqual(self.album.effective_cover.name, self.album.photos.first().image.name)
+        self.assertEqual(sum(Blob.objects.values_list('ref_count', flat=True)), 2)
+        # Каждый файл читается один раз (txt отсеивается по расширению до чтения)
+        self.assertEqual(sorted(self.opened), ['a.jpg', 'b.jpg', 'bad-member.jpg', 'broken.jpg'])
+
+    def test_decompression_bomb_is_skipped(self):
+        self.opened = []
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 100):
+            result = importer.import_photos(self.album, [self.entry('huge.jpg', jpeg_bytes(size=(64, 64)))])
+        self.assertEqual(result.created, 0)
+        self.assertEqual(len(result.skipped), 1)
+
+    def test_created_photos_are_accounted_when_import_fails(self):
+        self.opened = []
+        entries = [
+            self.entry('a.jpg', jpeg_bytes('red')),
+            self.entry('b.jpg', jpeg_bytes('blue')),
+            self.entry('c.jpg', error=RuntimeError("диск отключен")),
+        ]
+        with mock.patch.object(importer, 'BATCH_SIZE', 1), self.assertRaises(RuntimeError):
+            importer.import_photos(self.album, entries, workers=1)
+
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.photo_count, 2)
+        self.assertTrue(self.album.effective_cover)
+
+    def test_duplicates_are_looked_up_once_after_the_pool(self):
+        self.opened = []
+        existing = Photo(album=Album.objects.create(title="Лето", slug='summer'), image='photos/old.jpg')
+        existing.set_image_hash(imagehash.dhash(io.BytesIO(jpeg_bytes('red'))))
+        existing.save()
+        gradient = io.BytesIO()
+        Image.linear_gradient('L').rotate(30).convert('RGB').save(gradient, 'JPEG')
+
+        entries = [
+            self.entry('a.jpg', jpeg_bytes('red')),
+            self.entry('b.jpg', gradient.getvalue()),
+            self.entry('c.jpg', jpeg_bytes('blue')),
+        ]
+        with mock.patch.object(Photo, 'find_duplicates_many', wraps=Photo.find_duplicates_many) as lookup, \
+                mock.patch.object(importer.connections, 'close_all', wraps=importer.connections.close_all) as close:
+            result = importer.import_photos(self.album, entries, workers=2)
+
+        self.assertEqual(lookup.call_count, 1)
+        # Соединение рабочего потока закрывается после каждого файла
+        self.assertEqual(close.call_count, 3)
+        # Одинаковые фото внутри импорта не считаются загруженными ранее
+        self.assertEqual(result.duplicates, [('a.jpg', [existing]), ('c.jpg', [existing])])
+
+    def test_queued_import(self):
+        archive = SimpleUploadedFile('photos.zip', zip_bytes({'a.jpg': jpeg_bytes(), 'b.txt': b'x'}))
+        job = importer.enqueue(self.album, archive=archive)
+        self.assertTrue(os.path.exists(job.source))
+        self.assertEqual(self.album.photos.count(), 0)
+
+        job = importer.process()
+        self.assertEqual((job.status, job.created_count), ('done', 1))
+        self.assertIn('b.txt', job.report)
+        self.assertFalse(os.path.exists(job.source))
+        self.assertIsNone(importer.process())
+
+    def test_abandoned_job_is_failed_not_rerun(self):
+        job = PhotoImport.objects.create(
+            album=self.album, source=self.media_root, status='running',
+            lease_until=timezone.now() - datetime.timedelta(minutes=1),
+        )
+        self.assertIsNone(importer.process())
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+
+
+class ImportViewTests(TempMediaMixin, TestCase):
+    """Импорт из админки ставится в очередь"""
+
+    def setUp(self):
+        super().setUp()
+        self.album = Album.objects.create(title="Весна", slug='spring')
+        self.url = reverse('admin:portfolio_album_import_photos', args=[self.album.pk])
+
+    def test_upload_is_queued(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'secret'))
+        archive = SimpleUploadedFile('photos.zip', zip_bytes({'a.jpg': jpeg_bytes()}))
+        response = self.client.post(self.url, {'archive': archive})
+
+        self.assertRedirects(response, reverse('admin:portfolio_album_change', args=[self.album.pk]))
+        self.assertEqual(PhotoImport.objects.get().status, 'pending')
+        self.assertEqual(self.album.photos.count(), 0)
+
+    def test_permission_denied(self):
+        staff = User.objects.create_user('staff', password='secret', is_staff=True)
+        staff.user_permissions.add(Permission.objects.get(codename='view_album'))
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class AlbumStatsTests(TempMediaMixin, TestCase):
+    """Денормализованные счетчик фото и итоговая обложка альбома (portfolio.signals)"""
+
+    def setUp(self):
+        super().setUp()
+        self.album = Album.objects.create(title="Весна", slug='spring')
+        self.other = Album.objects.create(title="Лето", slug='summer')
+
+    def add_photo(self, album, color, **kwargs):
+        return Photo.objects.create(
+            album=album, image=SimpleUploadedFile(f'{color}.jpg', jpeg_bytes(color)), **kwargs
+        )
+
+    def stats(self, album):
+        album.refresh_from_db()
+        return album.photo_count, album.effective_cover.name
+
+    def test_uploaded_cover_is_stored_under_blob_name(self):
+        album = Album.objects.create(
+            title="Осень", slug='autumn', cover=SimpleUploadedFile('cover.jpg', jpeg_bytes('blue'))
+        )
+        self.assertTrue(album.cover.name.startswith('blobs/'))
+        self.assertEqual(album.effective_cover.name, album.cover.name)
+        album.refresh_from_db()
+        self.assertEqual(album.effective_cover.name, album.cover.name)
+        self.assertTrue(album.cover.storage.exists(album.effective_cover.name))
+
+        # Явная обложка важнее фотографий альбома
+        self.add_photo(album, 'red', is_cover_candidate=True)
+        self.assertEqual(self.stats(album), (1, album.cover.name))
+
+    def test_photo_add_and_delete(self):
+        first = self.add_photo(self.album, 'red')
+        self.assertEqual(self.stats(self.album), (1, first.image.name))
+
+        candidate = self.add_photo(self.album, 'green', is_cover_candidate=True)
+        self.assertEqual(self.stats(self.album), (2, candidate.image.name))
+
+        candidate.delete()
+        self.assertEqual(self.stats(self.album), (1, first.image.name))
+        first.delete()
+        self.assertEqual(self.stats(self.album), (0, ''))
+
+    def test_photo_moved_between_albums(self):
+        stays = self.add_photo(self.album, 'red')
+        moves = self.add_photo(self.album, 'green', is_cover_candidate=True)
+        self.assertEqual(self.stats(self.album), (2, moves.image.name))
+
+        moves.album = self.other
+        moves.save()
+        self.assertEqual(self.stats(self.album), (1, stays.image.name))
+        self.assertEqual(self.stats(self.other), (1, moves.image.name))
+
+
+class SearchTests(TestCase):
+    """Полнотекстовый поиск (portfolio.search) и его синхронизация сигналами"""
+
+    def setUp(self):
+        self.album = Album.objects.create(
+            title="Свадьба в парке", slug='wedding', description="Прогулка у озера", is_published=True,
+        )
+        self.photo = Photo.objects.create(album=self.album, image='photos/a.jpg', title="Первые шаги")
+
+    def found(self, query):
+        return {(hit.kind, hit.object.pk) for hit in search.search(query)}
+
+    def test_stem_folds_inflections(self):
+        self.assertEqual({search.stem(word) for word in ("свадьба", "свадьбы", "свадьбой")}, {'свадьб'})
+        self.assertEqual(search.stem("Ёлки"), search.stem("ёлка"))
+        self.assertEqual(search.stem("Sunset"), 'sunset')
+        self.assertEqual(search.build_match_query('свадьбы "OR'), '"свадьб"* "or"*')
+
+    def test_inflected_query_finds_album(self):
+        self.assertEqual(self.found("свадьбой"), {(search.KIND_ALBUM, self.album.pk)})
+        self.assertEqual(self.found("шагами"), {(search.KIND_PHOTO, self.photo.pk)})
+
+    def test_title_match_ranks_above_description(self):
+        other = Album.objects.create(title="Осень", slug='autumn', description="Свадьба в лесу", is_published=True)
+        hits = search.search("свадьба")
+        self.assertEqual([hit.object.pk for hit in hits], [self.album.pk, other.pk])
+
+    def test_migration_backfills_existing_rows(self):
+        backfill = importlib.import_module('portfolio.migrations.0013_search_backfill').backfill_search_index
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.SEARCH_TABLE}')
+        self.assertEqual(self.found("свадьба"), set())
+
+        backfill(apps, None)
+        self.assertEqual(self.found("свадьба"), {(search.KIND_ALBUM, self.album.pk)})
+        self.assertEqual(self.found("шаги"), {(search.KIND_PHOTO, self.photo.pk)})
+
+    def test_signals_follow_publication_and_deletion(self):
+        self.album.is_published = False
+        self.album.save()
+        self.assertEqual(self.found("свадьба шаги"), set())
+        self.assertEqual(self.found("шаги"), set())
+
+        self.album.is_published = True
+        self.album.save()
+        self.assertEqual(self.found("шаги"), {(search.KIND_PHOTO, self.photo.pk)})
+
+        self.photo.delete()
+        self.assertEqual(self.found("шаги"), set())
+        self.album.delete()
+        self.assertEqual(self.found("свадьба"), set())
+
+    def test_album_edit_reindexes_only_what_changed(self):
+        with mock.patch.object(search, 'index_album', wraps=search.index_album) as index_album:
+            self.album.is_featured = True
+            self.album.save()
+            index_album.assert_not_called()
+
+            self.album.title = "Венчание"
+            self.album.save()
+            index_album.assert_called_once_with(self.album, photos=False)
+        self.assertEqual(self.found("венчание"), {(search.KIND_ALBUM, self.album.pk)})
+        self.assertEqual(self.found("шаги"), {(search.KIND_PHOTO, self.photo.pk)})
+
+
+class ZipStreamTests(TempMediaMixin, TestCase):
+    """Потоковый ZIP альбома (portfolio.zipstream): заголовки, CRC, произвольные диапазоны"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.album = Album.objects.create(title="Весна", slug='spring', is_published=True)
+        for color in ('red', 'green', 'blue'):
+            Photo.objects.create(album=self.album, image=SimpleUploadedFile('photo.jpg', jpeg_bytes(color)))
+        self.storage = Photo._meta.get_field('image').storage
+        self.names = list(self.album.photos.order_by('order').values_list('image', flat=True))
+
+    def archive(self, chunk_size=zipstream.CHUNK_SIZE):
+        members = zipstream.members_from_storage(self.storage, [('кадр.jpg', name) for name in self.names])
+        return zipstream.StoredZip(self.storage, members, chunk_size=chunk_size)
+
+    def test_archive_is_valid_zip_with_correct_crc_and_sizes(self):
+        archive = self.archive()
+        data = b''.join(archive.iter_range())
+        self.assertEqual(len(data), archive.size)
+
+        with zipfile.ZipFile(io.BytesIO(data)) as parsed:
+            self.assertIsNone(parsed.testzip())
+            infos = parsed.infolist()
+            self.assertEqual([info.filename for info in infos], ['кадр.jpg', 'кадр_2.jpg', 'кадр_3.jpg'])
+            for info, name in zip(infos, self.names):
+                with self.storage.open(name) as fh:
+                    content = fh.read()
+                self.assertEqual(info.compress_type, zipfile.ZIP_STORED)
+                self.assertEqual(info.file_size, len(content))
+                self.assertEqual(info.CRC, zlib.crc32(content))
+
+    def test_ranges_match_full_archive(self):
+        full = b''.join(self.archive().iter_range())
+        boundaries = [offset + delta for offset, _ in self.archive().offsets for delta in (-1, 0, 1)]
+        starts = [0, 1, 29, 31, *boundaries, len(full) - 22, len(full) - 1]
+        for start in starts:
+            for length in (1, 17, 1000):
+                end = min(start + length, len(full)) - 1
+                with self.subTest(start=start, end=end):
+                    # Новый объект и пустой кэш: CRC приходится считать ради data descriptor
+                    cache.clear()
+                    chunks = self.archive(chunk_size=7).iter_range(max(start, 0), end)
+                    self.assertEqual(b''.join(chunks), full[max(start, 0):end + 1])
+
+    def test_crc_is_cached_after_full_pass(self):
+        b''.join(self.archive().iter_range())
+        archive = self.archive()
+        with mock.patch.object(archive, '_read', side_effect=AssertionError("файл перечитан")):
+            b''.join(archive.iter_range(archive.cd_offset))
+
+    def test_zip64_headers(self):
+        modified = timezone.now()
+        member = zipstream.ZipMember('big.bin', 'big.bin', 2 ** 32 + 5, modified)
+        archive = zipstream.StoredZip(self.storage, [])
+
+        local = archive._local_header(member)
+        fields = struct.unpack('<IHHHHHIIIHH', local[:30])
+        self.assertEqual(fields[1], zipstream.VERSION_ZIP64)
+        self.assertEqual(fields[7:9], (zipstream.ZIP32_LIMIT, zipstream.ZIP32_LIMIT))
+        self.assertEqual(struct.unpack('<HHQQ', local[-20:]), (1, 16, member.size, member.size))
+        self.assertEqual(archive._descriptor(member, 0xABCD), struct.pack('<IIQQ', 0x08074B50, 0xABCD, member.size, member.size))
+
+        central = archive._central_header(member, 2 ** 33, 0xABCD)
+        self.assertEqual(struct.unpack('<I', central[16:20])[0], 0xABCD)
+        self.assertEqual(struct.unpack('<HHQQQ', central[-28:]), (1, 24, member.size, member.size, 2 ** 33))
+
+    def test_download_view_ranges(self):
+        url = reverse('portfolio:album_download', kwargs={'slug': 'spring'})
+        response = self.client.get(url)
+        full = b''.join(response.streaming_content)
+        self.assertEqual(int(response['Content-Length']), len(full))
+
+        response = self.client.get(url, HTTP_RANGE='bytes=-100', HTTP_IF_RANGE=response['ETag'])
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes {len(full) - 100}-{len(full) - 1}/{len(full)}')
+        self.assertEqual(b''.join(response.streaming_content), full[-100:])
+
+        response = self.client.get(url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_RANGE=f'bytes={len(full)}-{len(full) + 10}').status_code, 416)
+
+    def test_missing_files_are_skipped(self):
+        os.remove(self.storage.path(self.names[1]))
+        url = reverse('portfolio:album_download', kwargs={'slug': 'spring'})
+        with self.assertLogs('portfolio.zipstream', 'WARNING'):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as parsed:
+            self.assertIsNone(parsed.testzip())
+            self.assertEqual(len(parsed.infolist()), 2)
+
+
+class ImageHashTests(TestCase):
+    """Перцептивный хеш и поиск дубликатов (portfolio.imagehash)"""
+
+    def picture(self, flip=False, size=(256, 256), quality=90):
+        image = Image.linear_gradient('L').rotate(30).convert('RGB')
+        if flip:
+            image = image.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+        buffer = io.BytesIO()
+        image.resize(size).save(buffer, 'JPEG', quality=quality)
+        buffer.seek(0)
+        return buffer
+
+    def test_dhash_survives_resize_and_recompression(self):
+        original = imagehash.dhash(self.picture())
+        resized = imagehash.dhash(self.picture(size=(120, 90), quality=40))
+        other = imagehash.dhash(self.picture(flip=True))
+        self.assertLessEqual(imagehash.hamming(original, resized), imagehash.DUPLICATE_RADIUS)
+        self.assertGreater(imagehash.hamming(original, other), imagehash.DUPLICATE_RADIUS)
+
+    def test_signed_storage_round_trip(self):
+        for value in (0, 1, 2 ** 63 - 1, 2 ** 63, 2 ** 64 - 1):
+            with self.subTest(value=value):
+                signed = imagehash.to_signed(value)
+                self.assertTrue(-2 ** 63 <= signed < 2 ** 63)
+                self.assertEqual(imagehash.to_unsigned(signed), value)
+        self.assertEqual(imagehash.hamming(0b1011, 0b0110), 3)
+
+    def test_band_candidates_cover_radius(self):
+        rng = random.Random(1)
+        band_radius = imagehash.DUPLICATE_RADIUS // imagehash.BANDS
+        for _ in range(200):
+            value = rng.getrandbits(64)
+            other = value
+            for bit in rng.sample(range(64), rng.randint(0, imagehash.DUPLICATE_RADIUS)):
+                other ^= 1 << bit
+            self.assertTrue(any(
+                theirs in imagehash.band_neighbors(ours, band_radius)
+                for ours, theirs in zip(imagehash.bands(value), imagehash.bands(other))
+            ))
+
+    def test_bk_tree_matches_brute_force(self):
+        rng = random.Random(2)
+        base = [rng.getrandbits(64) for _ in range(20)]
+        values = [value ^ rng.choice([0, 1 << rng.randrange(64)]) for value in base for _ in range(10)]
+        tree = imagehash.BKTree()
+        for index, value in enumerate(values):
+            tree.add(value, index)
+        for query in base[:5]:
+            for radius in (0, 3, 10):
+                expected = {index for index, value in enumerate(values) if imagehash.hamming(query, value) <= radius}
+                self.assertEqual({index for _, index in tree.search(query, radius)}, expected)
+
+    def test_duplicate_groups_are_connected_components(self):
+        groups = imagehash.duplicate_groups([(0b0, 'a'), (0b111, 'b'), (0b111111, 'c'), (2 ** 40 - 1, 'd'), (None, 'e')], radius=3)
+        self.assertEqual([sorted(group) for group in groups], [['a', 'b', 'c']])
+
+    def test_find_duplicates(self):
+        album = Album.objects.create(title="Весна", slug='spring')
+        value = 0x0123456789ABCDEF
+
+        def photo(hash_value):
+            item = Photo(album=album, image='photos/a.jpg')
+            item.set_image_hash(hash_value)
+            item.save()
+            return item
+
+        original = photo(value)
+        near = photo(value ^ 0b101101)
+        photo(value ^ (2 ** 20 - 1))
+        photo(None)
+        self.assertEqual(original.find_duplicates(), [near])
+
+    def test_hash_is_computed_only_when_the_file_changes(self):
+        album = Album.objects.create(title="Весна", slug='spring')
+        photo = Photo.objects.create(album=album, image='photos/missing.jpg')
+        self.assertTrue(photo.image_hash_failed)
+
+        compute = Photo.compute_image_hash
+        with mock.patch.object(Photo, 'compute_image_hash', autospec=True, side_effect=compute) as computed:
+            photo.title = "Подпись"
+            photo.save()
+            Photo.objects.get(pk=photo.pk).save()
+            Photo.objects.only('pk', 'title').get(pk=photo.pk).save()
+            self.assertEqual(computed.call_count, 0)
+            photo = Photo.objects.get(pk=photo.pk)
+            photo.image = 'photos/other.jpg'
+            photo.save()
+            self.assertEqual(computed.call_count, 1)
+        self.assertTrue(Photo.objects.get(pk=photo.pk).image_hash_failed)
+
+    def test_duplicates_view_requires_view_permission(self):
+        url = reverse('admin:portfolio_photo_duplicates')
+        staff = User.objects.create_user('staff', password='secret', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        staff.user_permissions.add(Permission.objects.get(codename='view_photo'))
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class PaletteTests(TempMediaMixin, TestCase):
+    """Доминирующие цвета фотографий и фильтр по цвету (portfolio.palette)"""
+
+    def picture(self, background, accent=None, accent_share=0.25):
+        image = Image.new('RGB', (100, 100), background)
+        if accent:
+            side = round(100 * accent_share ** 0.5)
+            image.paste(Image.new('RGB', (side, side), accent), (0, 0))
+        buffer = io.BytesIO()
+        image.save(buffer, 'PNG')
+        return buffer
+
+    def test_extract_returns_shares_by_weight(self):
+        swatches = palette.extract(self.picture('#1d5fbf', '#d62828'))
+        self.assertAlmostEqual(sum(weight for _, weight in swatches), 1.0)
+        (first, first_weight), (second, second_weight) = swatches[:2]
+        self.assertEqual((palette.classify(first), palette.classify(second)), ('blue', 'red'))
+        self.assertAlmostEqual(first_weight, 0.75, places=2)
+        self.assertAlmostEqual(second_weight, 0.25, places=2)
+
+    def test_generation_is_bumped_after_palette_write(self):
+        album = Album.objects.create(title="Весна", slug='spring')
+        scope = fragments.album_scope(album.pk)
+        colors_at_bump = []
+        bump = fragments.bump
+
+        def record(*scopes):
+            if scope in scopes:
+                colors_at_bump.append(PhotoColor.objects.filter(photo__album=album).count())
+            bump(*scopes)
+
+        with mock.patch.object(fragments, 'bump', side_effect=record), \
+                self.captureOnCommitCallbacks(execute=True):
+            Photo.objects.create(album=album, image=SimpleUploadedFile('a.png', self.picture('#1d5fbf').getvalue()))
+        # Последнее увеличение поколения — уже с записанной палитрой
+        self.assertGreater(colors_at_bump[-1], 0)
+
+    def test_classify(self):
+        cases = {
+            (214, 40, 40): 'red', (247, 127, 0): 'orange', (240, 220, 40): 'yellow', (42, 157, 63): 'green',
+            (42, 157, 143): 'teal', (29, 95, 191): 'blue', (123, 44, 191): 'purple', (229, 107, 159): 'pink',
+            (110, 60, 30): 'brown', (10, 10, 10): 'black', (141, 141, 141): 'gray', (250, 250, 250): 'white',
+        }
+        for rgb, color in cases.items():
+            with self.subTest(rgb=rgb):
+                self.assertEqual(palette.classify(rgb), color)
+
+    def test_color_weights_and_groups(self):
+        weights = palette.color_weights([((214, 40, 40), 0.5), ((29, 95, 191), 0.3), ((200, 30, 30), 0.2)])
+        self.assertEqual(weights['red'], (0.7, '#d62828'))
+        self.assertEqual(weights['blue'], (0.3, '#1d5fbf'))
+        self.assertEqual(palette.resolve('mono'), ['black', 'gray', 'white'])
+        self.assertEqual(palette.resolve('teal'), ['teal'])
+        self.assertEqual(palette.resolve('нет'), [])
+
+    def test_gallery_filter_by_color(self):
+        albums = {}
+        for slug, background, accent in [('sea', '#1d5fbf', None), ('fire', '#d62828', '#1d5fbf')]:
+            albums[slug] = Album.objects.create(title=slug, slug=slug, is_published=True)
+            upload = SimpleUploadedFile('photo.png', self.picture(background, accent, accent_share=0.1).getvalue())
+            Photo.objects.create(album=albums[slug], image=upload)
+        self.assertEqual(set(PhotoColor.objects.values_list('color', flat=True)), {'blue', 'red'})
+
+        queryset = Album.objects.all()
+        matches = {
+            value: set(AlbumFilter({'color': value}, queryset=queryset).qs.values_list('slug', flat=True))
+            for value in ('cool', 'warm', 'blue', 'mono')
+        }
+        # Синего в «fire» 10% кадра — меньше MIN_WEIGHT
+        self.assertEqual(matches, {'cool': {'sea'}, 'warm': {'fire'}, 'blue': {'sea'}, 'mono': set()})
+
+
+@mock.patch.object(AlbumSitemap, 'shard_size', 2)
+class SitemapTests(TestCase):
+    """Шарды sitemap (core.sitemaps): отпечатки, кэш XML, условные запросы"""
+
+    def setUp(self):
+        cache.clear()
+        self.albums = [
+            Album.objects.create(title=f"Альбом {number}", slug=f'album-{number}', is_published=True)
+            for number in range(4)
+        ]
+        self.draft = Album.objects.create(title="Черновик", slug='draft', is_published=False)
+
+    def shard_url(self, album):
+        return reverse('sitemap_section', kwargs={'section': 'albums', 'shard': album.pk // 2})
+
+    def etags(self):
+        return {url: self.client.get(url)['ETag'] for url in {self.shard_url(album) for album in self.albums}}
+
+    def test_index_lists_non_empty_shards(self):
+        content = self.client.get(reverse('sitemap_index')).content.decode()
+        for album in self.albums:
+            self.assertIn(f'http://testserver{self.shard_url(album)}', content)
+        self.assertEqual(content.count('sitemap-albums-'), len({album.pk // 2 for album in self.albums}))
+        self.assertContains(self.client.get(self.shard_url(self.albums[0])), 'album-0')
+        urls = {self.shard_url(album) for album in [*self.albums, self.draft]}
+        self.assertNotIn(b'draft', b''.join(self.client.get(url).content for url in urls))
+
+    def test_edit_changes_only_its_shard(self):
+        before = self.etags()
+        album = self.albums[-1]
+        Photo.objects.create(album=album, image='photos/a.jpg')
+        after = self.etags()
+        changed = {url for url in before if before[url] != after[url]}
+        self.assertEqual(changed, {self.shard_url(album)})
+
+        album.title = "Новое название"
+        album.save()
+        self.assertNotEqual(self.etags()[self.shard_url(album)], after[self.shard_url(album)])
+
+    def test_reorder_changes_its_shard(self):
+        album = self.albums[0]
+        photos = [Photo.objects.create(album=album, image=f'photos/{number}.jpg') for number in range(3)]
+        before = self.etags()[self.shard_url(album)]
+        ordering.reorder(Photo.objects.filter(album=album), [photos[2].pk, photos[0].pk, photos[1].pk])
+        self.assertNotEqual(self.etags()[self.shard_url(album)], before)
+
+    def test_cached_xml_and_conditional_get(self):
+        url = self.shard_url(self.albums[0])
+        first = self.client.get(url)
+        with self.assertNumQueries(1):
+            second = self.client.get(url)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+    def test_empty_shard_is_not_found(self):
+        url = reverse('sitemap_section', kwargs={'section': 'albums', 'shard': self.albums[-1].pk // 2 + 10})
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+@modify_settings(MIDDLEWARE={'remove': 'core.pagecache.PageCacheMiddleware'})
+class FragmentCacheTests(TestCase):
+    """Кэш фрагментов по поколениям (portfolio.fragments)"""
+
+    def setUp(self):
+        cache.clear()
+        SiteSettings.objects.create(title="Студия", phone='+7 900 000-00-00', email='studio@example.com', about_text="О нас")
+        self.spring = Album.objects.create(title="Весна", slug='spring', is_published=True)
+        self.autumn = Album.objects.create(title="Осень", slug='autumn', is_published=True)
+        self.photo = Photo.objects.create(album=self.spring, image='photos/a.jpg', title="Первый кадр")
+
+    def generation(self, scope):
+        return fragments.generations([scope])[0]
+
+    def test_saves_and_deletes_bump_their_scopes(self):
+        spring, autumn, portfolio = (
+            fragments.album_scope(self.spring.pk), fragments.album_scope(self.autumn.pk), fragments.PORTFOLIO,
+        )
+        before = {scope: self.generation(scope) for scope in (spring, autumn, portfolio)}
+        self.photo.title = "Другой кадр"
+        self.photo.save()
+        self.assertGreater(self.generation(spring), before[spring])
+        self.assertGreater(self.generation(portfolio), before[portfolio])
+        self.assertEqual(self.generation(autumn), before[autumn])
+
+        # Перенос фото меняет оба альбома
+        before = {scope: self.generation(scope) for scope in (spring, autumn)}
+        self.photo.album = self.autumn
+        self.photo.save()
+        self.assertTrue(all(self.generation(scope) > before[scope] for scope in (spring, autumn)))
+
+        before = self.generation(autumn)
+        self.autumn.delete()
+        self.assertGreater(self.generation(autumn), before)
+
+    def test_evicted_counter_does_not_repeat_generations(self):
+        scope = fragments.album_scope(self.spring.pk)
+        seen = self.generation(scope)
+        cache.delete(f'{fragments.GENERATION_PREFIX}:{scope}')
+        fragments.bump(scope)
+        self.assertNotEqual(self.generation(scope), seen)
+
+    def test_album_page_is_served_from_fragment_until_change(self):
+        url = reverse('portfolio:album_detail', kwargs={'slug': 'spring'})
+        self.assertContains(self.client.get(url), "Первый кадр")
+        self.client.get(reverse('portfolio:album_detail', kwargs={'slug': 'autumn'}))
+        # Попадание в кэш: только поиск id альбома по slug
+        with self.assertNumQueries(1):
+            self.assertContains(self.client.get(url), "Первый кадр")
+
+        self.photo.title = "Новый кадр"
+        self.photo.save()
+        self.assertContains(self.client.get(url), "Новый кадр")
+        with self.assertNumQueries(1):
+            self.client.get(reverse('portfolio:album_detail', kwargs={'slug': 'autumn'}))
+
+
+class FacetTests(TestCase):
+    """Счетчики фильтра галереи (AlbumFilter.facets)"""
+
+    def setUp(self):
+        cache.clear()
+        self.wedding = ShootingType.objects.create(name="Свадьба", slug='wedding')
+        self.portrait = ShootingType.objects.create(name="Портрет", slug='portrait')
+        for slug, featured, types in [
+            ('a', True, [self.wedding, self.portrait]),
+            ('b', False, [self.wedding]),
+            ('c', True, [self.portrait]),
+            ('d', False, []),
+        ]:
+            Album.objects.create(title=f"Весна {slug}", slug=slug, is_published=True, is_featured=featured).shooting_types.add(*types)
+        Album.objects.create(
+            title="Черновик", slug='draft', is_published=False, is_featured=True,
+        ).shooting_types.add(self.wedding)
+
+    def facets(self, **data):
+        facets = AlbumFilter(data, queryset=Album.objects.filter(is_published=True)).facets()
+        counts = {item['slug']: item['count'] for item in facets.shooting_types}
+        return counts, facets.featured, facets.unfeatured
+
+    def test_counts_exclude_their_own_filter(self):
+        # Альбом с двумя типами считается в каждом из них, но в итогах — один раз
+        self.assertEqual(self.facets(), ({'wedding': 2, 'portrait': 2}, 2, 2))
+        self.assertEqual(self.facets(shooting_type=str(self.wedding.pk)), ({'wedding': 2, 'portrait': 2}, 1, 1))
+        self.assertEqual(self.facets(is_featured='true'), ({'wedding': 1, 'portrait': 2}, 2, 2))
+        self.assertEqual(self.facets(title="черновик"), ({'wedding': 0, 'portrait': 0}, 0, 0))
+
+    def test_counts_are_cached_until_portfolio_changes(self):
+        self.facets()
+        with self.assertNumQueries(0):
+            self.facets()
+        Album.objects.create(title="Лето", slug='summer', is_published=True).shooting_types.add(self.wedding)
+        self.assertEqual(self.facets(), ({'wedding': 3, 'portrait': 2}, 2, 3))
+
+
+class NeighborTests(TestCase):
+    """Соседние фотографии в полноэкранном просмотре (Photo.get_neighbors)"""
+
+    def setUp(self):
+        self.album = Album.objects.create(title="Весна", slug='spring')
+        other = Album.objects.create(title="Осень", slug='autumn')
+        # Два фото с одинаковым order: порядок между ними задает id
+        self.photos = [
+            Photo.objects.create(album=self.album, image=f'photos/{number}.jpg', order=order * ordering.GAP)
+            for number, order in enumerate([1, 2, 2, 3])
+        ]
+        Photo.objects.create(album=other, image='photos/other.jpg', order=ordering.GAP)
+
+    def test_walk_covers_album_in_order(self):
+        first, last = self.photos[0], self.photos[-1]
+        self.assertIsNone(first.get_neighbors()[0])
+        self.assertIsNone(last.get_neighbors()[1])
+
+        forward, photo = [first], first
+        while (photo := photo.get_neighbors()[1]) is not None:
+            forward.append(photo)
+        backward, photo = [last], last
+        while (photo := photo.get_neighbors()[0]) is not None:
+            backward.append(photo)
+        self.assertEqual(forward, self.photos)
+        self.assertEqual(backward, self.photos[::-1])
+
+    def test_single_photo_has_no_neighbors(self):
+        lonely = Photo.objects.get(album__slug='autumn')
+        self.assertEqual(lonely.get_neighbors(), (None, None))
+
+    def test_fullscreen_links(self):
+        def url(photo):
+            return reverse('portfolio:media_fullscreen', kwargs={'photo_id': photo.pk})
+
+        response = self.client.get(url(self.photos[0]))
+        self.assertContains(response, f'id="next-link" href="{url(self.photos[1])}"')
+        self.assertNotContains(response, 'id="prev-link"')
+        response = self.client.get(url(self.photos[-1]))
+        self.assertContains(response, f'id="prev-link" href="{url(self.photos[-2])}"')
+        self.assertNotContains(response, 'id="next-link"')
+
+
+class RecommendationTests(TestCase):
+    """Похожие альбомы (portfolio.recommendations) и пометки related_stale"""
+
+    def setUp(self):
+        self.wedding = ShootingType.objects.create(name="Свадьба", slug='wedding')
+        self.portrait = ShootingType.objects.create(name="Портрет", slug='portrait')
+        self.albums = {}
+        for slug, types in [('a', [self.wedding, self.portrait]), ('b', [self.wedding]), ('c', [self.portrait])]:
+            self.albums[slug] = Album.objects.create(title=slug, slug=slug)
+            self.albums[slug].shooting_types.add(*types)
+        recommendations.refresh()
+
+    def related(self, slug):
+        return [link.related.slug for link in RelatedAlbum.objects.filter(album=self.albums[slug]).order_by('rank')]
+
+    def stale(self):
+        return set(Album.objects.filter(related_stale=True).values_list('slug', flat=True))
+
+    def test_similarity(self):
+        wedding, portrait = ('type', self.wedding.pk), ('type', self.portrait.pk)
+        self.assertAlmostEqual(recommendations.similarity({wedding, ('color', 'red')}, {wedding, ('color', 'red')}), 1.0)
+        self.assertAlmostEqual(recommendations.similarity({wedding, portrait}, {wedding}), 0.4)
+        self.assertEqual(recommendations.similarity({wedding}, {portrait}), 0.0)
+
+    def test_full_refresh_ranks_neighbors(self):
+        self.assertEqual(self.stale(), set())
+        self.assertCountEqual(self.related('a'), ['b', 'c'])
+        self.assertEqual(self.related('b'), ['a'])
+        self.assertEqual(self.related('c'), ['a'])
+
+    def test_changes_mark_albums_stale(self):
+        self.albums['c'].shooting_types.add(self.wedding)
+        self.assertEqual(self.stale(), {'c'})
+        photo = Photo.objects.create(album=self.albums['b'], image='photos/b.jpg')
+        self.assertEqual(self.stale(), {'b', 'c'})
+
+        # Правка без смены признаков ничего не помечает и не снимает чужую пометку
+        recommendations.refresh()
+        album = self.albums['a']
+        album.title = "Новое название"
+        album.save()
+        photo.title = "Подпись"
+        photo.save()
+        self.assertEqual(self.stale(), set())
+        Album.objects.filter(pk=album.pk).update(related_stale=True)
+        album.save()
+        self.assertEqual(self.stale(), {'a'})
+
+        recommendations.refresh()
+        album.is_published = False
+        album.save()
+        self.assertEqual(self.stale(), {'a'})
+        photo.album = self.albums['c']
+        photo.save()
+        self.assertEqual(self.stale(), {'a', 'b', 'c'})
+
+    def test_incremental_refresh_reads_only_neighbors(self):
+        landscape = ShootingType.objects.create(name="Пейзаж", slug='landscape')
+        apart = Album.objects.create(title="d", slug='d')
+        apart.shooting_types.add(landscape)
+        recommendations.refresh()
+
+        self.albums['b'].shooting_types.add(self.portrait)
+        with mock.patch.object(recommendations, 'album_features', wraps=recommendations.album_features) as features:
+            self.assertEqual(recommendations.refresh_stale(), 3)
+        for call in features.call_args_list:
+            self.assertNotIn(apart.pk, call.args[0])
+        self.assertEqual(self.related('b')[0], 'a')
+        self.assertFalse(RelatedAlbum.objects.filter(album=apart).exists())
+
+    def test_refresh_stale_updates_affected_lists(self):
+        self.albums['c'].shooting_types.set([self.wedding, self.portrait])
+        self.assertEqual(recommendations.refresh_stale(), 3)
+        self.assertEqual(self.stale(), set())
+        self.assertEqual(self.related('c'), ['a', 'b'])
+        self.assertEqual(self.related('b')[0], 'c')
+
+        # Скрытый альбом пропадает из чужих списков, хотя у них самих ничего не менялось
+        album = self.albums['b']
+        album.is_published = False
+        album.save()
+        out = io.StringIO()
+        call_command('build_related_albums', stdout=out)
+        self.assertIn("Пересчитаны рекомендации альбомов", out.getvalue())
+        self.assertEqual(self.related('a'), ['c'])
+        self.assertEqual(self.related('c'), ['a'])
+        self.assertEqual(self.related('b'), [])
+
+    def test_deleted_album_marks_referrers_stale(self):
+        self.albums['c'].delete()
+        self.assertEqual(self.stale(), {'a'})
+        recommendations.refresh_stale()
+        self.assertEqual(self.related('a'), ['b'])
@@ -1,11 +1,14 @@
 from django.urls import path
+from core.asyncviews import as_view
 from . import views
 
 app_name = 'portfolio'
 
 urlpatterns = [
-    path('', views.GalleryView.as_view(), name='gallery'),
-    path('album/<slug:slug>/', views.AlbumDetailView.as_view(), name='album_detail'),
+    path('', as_view(views.GalleryView, views.AsyncGalleryView), name='gallery'),
+    path('album/<slug:slug>/', as_view(views.AlbumDetailView, views.AsyncAlbumDetailView), name='album_detail'),
+    path('album/<slug:slug>/download/', views.album_download, name='album_download'),
+    path('search/', views.SearchView.as_view(), name='search'),
     path('videos/', views.VideoListView.as_view(), name='video_list'),
     path('type/<slug:slug>/', views.ShootingTypeListView.as_view(), name='shooting_type'),
     path('media/<int:photo_id>/fullscreen/', views.media_fullscreen, name='media_fullscreen'),
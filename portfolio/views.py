@@ -1,15 +1,28 @@
-from django.shortcuts import render, get_object_or_404
+import asyncio
+import os
+from asgiref.sync import sync_to_async
+from django.shortcuts import aget_object_or_404, render, get_object_or_404
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.views.decorators.http import require_safe
 from django.views.generic import ListView, DetailView
 from django.db.models import Q
-from .models import Album, Photo, Video, ShootingType
+from django.utils.http import http_date
+from utils.ranges import RangeNotSatisfiable, content_range, if_range_matches, parse_range
+from .models import Album, Photo, RelatedAlbum, Video
 from .filters import AlbumFilter
+from .fragments import FragmentCacheMixin, PORTFOLIO, album_scope, shooting_type_scope
+from .zipstream import StoredZip, members_from_storage
+from core import pagecache, reference
+from core.asyncviews import AsyncViewMixin, alist
+from . import palette, search
 
-class GalleryView(ListView):
+class GalleryView(FragmentCacheMixin, ListView):
     """Галерея всех альбомов"""
     model = Album
     template_name = 'portfolio/gallery.html'
     context_object_name = 'albums'
     paginate_by = 12
+    fragment_name = 'portfolio_gallery'
     
     def get_queryset(self):
         queryset = Album.objects.filter(is_published=True).prefetch_related('shooting_types')
@@ -19,17 +32,27 @@ class GalleryView(ListView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['filter'] = self.filter
-        context['shooting_types'] = ShootingType.objects.filter(is_active=True)
-        context['featured_count'] = Album.objects.filter(is_published=True, is_featured=True).count()
+        facets = self.filter.facets()
+        context['shooting_types'] = facets.shooting_types
+        context['featured_count'] = facets.featured
+        context['color_choices'] = palette.FILTER_CHOICES
         return context
 
-class AlbumDetailView(DetailView):
+class AlbumDetailView(FragmentCacheMixin, DetailView):
     """Детальная страница альбома"""
     model = Album
     template_name = 'portfolio/album_detail.html'
     context_object_name = 'album'
     slug_field = 'slug'
     slug_url_kwarg = 'slug'
+    fragment_name = 'portfolio_album'
+
+    def get_fragment_scopes(self):
+        # Один запрос по индексу вместо загрузки альбома с фотографиями
+        self.album_id = Album.objects.filter(is_published=True, slug=self.kwargs['slug']).values_list('pk', flat=True).first()
+        if self.album_id is None:
+            raise Http404
+        return [album_scope(self.album_id)]
     
     def get_queryset(self):
         return Album.objects.filter(is_published=True).prefetch_related('photos', 'shooting_types')
@@ -38,26 +61,39 @@ class AlbumDetailView(DetailView):
         context = super().get_context_data(**kwargs)
         album = self.object
         context['photos'] = album.photos.all().order_by('order')
+        context['related_albums'] = [link.related for link in self.get_related_links(album.pk)]
         return context
 
-class VideoListView(ListView):
+    def get_related_links(self, album_id):
+        return RelatedAlbum.objects.filter(
+            album_id=album_id, related__is_published=True
+        ).select_related('related').order_by('rank')
+
+class VideoListView(FragmentCacheMixin, ListView):
     """Список всех видео"""
     model = Video
     template_name = 'portfolio/video_list.html'
     context_object_name = 'videos'
     paginate_by = 12
+    fragment_name = 'portfolio_videos'
     
     def get_queryset(self):
         return Video.objects.filter(is_published=True).prefetch_related('shooting_types')
 
-class ShootingTypeListView(ListView):
+class ShootingTypeListView(FragmentCacheMixin, ListView):
     """Альбомы по типу съемки"""
     template_name = 'portfolio/shooting_type.html'
     context_object_name = 'albums'
     paginate_by = 12
+    fragment_name = 'portfolio_shooting_type'
+
+    def get_fragment_scopes(self):
+        self.shooting_type = reference.shooting_type_by_slug(self.kwargs['slug'])
+        if self.shooting_type is None:
+            raise Http404
+        return [shooting_type_scope(self.shooting_type.pk), PORTFOLIO]
     
     def get_queryset(self):
-        self.shooting_type = get_object_or_404(ShootingType, slug=self.kwargs['slug'], is_active=True)
         return Album.objects.filter(
             is_published=True,
             shooting_types=self.shooting_type
@@ -66,9 +102,116 @@ class ShootingTypeListView(ListView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['shooting_type'] = self.shooting_type
+        # Те же фасеты, что у галереи без фильтров, — общий элемент кэша
+        context['shooting_types'] = AlbumFilter(
+            {}, queryset=Album.objects.filter(is_published=True)
+        ).facets().shooting_types
+        return context
+
+class SearchView(ListView):
+    """Полнотекстовый поиск по альбомам, фотографиям и видео"""
+    template_name = 'portfolio/search.html'
+    context_object_name = 'hits'
+    paginate_by = 20
+    page_cache_tags = (PORTFOLIO,)
+
+    def get_queryset(self):
+        self.query = self.request.GET.get('q', '').strip()
+        return search.search(self.query)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.query
         return context
 
+class AsyncGalleryView(AsyncViewMixin, GalleryView):
+    """GalleryView под ASGI: фасеты и страница альбомов читаются одновременно"""
+
+    async def get(self, request, *args, **kwargs):
+        response = await self.aget_cached_response(request)
+        if response is not None:
+            return response
+        # FilterSet проверяет выбранный тип съемки запросом к базе
+        self.object_list = await sync_to_async(self.get_queryset)()
+        facets, context = await asyncio.gather(
+            sync_to_async(self.filter.facets)(),
+            self.aget_list_context(self.object_list),
+        )
+        return self.render_to_response(self.get_context_data(
+            **context,
+            filter=self.filter,
+            shooting_types=facets.shooting_types,
+            featured_count=facets.featured,
+            color_choices=palette.FILTER_CHOICES,
+        ))
+
+class AsyncAlbumDetailView(AsyncViewMixin, AlbumDetailView):
+    """AlbumDetailView под ASGI: альбом с фотографиями и похожие альбомы читаются одновременно"""
+
+    async def get(self, request, *args, **kwargs):
+        # Заодно находит id альбома (self.album_id)
+        response = await self.aget_cached_response(request)
+        if response is not None:
+            return response
+        self.object, related_links = await asyncio.gather(
+            aget_object_or_404(self.get_queryset(), pk=self.album_id),
+            alist(self.get_related_links(self.album_id)),
+        )
+        return self.render_to_response(self.get_context_data(
+            object=self.object,
+            album=self.object,
+            # Фотографии уже загружены prefetch_related в порядке Photo.Meta.ordering
+            photos=list(self.object.photos.all()),
+            related_albums=[link.related for link in related_links],
+        ))
+
+@pagecache.cache_public_page()
 def media_fullscreen(request, photo_id):
-    """Полноэкранный просмотр медиа"""
+    """Полноэкранный просмотр медиа с переходом к соседним фотографиям альбома"""
     photo = get_object_or_404(Photo, id=photo_id)
-    return render(request, 'portfolio/media_fullscreen.html', {'photo': photo})
\ No newline at end of file
+    pagecache.add_tags(request, album_scope(photo.album_id))
+    previous_photo, next_photo = photo.get_neighbors()
+    return render(request, 'portfolio/media_fullscreen.html', {
+        'photo': photo,
+        'previous_photo': previous_photo,
+        'next_photo': next_photo,
+    })
+
+@require_safe
+def album_download(request, slug):
+    """Скачивание альбома одним ZIP-архивом (потоково, с поддержкой докачки)"""
+    album = get_object_or_404(Album, slug=slug, is_published=True)
+    storage = Photo._meta.get_field('image').storage
+    photos = album.photos.order_by('order', 'created_at').values_list('image', flat=True)
+    members = members_from_storage(storage, [
+        (f"{index:04d}_{os.path.basename(name)}", name)
+        for index, name in enumerate(photos, start=1)
+    ])
+    archive = StoredZip(storage, members)
+
+    headers = {
+        'Accept-Ranges': 'bytes',
+        'ETag': archive.etag,
+        'Content-Disposition': f'attachment; filename="{album.slug}.zip"',
+    }
+    if archive.last_modified:
+        headers['Last-Modified'] = http_date(archive.last_modified)
+
+    byte_range = None
+    if if_range_matches(request, archive.etag, archive.last_modified):
+        try:
+            byte_range = parse_range(request.headers.get('Range'), archive.size)
+        except RangeNotSatisfiable:
+            return HttpResponse(status=416, headers={'Content-Range': f'bytes */{archive.size}'})
+
+    start, end = byte_range or (0, archive.size - 1)
+    status = 206 if byte_range else 200
+    headers['Content-Length'] = str(end - start + 1)
+    if byte_range:
+        headers['Content-Range'] = content_range(start, end, archive.size)
+
+    if request.method == 'HEAD':
+        return HttpResponse(status=status, content_type='application/zip', headers=headers)
+    return StreamingHttpResponse(
+        archive.iter_range(start, end), status=status, content_type='application/zip', headers=headers
+    )
@@ -0,0 +1,281 @@
+"""
+Потоковая сборка ZIP-архива альбома без временных файлов.
+
+Файлы кладутся в архив без сжатия (ZIP_STORED): JPEG и так сжат, а при
+хранении без сжатия размер архива и смещение каждого байта известны заранее.
+Это позволяет отдать Content-Length и обслуживать Range-запросы (докачку),
+генерируя только нужный кусок архива. CRC32 записывается в data descriptor
+после данных файла, поэтому считается прямо во время отдачи; посчитанные
+значения кэшируются, чтобы докачка не перечитывала уже отданные файлы.
+"""
+import hashlib
+import logging
+import os
+import struct
+import zlib
+from dataclasses import dataclass
+
+from django.core.cache import cache
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+CRC_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
+ZIP32_LIMIT = 0xFFFFFFFF
+ZIP16_LIMIT = 0xFFFF
+
+# Бит 3 — CRC и размеры в data descriptor, бит 11 — имена в UTF-8
+FLAGS = 0x0808
+VERSION = 20
+VERSION_ZIP64 = 45
+
+
+@dataclass
+class ZipMember:
+    """Файл из хранилища, который попадет в архив"""
+    arcname: str
+    storage_name: str
+    size: int
+    modified: object
+
+    def __post_init__(self):
+        self.encoded_name = self.arcname.encode('utf-8')
+        self.zip64 = self.size >= ZIP32_LIMIT
+
+    @property
+    def dos_datetime(self):
+        dt = timezone.localtime(self.modified) if timezone.is_aware(self.modified) else self.modified
+        if dt.year < 1980:
+            return 0, (1 << 5) | 1
+        time = (dt.hour << 11) | (dt.minute << 5) | (dt.second // 2)
+        date = ((dt.year - 1980) << 9) | (dt.month << 5) | dt.day
+        return time, date
+
+    @property
+    def crc_cache_key(self):
+        digest = hashlib.md5(
+            f'{self.storage_name}:{self.size}:{self.modified.timestamp()}'.encode('utf-8')
+        ).hexdigest()
+        return f'zipstream:crc:{digest}'
+
+
+def members_from_storage(storage, items):
+    """
+    Строит список ZipMember из пар ``(имя в архиве, имя в хранилище)``.
+    Одинаковые имена в архиве получают числовой суффикс. Файлы, которых
+    нет в хранилище, пропускаются с предупреждением в лог: без них размер
+    и ETag архива посчитать нельзя, а отдавать 500 из-за одного файла незачем.
+    """
+    members = []
+    seen = set()
+    for arcname, storage_name in items:
+        if not storage_name:
+            continue
+        try:
+            size = storage.size(storage_name)
+            modified = storage.get_modified_time(storage_name)
+        except OSError as exc:
+            logger.warning("Файл %s не попадет в архив: %s", storage_name, exc)
+            continue
+        base, ext = os.path.splitext(arcname)
+        candidate, counter = arcname, 1
+        while candidate in seen:
+            counter += 1
+            candidate = f'{base}_{counter}{ext}'
+        seen.add(candidate)
+        members.append(ZipMember(
+            arcname=candidate,
+            storage_name=storage_name,
+            size=size,
+            modified=modified,
+        ))
+    return members
+
+
+class StoredZip:
+    """Описание раскладки архива и генератор произвольного диапазона его байт"""
+
+    def __init__(self, storage, members, chunk_size=CHUNK_SIZE):
+        self.storage = storage
+        self.members = members
+        self.chunk_size = chunk_size
+        self.crcs = {}
+        self._layout()
+
+    def _layout(self):
+        offset = 0
+        self.offsets = []
+        for member in self.members:
+            header = self._local_header(member)
+            descriptor_size = 24 if member.zip64 else 16
+            self.offsets.append((offset, len(header)))
+            offset += len(header) + member.size + descriptor_size
+        self.cd_offset = offset
+        self.cd_size = sum(len(self._central_header(m, o, 0)) for m, (o, _) in zip(self.members, self.offsets))
+        self.end_size = len(self._end_records())
+        self.size = self.cd_offset + self.cd_size + self.end_size
+
+    @property
+    def etag(self):
+        """Сильный ETag: меняется при изменении состава, имен, размеров или дат файлов"""
+        digest = hashlib.md5()
+        for member in self.members:
+            digest.update(f'{member.arcname}:{member.storage_name}:{member.size}:{member.modified.timestamp()};'.encode('utf-8'))
+        return f'"{digest.hexdigest()}"'
+
+    @property
+    def last_modified(self):
+        if not self.members:
+            return None
+        return max(member.modified for member in self.members).timestamp()
+
+    # --- Структуры ZIP ---
+
+    def _local_header(self, member):
+        time, date = member.dos_datetime
+        extra = b''
+        size = member.size
+        if member.zip64:
+            extra = struct.pack('<HHQQ', 0x0001, 16, member.size, member.size)
+            size = ZIP32_LIMIT
+        return struct.pack(
+            '<IHHHHHIIIHH',
+            0x04034B50, VERSION_ZIP64 if member.zip64 else VERSION, FLAGS, 0, time, date,
+            0, size, size, len(member.encoded_name), len(extra)
+        ) + member.encoded_name + extra
+
+    def _descriptor(self, member, crc):
+        if member.zip64:
+            return struct.pack('<IIQQ', 0x08074B50, crc, member.size, member.size)
+        return struct.pack('<IIII', 0x08074B50, crc, member.size, member.size)
+
+    def _central_header(self, member, offset, crc):
+        time, date = member.dos_datetime
+        zip64 = member.zip64 or offset >= ZIP32_LIMIT
+        extra = b''
+        size, header_offset = member.size, offset
+        if zip64:
+            extra = struct.pack('<HHQQQ', 0x0001, 24, member.size, member.size, offset)
+            size = header_offset = ZIP32_LIMIT
+        version = VERSION_ZIP64 if zip64 else VERSION
+        # Старший байт «version made by» = 3 (Unix), чтобы учитывались права файла
+        return struct.pack(
+            '<IHHHHHHIIIHHHHHII',
+            0x02014B50, 0x0300 | version, version, FLAGS, 0, time, date,
+            crc, size, size, len(member.encoded_name), len(extra), 0, 0, 0,
+            0o100644 << 16, header_offset
+        ) + member.encoded_name + extra
+
+    def _end_records(self):
+        count = len(self.members)
+        records = b''
+        zip64 = count >= ZIP16_LIMIT or self.cd_offset >= ZIP32_LIMIT or self.cd_size >= ZIP32_LIMIT
+        if zip64:
+            zip64_end_offset = self.cd_offset + self.cd_size
+            records += struct.pack(
+                '<IQHHIIQQQQ',
+                0x06064B50, 44, VERSION_ZIP64, VERSION_ZIP64, 0, 0,
+                count, count, self.cd_size, self.cd_offset
+            )
+            records += struct.pack('<IIQI', 0x07064B50, 0, zip64_end_offset, 1)
+        records += struct.pack(
+            '<IHHHHIIH',
+            0x06054B50, 0, 0,
+            min(count, ZIP16_LIMIT), min(count, ZIP16_LIMIT),
+            min(self.cd_size, ZIP32_LIMIT), min(self.cd_offset, ZIP32_LIMIT), 0
+        )
+        return records
+
+    # --- CRC ---
+
+    def _crc(self, index):
+        if index in self.crcs:
+            return self.crcs[index]
+        member = self.members[index]
+        crc = cache.get(member.crc_cache_key)
+        if crc is None:
+            crc = 0
+            for chunk in self._read(member, 0, member.size):
+                crc = zlib.crc32(chunk, crc)
+            self._remember_crc(index, crc)
+        self.crcs[index] = crc
+        return crc
+
+    def _remember_crc(self, index, crc):
+        self.crcs[index] = crc
+        cache.set(self.members[index].crc_cache_key, crc, CRC_CACHE_TIMEOUT)
+
+    def _prefetch_crcs(self):
+        """Перед отдачей центрального каталога нужны CRC всех файлов — берем их из кэша пачкой"""
+        missing = [i for i in range(len(self.members)) if i not in self.crcs]
+        cached = cache.get_many([self.members[i].crc_cache_key for i in missing])
+        for i in missing:
+            crc = cached.get(self.members[i].crc_cache_key)
+            if crc is not None:
+                self.crcs[i] = crc
+
+    # --- Генерация байт ---
+
+    def _read(self, member, start, end):
+        """Читает байты [start, end) файла кусками по chunk_size"""
+        with self.storage.open(member.storage_name, 'rb') as fh:
+            fh.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                chunk = fh.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    raise IOError(f'Файл {member.storage_name} короче ожидаемого')
+                remaining -= len(chunk)
+                yield chunk
+
+    def _segments(self):
+        """Сегменты архива: (смещение, длина, генератор байт сегмента по диапазону)"""
+        for index, (member, (offset, header_size)) in enumerate(zip(self.members, self.offsets)):
+            data_offset = offset + header_size
+            descriptor_offset = data_offset + member.size
+            yield offset, header_size, lambda s, e, m=member: [self._local_header(m)[s:e]]
+            yield data_offset, member.size, lambda s, e, i=index: self._data(i, s, e)
+            yield (
+                descriptor_offset, 24 if member.zip64 else 16,
+                lambda s, e, i=index, m=member: [self._descriptor(m, self._crc(i))[s:e]]
+            )
+        yield self.cd_offset, self.cd_size, lambda s, e: self._central_directory(s, e)
+        yield self.cd_offset + self.cd_size, self.end_size, lambda s, e: [self._end_records()[s:e]]
+
+    def _data(self, index, start, end):
+        member = self.members[index]
+        if start == 0 and end == member.size and index not in self.crcs:
+            # Файл отдается целиком — считаем CRC на лету, без повторного чтения
+            crc = 0
+            for chunk in self._read(member, start, end):
+                crc = zlib.crc32(chunk, crc)
+                yield chunk
+            self._remember_crc(index, crc)
+        else:
+            yield from self._read(member, start, end)
+
+    def _central_directory(self, start, end):
+        self._prefetch_crcs()
+        position = 0
+        for index, (member, (offset, _)) in enumerate(zip(self.members, self.offsets)):
+            header = self._central_header(member, offset, self._crc(index))
+            if position + len(header) > start and position < end:
+                yield header[max(start - position, 0):end - position]
+            position += len(header)
+            if position >= end:
+                break
+
+    def iter_range(self, start=0, end=None):
+        """Генерирует байты архива в диапазоне [start, end] (включительно)"""
+        end = self.size - 1 if end is None else end
+        stop = end + 1
+        for offset, length, produce in self._segments():
+            if offset + length <= start or length == 0:
+                continue
+            if offset >= stop:
+                break
+            for chunk in produce(max(start - offset, 0), min(stop - offset, length)):
+                if chunk:
+                    yield chunk
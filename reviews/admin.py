@@ -1,8 +1,17 @@
 from django.contrib import admin
 from django.utils.translation import gettext_lazy as _
 from django.utils.safestring import mark_safe
+from portfolio import fragments
+from .api import REVIEWS
 from .models import Review, SocialReview
 
+
+def update_reviews(queryset, **values):
+    """queryset.update не вызывает сигналы — поколение отзывов увеличиваем сами"""
+    updated = queryset.update(**values)
+    fragments.bump(REVIEWS)
+    return updated
+
 @admin.register(Review)
 class ReviewAdmin(admin.ModelAdmin):
     list_display = ['author', 'rating_stars', 'status_badge', 'status', 'created_at', 'is_public']
@@ -35,22 +44,22 @@ class ReviewAdmin(admin.ModelAdmin):
     status_badge.allow_tags = True
     
     def approve_selected(self, request, queryset):
-        updated = queryset.update(status='approved')
+        updated = update_reviews(queryset, status='approved')
         self.message_user(request, f"{updated} отзывов одобрено")
     approve_selected.short_description = _('Одобрить выбранные')
     
     def reject_selected(self, request, queryset):
-        updated = queryset.update(status='rejected')
+        updated = update_reviews(queryset, status='rejected')
         self.message_user(request, f"{updated} отзывов отклонено")
     reject_selected.short_description = _('Отклонить выбранные')
     
     def make_public(self, request, queryset):
-        updated = queryset.update(is_public=True)
+        updated = update_reviews(queryset, is_public=True)
         self.message_user(request, f"{updated} отзывов сделано публичными")
     make_public.short_description = _('Сделать публичными')
     
     def make_private(self, request, queryset):
-        updated = queryset.update(is_public=False)
+        updated = update_reviews(queryset, is_public=False)
         self.message_user(request, f"{updated} отзывов сделано приватными")
     make_private.short_description = _('Сделать приватными')
 
@@ -0,0 +1,22 @@
+from core.api import Resource
+from .models import Review
+
+# Область поколений опубликованных отзывов (увеличивается в reviews.signals)
+REVIEWS = 'api:reviews'
+
+
+class ReviewResource(Resource):
+    fields = {
+        'id': 'pk',
+        'author': 'author',
+        'rating': 'rating',
+        'text': 'text',
+        'photo': 'photo',
+        'created_at': 'created_at',
+    }
+    ordering = ('-created_at', '-pk')
+    filters = {'rating': 'rating'}
+    generation_scopes = (REVIEWS,)
+
+    def get_queryset(self):
+        return Review.objects.filter(status='approved', is_public=True)
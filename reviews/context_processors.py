@@ -1,10 +1,32 @@
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+
+from portfolio import fragments
+from .api import REVIEWS
 from .models import Review
 
+LATEST_COUNT = 5
+
+
+def get_latest_reviews():
+    """
+    Последние опубликованные отзывы из общего кэша.
+
+    Ключ включает поколение отзывов (см. reviews.signals), поэтому одобрение
+    или публикация отзыва сразу дает новый список.
+    """
+    key = f'reviews:latest:{fragments.generations([REVIEWS])[0]}'
+    reviews = cache.get(key)
+    if reviews is None:
+        reviews = list(Review.objects.filter(
+            status='approved',
+            is_public=True
+        ).order_by('-created_at')[:LATEST_COUNT])
+        cache.set(key, reviews, fragments.FRAGMENT_TIMEOUT)
+    return reviews
+
+
 def latest_reviews(request):
     """Добавляет последние отзывы в контекст всех шаблонов"""
-    return {
-        'latest_reviews': Review.objects.filter(
-            status='approved', 
-            is_public=True
-        ).order_by('-created_at')[:5]  # Берем 5 последних отзывов
-    }
\ No newline at end of file
+    # Список загружается только если шаблон к нему обратится, и не больше раза за запрос
+    return {'latest_reviews': SimpleLazyObject(get_latest_reviews)}
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:12
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='review',
+            name='photo',
+            field=models.ImageField(blank=True, null=True, storage=core.storage.select_content_storage, upload_to='reviews/', verbose_name='Фото'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.utils.translation import gettext_lazy as _
+from core.storage import select_content_storage
 
 class Review(models.Model):
     STATUS_CHOICES = [
@@ -14,7 +15,7 @@ class Review(models.Model):
     email = models.EmailField(_("Email"))
     rating = models.PositiveIntegerField(_("Оценка (1-5)"), choices=RATING_CHOICES)
     text = models.TextField(_("Текст отзыва"))
-    photo = models.ImageField(_("Фото"), upload_to='reviews/', blank=True, null=True)
+    photo = models.ImageField(_("Фото"), upload_to='reviews/', storage=select_content_storage, blank=True, null=True)
     is_public = models.BooleanField(_("Публичный"), default=False)
     status = models.CharField(_("Статус"), max_length=10, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(_("Дата создания"), auto_now_add=True)
@@ -0,0 +1,32 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from portfolio import fragments
+from .api import REVIEWS
+from .models import Review
+
+
+def is_visible(state):
+    return state is not None and state['status'] == 'approved' and state['is_public']
+
+
+# Поколение опубликованных отзывов: ETag API (core.api) и кэш последних отзывов
+# (reviews.context_processors). Отзывы на модерации его не меняют.
+@receiver(pre_save, sender=Review)
+def remember_review_state(sender, instance, raw=False, **kwargs):
+    instance._previous_state = None
+    if instance.pk and not raw:
+        instance._previous_state = Review.objects.filter(pk=instance.pk).values('status', 'is_public').first()
+
+
+@receiver(post_save, sender=Review)
+def invalidate_reviews(sender, instance, **kwargs):
+    current = {'status': instance.status, 'is_public': instance.is_public}
+    if is_visible(current) or is_visible(getattr(instance, '_previous_state', None)):
+        fragments.bump(REVIEWS)
+
+
+@receiver(post_delete, sender=Review)
+def invalidate_reviews_on_delete(sender, instance, **kwargs):
+    if instance.status == 'approved' and instance.is_public:
+        fragments.bump(REVIEWS)
@@ -1,3 +1,78 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from core.models import SiteSettings
+from core.sqlprofile import QueryBudgetMixin
+from .context_processors import latest_reviews
+from .models import Review
+
+
+class LatestReviewsTests(TestCase):
+    """Контекстный процессор последних отзывов"""
+
+    def setUp(self):
+        cache.clear()
+        self.review = Review.objects.create(
+            author="Анна", email='anna@example.com', rating=5, text="Спасибо!", status='approved', is_public=True
+        )
+        self.request = RequestFactory().get('/')
+
+    def render(self, source):
+        return Template(source).render(Context(latest_reviews(self.request)))
+
+    def test_untouched_reviews_make_no_queries(self):
+        with self.assertNumQueries(0):
+            latest_reviews(self.request)
+
+    def test_evaluated_once_and_cached(self):
+        with self.assertNumQueries(1):
+            self.render("{% if latest_reviews %}{% for r in latest_reviews|slice:':3' %}{{ r.author }}{% endfor %}{% endif %}")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.render("{% for r in latest_reviews %}{{ r.author }}{% endfor %}"), "Анна")
+
+    def test_approval_invalidates(self):
+        self.render("{{ latest_reviews|length }}")
+        pending = Review.objects.create(author="Борис", email='boris@example.com', rating=4, text="Хорошо")
+        self.assertEqual(self.render("{{ latest_reviews|length }}"), "1")
+
+        pending.status = 'approved'
+        pending.is_public = True
+        pending.save()
+        self.assertEqual(self.render("{{ latest_reviews|length }}"), "2")
+
+        Review.objects.filter(pk=pending.pk).delete()
+        self.assertEqual(self.render("{{ latest_reviews|length }}"), "1")
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Бюджет SQL-запросов страниц отзывов (кэши пусты — худший случай)"""
+
+    def setUp(self):
+        SiteSettings.objects.create(title="Студия", phone='+7 900 000-00-00', email='studio@example.com', about_text="О нас")
+        for number in range(5):
+            Review.objects.create(
+                author=f"Автор {number}", email='author@example.com', rating=5, text="Спасибо!", status='approved', is_public=True
+            )
+            Review.objects.create(author=f"Гость {number}", email='guest@example.com', rating=4, text="Хорошо")
+
+    def test_pages(self):
+        budgets = {
+            reverse('reviews:list'): 3,
+            reverse('reviews:create'): 1,
+            reverse('reviews:thanks'): 1,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                cache.clear()
+                with self.assertQueryBudget(budget):
+                    self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_moderation_page(self):
+        self.client.force_login(User.objects.create_user('admin', password='secret'))
+        cache.clear()
+        # Сессия и пользователь — два запроса сверх списка
+        with self.assertQueryBudget(4):
+            self.assertEqual(self.client.get(reverse('reviews:moderate')).status_code, 200)
@@ -1,10 +1,11 @@
 from django.urls import path
+from core.asyncviews import as_view
 from . import views
 
 app_name = 'reviews'
 
 urlpatterns = [
-    path('', views.ReviewListView.as_view(), name='list'),
+    path('', as_view(views.ReviewListView, views.AsyncReviewListView), name='list'),
     path('create/', views.ReviewCreateView.as_view(), name='create'),
     path('moderate/', views.ReviewModerateView.as_view(), name='moderate'),
     path('thanks/', views.ReviewThanksView.as_view(), name='thanks'),
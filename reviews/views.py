@@ -4,6 +4,8 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
 from django.utils.translation import gettext_lazy as _
 from django.urls import reverse_lazy
+from core.asyncviews import AsyncViewMixin
+from .api import REVIEWS
 from .models import Review, SocialReview
 from .forms import ReviewForm
 
@@ -12,10 +14,18 @@ class ReviewListView(ListView):
     template_name = 'reviews/list.html'
     context_object_name = 'reviews'
     paginate_by = 10
+    page_cache_tags = (REVIEWS,)
     
     def get_queryset(self):
         return Review.objects.filter(status='approved', is_public=True).select_related()
 
+class AsyncReviewListView(AsyncViewMixin, ReviewListView):
+    """ReviewListView под ASGI"""
+
+    async def get(self, request, *args, **kwargs):
+        self.object_list = self.get_queryset()
+        return self.render_to_response(self.get_context_data(**await self.aget_list_context(self.object_list)))
+
 class ReviewCreateView(CreateView):
     model = Review
     form_class = ReviewForm
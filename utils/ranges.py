@@ -0,0 +1,60 @@
+# utils/ranges.py
+"""Разбор HTTP-заголовков Range / If-Range для отдачи файлов по частям"""
+import re
+
+from django.utils.http import parse_http_date_safe
+
+RANGE_RE = re.compile(r'^\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*$', re.IGNORECASE)
+
+
+class RangeNotSatisfiable(Exception):
+    """Запрошенный диапазон лежит за пределами ресурса (ответ 416)"""
+
+
+def parse_range(header, size):
+    """
+    Возвращает кортеж ``(start, end)`` (включительно) или None, если заголовка
+    нет, он некорректен или запрашивает несколько диапазонов — тогда
+    отдается весь ресурс целиком.
+    """
+    if not header:
+        return None
+    match = RANGE_RE.match(header)
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+
+    if not first:
+        # Суффиксный диапазон: последние N байт
+        length = int(last)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = int(last) if last else None
+    if end is not None and start > end:
+        return None
+    # В том числе «bytes=N-» с N за концом файла
+    if start >= size:
+        raise RangeNotSatisfiable
+    return start, size - 1 if end is None else min(end, size - 1)
+
+
+def if_range_matches(request, etag=None, last_modified=None):
+    """Проверка If-Range: диапазон отдается, только если ресурс не изменился"""
+    value = request.headers.get('If-Range')
+    if not value:
+        return True
+    value = value.strip()
+    if value.startswith(('"', 'W/')):
+        # Слабые ETag для If-Range не подходят (RFC 9110, 13.1.5)
+        return etag is not None and not value.startswith('W/') and value == etag
+    timestamp = parse_http_date_safe(value)
+    return timestamp is not None and last_modified is not None and int(last_modified) == timestamp
+
+
+def content_range(start, end, size):
+    return f'bytes {start}-{end}/{size}'
@@ -0,0 +1,103 @@
+# utils/smtpstub.py
+"""
+Локальный SMTP-сервер-заглушка для тестов и замеров отправки почты.
+
+Понимает минимальное подмножество SMTP, которого достаточно smtplib и
+SMTP-бэкенду Django, складывает письма в память, считает соединения и
+умеет имитировать задержку установки соединения (TLS-рукопожатие,
+авторизация) и временные ошибки сервера.
+"""
+import socketserver
+import threading
+import time
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode('ascii'))
+
+    def handle(self):
+        stub = self.server.stub
+        with stub.lock:
+            stub.connections += 1
+        time.sleep(stub.connect_delay)
+        self.reply("220 stub ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip().split(' ', 1)[0].upper()
+            if command in ('EHLO', 'HELO'):
+                self.reply("250 stub")
+            elif command in ('MAIL', 'RCPT', 'RSET', 'NOOP'):
+                self.reply("250 OK")
+            elif command == 'DATA':
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                for data_line in iter(self.rfile.readline, b''):
+                    if data_line in (b'.\r\n', b'.\n'):
+                        break
+                    data.append(data_line)
+                self.reply(stub.accept(b''.join(data)))
+            elif command == 'QUIT':
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SMTPStub:
+    """
+    Использование::
+
+        with SMTPStub(connect_delay=0.2) as stub:
+            ...  # EMAIL_HOST='127.0.0.1', EMAIL_PORT=stub.port, EMAIL_USE_TLS=False
+        stub.connections, stub.messages
+    """
+
+    def __init__(self, connect_delay=0.0, reply_delay=0.0):
+        self.connect_delay = connect_delay
+        self.reply_delay = reply_delay
+        self.connections = 0
+        self.messages = []
+        self.lock = threading.Lock()
+        self._failures = []
+        self._server = None
+
+    def fail_next(self, count, code=451):
+        """Следующие count писем получат ответ code (4xx — временная ошибка, 5xx — постоянная)"""
+        with self.lock:
+            self._failures.extend([code] * count)
+
+    def accept(self, data):
+        time.sleep(self.reply_delay)
+        with self.lock:
+            if self._failures:
+                return f"{self._failures.pop(0)} Try again later"
+            self.messages.append(data)
+        return "250 Queued"
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def start(self):
+        self._server = _Server(('127.0.0.1', 0), _Handler)
+        self._server.stub = self
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()